@@ -0,0 +1,230 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmarks for the parsing, writing and conversion hot paths, using generated files of realistic sizes.
+No ROM is needed. The fixtures are generated with a fixed seed, so results of different commits are comparable:
+
+    python benchmarks/benchmark.py --output before.json
+    (... change things ...)
+    python benchmarks/benchmark.py --compare before.json
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from skytemple_dse.dse.generator import generate_swdl, generate_smdl
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.smdl.writer import SmdlWriter
+from skytemple_dse.dse.swdl.consistency import check_bank_consistency
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.dse.swdl.writer import SwdlWriter
+from skytemple_dse.dse.validate import validate_swdl, validate_smdl
+from skytemple_dse.midi.midi_to_smdl import midi_to_smdl
+from skytemple_dse.midi.smdl_to_midi import smdl_to_midi
+from skytemple_dse.soundvault.program import Program
+
+SEED = 20210101
+MAIN_BANK_PCMD_SIZE = 5 * 1024 * 1024
+MAIN_BANK_WAVIS = 500
+# PRGI offsets are 16 bit, so a single sub-bank can't hold much more than 1k splits.
+SUB_BANKS = 2
+SUB_BANK_PROGRAMS = 64
+SPLITS_PER_PROGRAM = 16
+SUB_BANK_KEYGROUPS = 16
+SONG_TRACKS = 16
+SONG_EVENTS = 20000
+RENDER_SONG_TRACKS = 8
+RENDER_SONG_EVENTS = 2000
+
+
+# ----- Fixtures -----
+def _main_bank() -> Swdl:
+    return generate_swdl('bgm.swd', wavis=MAIN_BANK_WAVIS, pcmd_size=MAIN_BANK_PCMD_SIZE, seed=SEED)
+
+
+def _sub_bank(name: str, main_bank: Swdl, seed: int) -> Swdl:
+    return generate_swdl(
+        name, main_bank=main_bank, wavis=SPLITS_PER_PROGRAM * 4, programs=SUB_BANK_PROGRAMS,
+        splits_per_program=SPLITS_PER_PROGRAM, keygroups=SUB_BANK_KEYGROUPS, seed=seed
+    )
+
+
+def _song() -> Smdl:
+    return generate_smdl(
+        'bgm0000.smd', tracks=SONG_TRACKS, events_per_track=SONG_EVENTS // SONG_TRACKS,
+        programs=SUB_BANK_PROGRAMS, seed=SEED
+    )
+
+
+def _programs(main_bank: Swdl, sub_bank: Swdl) -> Dict[int, Program]:
+    """
+    The programs of the sub-bank. They get copies of the WAVI entries, keygroups and programs, since loading them
+    into a SWDL changes those, and the banks are used by other benchmarks.
+    """
+    programs = {}
+    main_table = main_bank.wavi.sample_info_table
+    pcmd = main_bank.pcmd.chunk_data
+    for prg in sub_bank.prgi.program_table:
+        wavis = [copy.deepcopy(main_table[split.sample_id]) for split in prg.splits]
+        programs[prg.id] = Program(
+            None, None,
+            [pcmd[w.get_initial_sample_pos():w.get_initial_sample_pos() + w.sample_length] for w in wavis],
+            copy.deepcopy(prg), [copy.deepcopy(sub_bank.kgrp.keygroups[split.keygroup_id]) for split in prg.splits],
+            wavis
+        )
+    return programs
+
+
+# ----- Benchmark runner -----
+class Benchmark:
+    def __init__(self, rounds: int):
+        self.rounds = rounds
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    def run(self, name: str, fn: Callable[[object], object], setup: Callable[[], object] = lambda: None):
+        """Runs fn(setup()) `rounds` times. Only fn is timed."""
+        times = []
+        for _ in range(self.rounds):
+            arg = setup()
+            start = time.perf_counter()
+            fn(arg)
+            times.append(time.perf_counter() - start)
+        self.results[name] = {'min': min(times), 'median': statistics.median(times), 'rounds': self.rounds}
+        print(f'{name:<40} min {min(times) * 1000:10.2f} ms   median {statistics.median(times) * 1000:10.2f} ms')
+
+    def skip(self, name: str, reason: str):
+        print(f'{name:<40} skipped: {reason}')
+
+
+def run_benchmarks(rounds: int) -> Dict[str, Dict[str, float]]:
+    main_bank = _main_bank()
+    sub_banks = [_sub_bank(f'bgm{i:04}.swd', main_bank, SEED + i) for i in range(SUB_BANKS)]
+    song = _song()
+    main_bank_data = SwdlWriter(main_bank).write()
+    sub_banks_data = [SwdlWriter(sub_bank).write() for sub_bank in sub_banks]
+    sub_bank_data = sub_banks_data[0]
+    song_data = SmdlWriter(song).write()
+    midi = smdl_to_midi(song)
+
+    bench = Benchmark(rounds)
+    bench.run('Swdl parse (main bank)', lambda _: Swdl(main_bank_data))
+    bench.run('SwdlWriter (main bank)', lambda _: SwdlWriter(main_bank).write())
+    bench.run('Swdl parse (sub-banks)', lambda _: [Swdl(data) for data in sub_banks_data])
+    bench.run('SwdlWriter (sub-banks)', lambda _: [SwdlWriter(sub_bank).write() for sub_bank in sub_banks])
+    bench.run('Smdl parse', lambda _: Smdl(song_data))
+    bench.run('validate_swdl (main bank)', lambda _: validate_swdl(main_bank_data))
+    bench.run('validate_swdl (sub-banks)', lambda _: [validate_swdl(data) for data in sub_banks_data])
+    bench.run('validate_smdl', lambda _: validate_smdl(song_data))
+    bench.run('SmdlWriter', lambda _: SmdlWriter(song).write())
+    bench.run('smdl_to_midi', lambda _: smdl_to_midi(song))
+    bench.run('midi_to_smdl', lambda _: midi_to_smdl(midi, 121, 126))
+    bench.run(
+        'Program.load_into_swdl', lambda args: args[0][0].load_into_swdl(args[1], args[2], 0),
+        lambda: (_programs(main_bank, sub_banks[0]), Swdl(sub_bank_data), Swdl(main_bank_data))
+    )
+    bench.run(
+        'Program.load_many_into_swdl', lambda args: Program.load_many_into_swdl(args[0], args[1], args[2]),
+        lambda: (_programs(main_bank, sub_banks[0]), Swdl(sub_bank_data), Swdl(main_bank_data))
+    )
+
+    # The first sub-bank and a copy with all of it's programs loaded again, which must still be consistent.
+    reloaded_main_bank, reloaded_sub_bank = Swdl(main_bank_data), Swdl(sub_bank_data)
+    for program_id, program in _programs(main_bank, sub_banks[0]).items():
+        program.load_into_swdl(reloaded_sub_bank, reloaded_main_bank, program_id)
+    consistency_banks = {'bgm0000.swd': sub_banks[0], 'bgm0000.swd (reloaded)': reloaded_sub_bank}
+    inconsistencies = check_bank_consistency(reloaded_main_bank, consistency_banks)
+    if len(inconsistencies) > 0:
+        raise AssertionError(f'Loading the programs again made the sub-bank inconsistent: {inconsistencies[0]}')
+    bench.run('check_bank_consistency', lambda _: check_bank_consistency(reloaded_main_bank, consistency_banks))
+
+    try:
+        from skytemple_dse.ppmdu_adpcm import DecodeADPCM_NDS, EncodeADPCM_IMA, Uint8Vector, Int16Vector
+    except ImportError as ex:
+        bench.skip('ADPCM decode', f'ppmdu_adpcm extension not available ({ex})')
+        bench.skip('ADPCM encode', f'ppmdu_adpcm extension not available ({ex})')
+    else:
+        adpcm = main_bank.pcmd.chunk_data[:64 * 1024]
+        adpcm_vector = Uint8Vector(len(adpcm))
+        for i, b in enumerate(adpcm):
+            adpcm_vector[i] = b
+        pcm = DecodeADPCM_NDS(adpcm_vector)
+        pcm_vector = Int16Vector(len(pcm))
+        for i, s in enumerate(pcm):
+            pcm_vector[i] = s
+        bench.run('ADPCM decode (64 KB)', lambda _: DecodeADPCM_NDS(adpcm_vector))
+        bench.run('ADPCM encode (64 KB)', lambda _: EncodeADPCM_IMA(pcm_vector))
+
+    try:
+        from skytemple_dse.synth.renderer import SmdlRenderer
+        from skytemple_dse.synth.player import SmdlPlayer
+    except ImportError as ex:
+        bench.skip('SmdlRenderer', f'numpy not available ({ex})')
+        bench.skip('SmdlPlayer', f'numpy not available ({ex})')
+    else:
+        render_song = generate_smdl(
+            'render.smd', tracks=RENDER_SONG_TRACKS, events_per_track=RENDER_SONG_EVENTS // RENDER_SONG_TRACKS,
+            programs=SUB_BANK_PROGRAMS, seed=SEED
+        )
+        bench.run(
+            'SmdlRenderer', lambda renderer: renderer.render(render_song),
+            lambda: SmdlRenderer(sub_banks[0], main_bank)
+        )
+        bench.run(
+            'SmdlPlayer (32 voices)', lambda player: player.stream(lambda block: None),
+            lambda: SmdlPlayer(render_song, sub_banks[0], main_bank, voices=32)
+        )
+
+    return bench.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the skytemple_dse benchmarks.')
+    parser.add_argument('--rounds', type=int, default=5, help='How often each benchmark runs (default: 5).')
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', default=None, help='JSON results of an earlier run to compare with.')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rounds)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            before = json.load(f)['results']
+        print()
+        print(f'{"Compared with " + args.compare:<40} (min, lower is better)')
+        for name, result in results.items():
+            if name in before:
+                print(f'{name:<40} {result["min"] / before[name]["min"]:8.2f}x')
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'seed': SEED,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Fuzzes the SWDL and SMDL parsers and validators with mutated files. The files are generated and written with
+SwdlWriter and SmdlWriter, no ROM is needed. Parsing a mutated file must either succeed or raise DseFormatError,
+quickly. Every other exception, every slow parse and every file that only one of parser and validator rejects is
+reported:
+
+    python fuzzing/fuzz.py --cases 10000
+    python fuzzing/fuzz.py --case 1234 --output crashes   (reproduces case 1234 and saves the mutated files)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import traceback
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from skytemple_dse.dse.generator import generate_swdl, generate_smdl
+from skytemple_dse.dse.smdl.analyze import smdl_song_length
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.smdl.writer import SmdlWriter
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.dse.swdl.writer import SwdlWriter
+from skytemple_dse.dse.validate import validate_swdl, validate_smdl, DseValidationError
+from skytemple_dse.util import DseFormatError
+
+SEED = 20210101
+# Parses taking longer than this (in seconds) are reported.
+DEFAULT_TIMEOUT = 1.0
+# Values that often hit edge cases when written into length, pointer and count fields.
+INTERESTING_VALUES = [0, 1, 2, 0x7F, 0x80, 0xFF, 0x100, 0x7FFF, 0x8000, 0xFFFF, 0x10000, 0x7FFFFFFF, 0xFFFFFFFF]
+# SWDL header fields: PCMD length, WAVI and PRGI slots and WAVI length.
+SWDL_FIELDS = [(0x40, 4), (0x46, 2), (0x48, 2), (0x4C, 4)]
+# SMDL fields: Number of tracks and length of the first track.
+SMDL_FIELDS = [(0x56, 1), (0x8C, 4)]
+# SMDL events with parameters, for cut_smdl_track: WAIT_ADD, WAIT_1BYTE, WAIT_2BYTE, WAIT_3BYTE and SET_TEMPO.
+SMDL_CUT_AFTER = bytes([0x91, 0x92, 0x93, 0x94, 0xA4])
+
+
+# ----- Fixtures -----
+class Target:
+    """
+    A valid file, its parser and validator and other functions to run on its mutations.
+    `fields` are the offsets and sizes of header fields that are mutated with interesting values. `cut` is a mutation
+    that cuts off the file in the middle of a structure, with the lengths updated to match.
+    """
+    def __init__(
+            self, name: str, data: bytes, parse: Callable[[bytes], object],
+            validate: Callable[[bytes], List[DseValidationError]], others: List[Callable[[bytes], object]] = (), *,
+            fields: List[Tuple[int, int]] = (), cut: Callable[[bytearray, random.Random], None] = None
+    ):
+        self.name = name
+        self.data = data
+        self.parse = parse
+        self.validate = validate
+        self.others = others
+        self.fields = fields
+        self.cut = cut
+
+
+def _targets() -> List[Target]:
+    main_bank = generate_swdl('bgm.swd', wavis=32, pcmd_size=16 * 1024, seed=SEED)
+    sub_bank = generate_swdl(
+        'bgm0000.swd', main_bank=main_bank, wavis=16, programs=8, splits_per_program=4, keygroups=4, seed=SEED
+    )
+    song = generate_smdl('bgm0000.smd', tracks=4, events_per_track=200, programs=8, seed=SEED)
+    return [
+        Target('main bank', bytes(SwdlWriter(main_bank).write()), Swdl, validate_swdl, fields=SWDL_FIELDS),
+        Target('sub-bank', bytes(SwdlWriter(sub_bank).write()), Swdl, validate_swdl, fields=SWDL_FIELDS),
+        Target(
+            'song', bytes(SmdlWriter(song).write()), Smdl, validate_smdl, [smdl_song_length],
+            fields=SMDL_FIELDS, cut=cut_smdl_track
+        ),
+    ]
+
+
+# ----- Mutations -----
+def cut_smdl_track(data: bytearray, rnd: random.Random):
+    """
+    Cuts off the SMDL right after an op code of SMDL_CUT_AFTER in a random track, before its parameters. The length
+    of the track is updated, so the track ends in the middle of the event at the end of the file.
+    """
+    pnt = 128
+    tracks = []
+    while pnt + 16 <= len(data) and data[pnt:pnt + 4] == b'trk ':
+        length = int.from_bytes(data[pnt + 0x0C:pnt + 0x10], 'little')
+        tracks.append((pnt + 0x10, min(pnt + 0x10 + length, len(data))))
+        pnt += 0x10 + length + (-length % 4)
+    if not tracks:
+        return
+    start, end = rnd.choice(tracks)
+    # Parameters with the same value are hit too, that's fine.
+    positions = [i for i in range(start + 4, end) if data[i] in SMDL_CUT_AFTER]
+    if positions:
+        pos = rnd.choice(positions) + 1
+        data[start - 4:start] = (pos - start).to_bytes(4, 'little')
+        del data[pos:]
+
+
+def mutate(target: Target, rnd: random.Random) -> bytes:
+    """
+    Applies 1-4 random mutations to the data of the target. Half of them hit the first 1 KB, where the headers and
+    tables are. If the length of the file changes, the file length in the header is usually updated, so that the
+    parsers get past the header.
+    """
+    original_length = len(target.data)
+    data = bytearray(target.data)
+    for _ in range(rnd.randint(1, 4)):
+        if len(data) == 0:
+            break
+        limit = min(len(data), 1024) if rnd.random() < 0.5 else len(data)
+        pos = rnd.randrange(limit)
+        kind = rnd.randrange(8)
+        if kind == 0:
+            data[pos] ^= 1 << rnd.randrange(8)
+        elif kind == 1:
+            data[pos] = rnd.randrange(256)
+        elif kind in (2, 3):
+            # Overwrite a 16 or 32 bit field.
+            size = 2 if kind == 2 else 4
+            pos -= pos % size
+            value = rnd.choice(INTERESTING_VALUES + [len(data), rnd.randrange(1 << 32)]) & ((1 << size * 8) - 1)
+            data[pos:pos + size] = value.to_bytes(size, 'little')
+        elif kind == 4:
+            del data[rnd.randrange(len(data)):]
+        elif kind == 5:
+            start = rnd.randrange(len(data))
+            data[pos:pos] = data[start:start + rnd.randint(1, 64)]
+        elif kind == 6 and target.fields:
+            pos, size = rnd.choice(target.fields)
+            value = rnd.choice(INTERESTING_VALUES + [len(data), len(data) + rnd.randint(-64, 64)])
+            data[pos:pos + size] = (value & ((1 << size * 8) - 1)).to_bytes(size, 'little')
+        elif kind == 7 and target.cut is not None:
+            target.cut(data, rnd)
+    if len(data) != original_length and len(data) >= 0x0C and rnd.random() < 0.75:
+        data[0x08:0x0C] = len(data).to_bytes(4, 'little')
+    return bytes(data)
+
+
+# ----- Runner -----
+def run_case(target: Target, case: int, timeout: float, output: str = None) -> Tuple[bool, List[str]]:
+    """
+    Runs all functions of the target on the mutation of the case. Returns whether the parser accepted the mutated
+    file and the problems found.
+    """
+    data = mutate(target, random.Random(f'{SEED}-{target.name}-{case}'))
+    problems = []
+    results = []
+    for fn in [target.parse, target.validate] + list(target.others):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = fn(data)
+        except DseFormatError as ex:
+            result = ex
+        except Exception:
+            problems.append(f'{target.name} case {case}: {fn.__name__} raised\n{traceback.format_exc()}')
+        duration = time.perf_counter() - start
+        if duration > timeout:
+            problems.append(f'{target.name} case {case}: {fn.__name__} took {duration:.2f} s')
+        results.append(result)
+    accepted = not isinstance(results[0], DseFormatError)
+    errors = results[1]
+    if isinstance(errors, list) and accepted == bool(errors):
+        if accepted:
+            problems.append(
+                f'{target.name} case {case}: Only {target.validate.__name__} rejected the file: {errors[0]}'
+            )
+        else:
+            problems.append(f'{target.name} case {case}: Only {target.parse.__name__} rejected the file: {results[0]}')
+    if problems and output is not None:
+        os.makedirs(output, exist_ok=True)
+        with open(os.path.join(output, f'{target.name.replace(" ", "_")}_{case}.bin'), 'wb') as f:
+            f.write(data)
+    return accepted, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzzes the skytemple_dse parsers.')
+    parser.add_argument('--cases', type=int, default=1000, help='Number of mutations per file (default: 1000).')
+    parser.add_argument('--case', type=int, default=None, help='Only run this case.')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'Report parses taking longer than this many seconds (default: {DEFAULT_TIMEOUT}).')
+    parser.add_argument('--output', default=None, help='Save the mutated files with problems in this directory.')
+    args = parser.parse_args()
+
+    cases = range(args.cases) if args.case is None else [args.case]
+    problems = []
+    for target in _targets():
+        # The unmutated files must be valid.
+        if target.validate(target.data):
+            problems.append(f'{target.name}: {target.validate.__name__} rejected the unmutated file.')
+        start = time.perf_counter()
+        accepted = 0
+        for case in cases:
+            case_accepted, case_problems = run_case(target, case, args.timeout, args.output)
+            accepted += case_accepted
+            problems += case_problems
+        print(f'{target.name:<12} {len(cases)} cases in {time.perf_counter() - start:6.1f} s, '
+              f'{accepted} accepted by {target.parse.__name__}')
+
+    for problem in problems:
+        print(problem)
+    print(f'{len(problems)} problems found.')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
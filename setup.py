@@ -50,9 +50,19 @@ setup(
         'mido >= 1.2.10',
         'sf2utils >= 0.9.0'
     ],
+    extras_require={
+        'rom': ['ndspy'],
+        'synth': ['numpy'],
+    },
     ext_modules=[
         sf2_cute, ppmdu_adpcm
     ],
+    entry_points={
+        'console_scripts': [
+            'skytemple-dse-midi-to-smd = skytemple_dse.cli.midi_to_smd:main',
+            'skytemple-dse-smd-to-midi = skytemple_dse.cli.smd_to_midi:main',
+        ],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Programming Language :: Python',
@@ -0,0 +1,35 @@
+#  Copyright 2020-2021 Parakoopa and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+import os
+from typing import Dict, List
+
+
+def output_collisions(output_paths: Dict[str, str]) -> Dict[str, str]:
+    """
+    Takes the output paths by input path and returns an error message for every input whose output path is also the
+    output path of another input (for example x.mid and x.midi), by input path.
+    """
+    inputs_by_output: Dict[str, List[str]] = {}
+    for input_path, output_path in output_paths.items():
+        inputs_by_output.setdefault(os.path.normcase(os.path.normpath(output_path)), []).append(input_path)
+    errors = {}
+    for input_paths in inputs_by_output.values():
+        if len(input_paths) > 1:
+            for input_path in input_paths:
+                others = ', '.join(p for p in input_paths if p != input_path)
+                errors[input_path] = f'Would be written to the same file as {others}. Rename one of them.'
+    return errors
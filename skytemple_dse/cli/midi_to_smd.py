@@ -0,0 +1,181 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Command line tool, that compiles a directory of MIDI files into SMDL files."""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from typing import List, Dict, Optional, Tuple
+
+from mido import MidiFile
+
+from skytemple_dse.cli import output_collisions
+from skytemple_dse.midi.midi_to_smdl import midi_to_smdl_bytes
+from skytemple_dse.util import write_file_atomic
+
+MANIFEST_NAME = '.skytemple-dse-manifest.json'
+# Fields every manifest entry must have.
+MANIFEST_FIELDS = ('sha256', 'options', 'warnings')
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+
+def _find_midis(input_dir: str) -> List[str]:
+    """Returns the paths of all MIDI files in the directory (recursive), relative to it."""
+    paths = []
+    for directory, _, filenames in os.walk(input_dir):
+        for filename in filenames:
+            if filename.lower().endswith(MIDI_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, filename), input_dir))
+    return sorted(paths)
+
+
+def _output_path(output_dir: str, rel_path: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.smd')
+
+
+def _compile(
+        rel_path: str, data: bytes, output_path: str, options: Dict[str, object]
+) -> Tuple[str, List[Dict[str, object]], Optional[str], float]:
+    """
+    Compiles one MIDI file. Runs in the worker processes.
+    Returns the relative path, the warnings, the error message (or None) and the time it took.
+    """
+    start = time.perf_counter()
+    try:
+        midi = MidiFile(file=BytesIO(data))
+        midi.filename = os.path.basename(rel_path)
+        smdl, warnings = midi_to_smdl_bytes(
+            midi, options['header1'], options['header2'],
+            compress_timing=options['compress_timing'], by_channel=options['by_channel']
+        )
+        write_file_atomic(output_path, smdl)
+    except Exception as ex:
+        return rel_path, [], f'{type(ex).__name__}: {ex}', time.perf_counter() - start
+    return rel_path, [
+        {'track_id': w.track_id, 'reason': w.reason.name, 'message': str(w)} for w in warnings
+    ], None, time.perf_counter() - start
+
+
+def _load_manifest(path: str) -> Dict[str, Dict[str, object]]:
+    """
+    Loads the manifest of the last run. Invalid entries are reported and left out, so that their files are compiled
+    again.
+    """
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict):
+        print(f'Invalid manifest {path}: Expected an object. Compiling all files again.', file=sys.stderr)
+        return {}
+    valid = {}
+    for rel_path, entry in manifest.items():
+        if not isinstance(entry, dict):
+            print(f'Invalid manifest entry for {rel_path}: Expected an object. Compiling it again.', file=sys.stderr)
+            continue
+        missing = [field for field in MANIFEST_FIELDS if field not in entry]
+        if missing:
+            print(f'Invalid manifest entry for {rel_path}: Missing {", ".join(missing)}. Compiling it again.',
+                  file=sys.stderr)
+            continue
+        valid[rel_path] = entry
+    return valid
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description='Compiles all MIDI files in a directory into SMDL (.smd) files. '
+                    'Files that did not change since the last run are skipped.'
+    )
+    parser.add_argument('input_dir', help='Directory with the MIDI files (searched recursively).')
+    parser.add_argument('output_dir', help='Directory to write the SMDL files to.')
+    parser.add_argument('--header1', type=int, required=True,
+                        help='Value for generated SET_HEADER1 events (usually unk2 of the SWDL header of the song).')
+    parser.add_argument('--header2', type=int, required=True,
+                        help='Value for generated SET_HEADER2 events (usually unk1 of the SWDL header of the song).')
+    parser.add_argument('--by-channel', action='store_true',
+                        help='Create one SMDL track per MIDI channel instead of per MIDI track.')
+    parser.add_argument('--compress-timing', action='store_true',
+                        help='Re-encode pauses and note lengths to make the files smaller.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument('--report', default=None,
+                        help='Path of the JSON report (default: report.json in the output directory).')
+    parser.add_argument('--force', action='store_true', help='Compile all files, even if they did not change.')
+    args = parser.parse_args(argv)
+
+    options = {
+        'header1': args.header1, 'header2': args.header2,
+        'by_channel': args.by_channel, 'compress_timing': args.compress_timing
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = {} if args.force else _load_manifest(manifest_path)
+    new_manifest = {}
+    report = {}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = []
+        hashes = {}
+        rel_paths = _find_midis(args.input_dir)
+        collisions = output_collisions({p: _output_path(args.output_dir, p) for p in rel_paths})
+        for rel_path in rel_paths:
+            if rel_path in collisions:
+                print(f'FAILED {rel_path}: {collisions[rel_path]}')
+                report[rel_path] = {'status': 'failed', 'error': collisions[rel_path], 'warnings': []}
+                continue
+            with open(os.path.join(args.input_dir, rel_path), 'rb') as f:
+                data = f.read()
+            hashes[rel_path] = hashlib.sha256(data).hexdigest()
+            output_path = _output_path(args.output_dir, rel_path)
+            entry = manifest.get(rel_path)
+            if entry is not None and entry['sha256'] == hashes[rel_path] and entry['options'] == options \
+                    and os.path.exists(output_path):
+                new_manifest[rel_path] = entry
+                report[rel_path] = {'status': 'unchanged', 'warnings': entry['warnings']}
+                continue
+            futures.append(executor.submit(_compile, rel_path, data, output_path, options))
+
+        for future in as_completed(futures):
+            rel_path, warnings, error, duration = future.result()
+            if error is not None:
+                print(f'FAILED {rel_path}: {error}')
+                report[rel_path] = {'status': 'failed', 'error': error, 'warnings': []}
+                continue
+            print(f'{rel_path}: {duration:.2f}s, {len(warnings)} warning(s)')
+            new_manifest[rel_path] = {'sha256': hashes[rel_path], 'options': options, 'warnings': warnings}
+            report[rel_path] = {'status': 'compiled', 'warnings': warnings}
+
+    write_file_atomic(manifest_path, json.dumps(new_manifest, indent=2, sort_keys=True).encode())
+    report_path = args.report if args.report is not None else os.path.join(args.output_dir, 'report.json')
+    write_file_atomic(report_path, json.dumps(report, indent=2, sort_keys=True).encode())
+
+    failed = sum(1 for r in report.values() if r['status'] == 'failed')
+    unchanged = sum(1 for r in report.values() if r['status'] == 'unchanged')
+    print(f'{len(report) - failed - unchanged} compiled, {unchanged} unchanged, {failed} failed '
+          f'in {time.perf_counter() - start:.2f}s.')
+    return 1 if failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Command line tool, that exports all SMDL files of a ROM or directory as MIDI files."""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from typing import List, Optional, Tuple, Iterable, Union
+
+from skytemple_dse.cli import output_collisions
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.midi.smdl_to_midi import smdl_to_midi
+from skytemple_dse.util import write_file_atomic
+
+
+def _rom_smdl_files(folder, prefix='') -> Iterable[str]:
+    """Yields the paths of all SMDL files in the ndspy Folder (recursive)."""
+    for filename in folder.files:
+        if filename.lower().endswith('.smd'):
+            yield prefix + filename
+    for name, sub_folder in folder.folders:
+        yield from _rom_smdl_files(sub_folder, prefix + name + '/')
+
+
+def _dir_smdl_files(input_dir: str) -> Iterable[str]:
+    """Yields the paths of all SMDL files in the directory (recursive), relative to it."""
+    for directory, _, filenames in os.walk(input_dir):
+        for filename in filenames:
+            if filename.lower().endswith('.smd'):
+                yield os.path.relpath(os.path.join(directory, filename), input_dir)
+
+
+def _export(rel_path: str, source: Union[bytes, str], output_path: str) -> Tuple[str, Optional[str], float]:
+    """
+    Exports one SMDL file. source is either the SMDL data or the path to the SMDL file.
+    Runs in the worker processes. Returns the relative path, the error message (or None) and the time it took.
+    """
+    start = time.perf_counter()
+    try:
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                source = f.read()
+        midi = smdl_to_midi(Smdl(source))
+        buffer = BytesIO()
+        midi.save(file=buffer)
+        write_file_atomic(output_path, buffer.getvalue())
+    except Exception as ex:
+        return rel_path, f'{type(ex).__name__}: {ex}', time.perf_counter() - start
+    return rel_path, None, time.perf_counter() - start
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description='Exports all SMDL (.smd) files of a ROM or directory as MIDI files.'
+    )
+    parser.add_argument('input', help='Path to a ROM (.nds, requires ndspy) or a directory with SMDL files.')
+    parser.add_argument('output_dir', help='Directory to write the MIDI files to.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    failed = 0
+    total = 0
+    # The relative path, the SMDL data or path and the output path of every SMDL file.
+    jobs: List[Tuple[str, Union[bytes, str], str]] = []
+    if os.path.isdir(args.input):
+        for rel_path in sorted(_dir_smdl_files(args.input)):
+            output_path = os.path.join(args.output_dir, os.path.splitext(rel_path)[0] + '.mid')
+            jobs.append((rel_path, os.path.join(args.input, rel_path), output_path))
+    else:
+        try:
+            from ndspy.rom import NintendoDSRom
+        except ImportError:
+            print('ndspy is required to read ROMs. Install it with "pip install ndspy".', file=sys.stderr)
+            return 2
+        rom = NintendoDSRom.fromFile(args.input)
+        for rel_path in _rom_smdl_files(rom.filenames):
+            output_path = os.path.join(args.output_dir, *os.path.splitext(rel_path)[0].split('/')) + '.mid'
+            jobs.append((rel_path, rom.getFileByName(rel_path), output_path))
+    # For example x.smd and x.SMD, which would both be exported to x.mid.
+    collisions = output_collisions({rel_path: output_path for rel_path, _, output_path in jobs})
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = []
+        for rel_path, source, output_path in jobs:
+            if rel_path in collisions:
+                total += 1
+                failed += 1
+                print(f'FAILED {rel_path}: {collisions[rel_path]}')
+                continue
+            futures.append(executor.submit(_export, rel_path, source, output_path))
+
+        for future in as_completed(futures):
+            rel_path, error, duration = future.result()
+            total += 1
+            if error is not None:
+                failed += 1
+                print(f'FAILED {rel_path} ({duration:.2f}s): {error}')
+            else:
+                print(f'{rel_path}: {duration:.2f}s')
+
+    print(f'{total - failed} exported, {failed} failed in {time.perf_counter() - start:.2f}s.')
+    return 1 if failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Persistent cache of parsed Swdl and Smdl models, keyed by the hash of the file contents."""
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import stat
+from typing import Union, Type, TypeVar, Optional
+
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.util import write_file_atomic
+logger = logging.getLogger(__name__)
+
+# Version of the cached models. MUST be increased whenever the model classes change in a way that
+# changes their attributes, so that models pickled by older versions are not loaded anymore.
+CACHE_SCHEMA_VERSION = 1
+# Cache entries start with the magic, the schema version (4 bytes) and the SHA-256 digest of the pickle after them.
+CACHE_ENTRY_MAGIC = b'DSEPCACHE'
+_HEADER_LENGTH = len(CACHE_ENTRY_MAGIC) + 4 + 32
+T = TypeVar('T', Swdl, Smdl)
+
+
+class DseParseCache:
+    """
+    Parses Swdl and Smdl models and stores them pickled in a directory, keyed by the SHA-256 hash of the file data.
+    When the same data is loaded again, the pickled model is returned instead of parsing the data again.
+    Changed files get a different hash and are parsed again. Entries of other schema versions are ignored.
+
+    Every load returns a new model instance, so changing a returned model does not change the cache.
+
+    The directory MUST be trusted and private to the user: The entries are pickles, and loading a pickle can run
+    arbitrary code. Entries are only unpickled if they have the header of this schema version and the digest in it
+    matches, this rejects corrupted files and files not written by this cache, but not files written on purpose
+    by someone else with access to the directory. A new directory is created only accessible by the user.
+    If the directory already exists, but belongs to another user or others can write to it, the cache is not used
+    and all files are parsed (only checked on systems with POSIX permissions).
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        # Whether the directory was checked and can be used.
+        self._usable: Optional[bool] = None
+
+    def swdl(self, data: Union[bytes, memoryview]) -> Swdl:
+        """Returns the Swdl model for the data. Same as Swdl(data)."""
+        return self._load(data, Swdl, 'swd')
+
+    def smdl(self, data: Union[bytes, memoryview]) -> Smdl:
+        """Returns the Smdl model for the data. Same as Smdl(data)."""
+        return self._load(data, Smdl, 'smd')
+
+    def clear(self):
+        """Removes all entries, including the ones of other schema versions."""
+        if os.path.exists(self.directory):
+            for name in os.listdir(self.directory):
+                if name.startswith('v'):
+                    shutil.rmtree(os.path.join(self.directory, name))
+
+    def _load(self, data: Union[bytes, memoryview], model_cls: Type[T], ext: str) -> T:
+        if not self._check_directory():
+            self.misses += 1
+            return model_cls(data)
+        key = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, f'v{CACHE_SCHEMA_VERSION}', key[:2], f'{key}.{ext}.pickle')
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    model = _read_entry(f.read())
+                if type(model) == model_cls:
+                    self.hits += 1
+                    return model
+                logger.warning(f'Invalid cache entry {path}, parsing again: Wrong model type.')
+            except Exception as ex:
+                logger.warning(f'Invalid cache entry {path}, parsing again: {ex}')
+
+        self.misses += 1
+        model = model_cls(data)
+        try:
+            write_file_atomic(path, _entry(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)))
+        except OSError as ex:
+            logger.warning(f'Could not write cache entry {path}: {ex}')
+        return model
+
+    def _check_directory(self) -> bool:
+        """Creates the directory if needed and checks, that no other user can write to it. Only checked once."""
+        if self._usable is None:
+            self._usable = False
+            try:
+                if not os.path.exists(self.directory):
+                    os.makedirs(self.directory, mode=0o700)
+                st = os.stat(self.directory)
+            except OSError as ex:
+                logger.warning(f'Can not use the cache directory {self.directory}: {ex}')
+                return False
+            if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+                logger.warning(f'Not using the cache directory {self.directory}: '
+                               f'It belongs to another user or others can write to it.')
+                return False
+            self._usable = True
+        return self._usable
+
+
+def unpickle_models(data: bytes):
+    """
+    pickle.loads for pickled models, with the garbage collector paused. The models consist of many small objects,
+    without this most of the time would be spent in garbage collections triggered by creating them.
+    The previous state of the garbage collector is restored afterwards. Only use this for trusted data.
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _entry(pickled: bytes) -> bytes:
+    return CACHE_ENTRY_MAGIC + CACHE_SCHEMA_VERSION.to_bytes(4, 'little') + hashlib.sha256(pickled).digest() + pickled
+
+
+def _read_entry(data: bytes):
+    """Checks the header of the entry and unpickles the model. Raises ValueError if the header doesn't match."""
+    magic_end = len(CACHE_ENTRY_MAGIC)
+    if len(data) < _HEADER_LENGTH or data[:magic_end] != CACHE_ENTRY_MAGIC:
+        raise ValueError("Not a cache entry.")
+    if int.from_bytes(data[magic_end:magic_end + 4], 'little') != CACHE_SCHEMA_VERSION:
+        raise ValueError("Wrong schema version.")
+    pickled = data[_HEADER_LENGTH:]
+    if hashlib.sha256(pickled).digest() != data[magic_end + 4:_HEADER_LENGTH]:
+        raise ValueError("Digest does not match.")
+    return unpickle_models(pickled)
@@ -29,6 +29,8 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+from skytemple_dse.util import DseFormatError
+
 
 class DseFilenameString(str):
     def __init__(self, string: str):
@@ -37,14 +39,17 @@ class DseFilenameString(str):
 
     @classmethod
     def from_bytes(cls, data: bytes):
-        pos = 0
-        while data[pos] != 0 and pos < len(data):
-            pos += 1
-        if pos >= len(data):
-            raise ValueError("DseFilenameString: EOF")
-        string = str(data[:pos], 'ascii')
+        data = bytes(data)
+        pos = data.find(0)
+        if pos == -1:
+            raise DseFormatError("DseFilenameString: EOF")
+        try:
+            string = str(data[:pos], 'ascii')
+        except UnicodeDecodeError:
+            raise DseFormatError("DseFilenameString: Not ASCII") from None
         rest = data[pos:]
-        assert rest == bytes([0x00] + [0xAA] * (len(rest) - 1)) or rest == bytes([0x00] + [0xFF] * (len(rest) - 1)), "Invalid DseFilenameString padding"
+        if rest != bytes([0x00] + [0xAA] * (len(rest) - 1)) and rest != bytes([0x00] + [0xFF] * (len(rest) - 1)):
+            raise DseFormatError("Invalid DseFilenameString padding")
         return cls(string)
 
     def to_bytes(self, end_byte_0xaa=False):
@@ -0,0 +1,178 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Generates valid synthetic SWDL and SMDL files of any size, for benchmarks, load tests and fuzzing."""
+import random
+from typing import Optional, Sequence, List
+
+from skytemple_dse.dse.smdl.model import Smdl, SmdlTrack, SmdlEventPlayNote, SmdlEventPause, SmdlPause, SmdlNote, \
+    SmdlEventSpecial, SmdlSpecialOpCode
+from skytemple_dse.dse.smdl.writer import SmdlWriter
+from skytemple_dse.dse.swdl.compact import set_sub_bank_sample_positions
+from skytemple_dse.dse.swdl.kgrp import SwdlKeygroup
+from skytemple_dse.dse.swdl.model import Swdl, SwdlPcmdLen
+from skytemple_dse.dse.swdl.prgi import SwdlProgramTable, SwdlSplitEntry
+from skytemple_dse.dse.swdl.wavi import SwdlSampleInfoTblEntry, SampleFormatConsts
+from skytemple_dse.dse.swdl.writer import SwdlWriter
+from skytemple_dse.util import dse_write_uintle
+
+_CHUNK_HEADER = b'\0\0\x15\x04\x10\0\0\0\0\0\0\0'
+_SETTERS = (SmdlSpecialOpCode.SET_VOLUME, SmdlSpecialOpCode.SET_PAN, SmdlSpecialOpCode.SET_XPRESS)
+
+
+def generate_swdl(
+        name: str, *, wavis: int = 0, pcmd_size: int = 0, programs: int = 0, splits_per_program: int = 1,
+        keygroups: int = 1, sample_formats: Sequence[int] = (SampleFormatConsts.ADPCM_4BIT,),
+        main_bank: Optional[Swdl] = None, seed: int = 0
+) -> Swdl:
+    """
+    Generates a SWDL with random, but valid, content. The model is written with the SwdlWriter and parsed again
+    before it is returned, use SwdlWriter to get the file data.
+
+    - Without main_bank, it contains `wavis` WAVI entries and its own sample data of (about) `pcmd_size` bytes.
+      The samples have the formats of sample_formats, in turns. Without programs this is a main bank.
+    - With main_bank, it's a sub-bank of it: It contains copies of `wavis` random WAVI entries of the main bank
+      (all of them if wavis is 0), with the sample positions of set_sub_bank_sample_positions, and no sample data.
+    - It contains `programs` programs with `splits_per_program` splits each, which use random WAVI entries and
+      random ones of `keygroups` keygroups. PRGI offsets are 16 bit, so the programs can only have about 1300
+      splits in total.
+    """
+    rnd = random.Random(seed)
+    swdl = _empty_swdl(name, with_prgi=programs > 0, with_pcmd=main_bank is None)
+
+    if main_bank is None:
+        if wavis > 0:
+            sample_length = max(8, pcmd_size // wavis // 4 * 4)
+            swdl.wavi.sample_info_table = [
+                _wavi(i, i * sample_length, sample_length, sample_formats[i % len(sample_formats)], rnd)
+                for i in range(wavis)
+            ]
+            size = sample_length * wavis
+            swdl.pcmd.chunk_data = rnd.getrandbits(size * 8).to_bytes(size, 'little')
+        swdl.header.pcmdlen = SwdlPcmdLen(len(swdl.pcmd.chunk_data), False)
+    else:
+        main_table = main_bank.wavi.sample_info_table
+        available = [i for i, w in enumerate(main_table) if w is not None]
+        used = sorted(rnd.sample(available, wavis)) if 0 < wavis < len(available) else available
+        table: List[Optional[SwdlSampleInfoTblEntry]] = [None] * (used[-1] + 1 if len(used) > 0 else 0)
+        for wavi_id in used:
+            table[wavi_id] = main_table[wavi_id].copy()
+        swdl.wavi.sample_info_table = table
+        set_sub_bank_sample_positions(swdl)
+
+    if programs > 0:
+        used_wavis = [w for w in swdl.wavi.sample_info_table if w is not None]
+        if len(used_wavis) < 1:
+            raise ValueError("Programs need at least one WAVI entry.")
+        swdl.kgrp.keygroups = [SwdlKeygroup(bytes([i & 0xFF, i >> 8, 0xFF, 8, 0, 0xF, 0, 0]), i)
+                               for i in range(keygroups)]
+        for prg_id in range(programs):
+            splits = []
+            for split_id in range(splits_per_program):
+                low = split_id * 128 // splits_per_program
+                high = (split_id + 1) * 128 // splits_per_program - 1
+                wavi = rnd.choice(used_wavis)
+                splits.append(SwdlSplitEntry.new(
+                    split_id, 2, 0, low, high, 0, 127, 0, 0, wavi.id, 0, 0, wavi.rootkey, 0, 127, 64,
+                    rnd.randrange(keygroups), 2, 0, 0, 1, 1, 1, 3, 0, 0, 0, 0, 0, 127, 0, 127, wavi.release, -1
+                ))
+            swdl.prgi.program_table.append(
+                SwdlProgramTable.new(prg_id, 127, 64, 0, 15, 512, 0, 0xAA, 0, 0, 0, [], splits)
+            )
+
+    return Swdl(SwdlWriter(swdl).write())
+
+
+def generate_smdl(
+        name: str, *, tracks: int = 16, events_per_track: int = 1000, note_ratio: float = 0.5,
+        programs: int = 1, loop: bool = True, seed: int = 0
+) -> Smdl:
+    """
+    Generates a SMDL with random, but valid, content. The model is written with the SmdlWriter and parsed again
+    before it is returned, use SmdlWriter to get the file data.
+
+    It has `tracks` tracks with (about) `events_per_track` events each. note_ratio is the share of notes among the
+    events, the other events are pauses, octave changes and volume, pan and expression changes. The tracks use
+    random programs with IDs below `programs`. If loop is True, every track has a loop point at the start.
+    """
+    rnd = random.Random(seed)
+    smdl = Smdl.new(name)
+    for track_id in range(tracks):
+        track = SmdlTrack.new(track_id, track_id % 16)
+        events = track.events
+        if track_id == 0:
+            events.append(SmdlEventSpecial(SmdlSpecialOpCode.SET_TEMPO, [rnd.randint(60, 200)]))
+        events.append(SmdlEventSpecial(SmdlSpecialOpCode.SET_SAMPLE, [rnd.randrange(programs)]))
+        events.append(SmdlEventSpecial(SmdlSpecialOpCode.SET_OCTAVE, [4]))
+        if loop:
+            events.append(SmdlEventSpecial(SmdlSpecialOpCode.LOOP_POINT, []))
+        octave = 4
+        while len(events) < events_per_track - 1:
+            r = rnd.random()
+            if r < note_ratio:
+                octave_mod = rnd.choice((-1, 0, 0, 0, 1)) if 1 <= octave <= 8 else 0
+                octave += octave_mod
+                events.append(SmdlEventPlayNote(
+                    rnd.randint(40, 127), octave_mod, SmdlNote(rnd.randrange(12)),
+                    rnd.choice((-1, rnd.randint(1, 192)))
+                ))
+            elif r < note_ratio + (1 - note_ratio) * 0.6:
+                if rnd.random() < 0.8:
+                    events.append(SmdlEventPause(rnd.choice(list(SmdlPause))))
+                else:
+                    events.append(SmdlEventSpecial(SmdlSpecialOpCode.WAIT_1BYTE, [rnd.randint(1, 255)]))
+            elif r < note_ratio + (1 - note_ratio) * 0.9:
+                events.append(SmdlEventSpecial(rnd.choice(_SETTERS), [rnd.randint(0, 127)]))
+            else:
+                octave = rnd.randint(3, 5)
+                events.append(SmdlEventSpecial(SmdlSpecialOpCode.SET_OCTAVE, [octave]))
+        events.append(SmdlEventSpecial(SmdlSpecialOpCode.TRACK_END, []))
+        smdl.tracks.append(track)
+    return Smdl(SmdlWriter(smdl).write())
+
+
+def _empty_swdl(name: str, with_prgi: bool, with_pcmd: bool) -> Swdl:
+    header = bytearray(0x50)
+    header[0:4] = b'swdl'
+    dse_write_uintle(header, 0x415, 0x0C, 2)
+    header[0x18:0x20] = bytes([0xE4, 0x07, 1, 1, 0, 0, 0, 0])
+    header[0x20:0x30] = (name.encode('ascii')[:15] + b'\0').ljust(16, b'\xAA')
+    header[0x30:0x34] = b'\0\xAA\xAA\xAA'
+    chunks = bytearray(b'wavi' + _CHUNK_HEADER)
+    if with_prgi:
+        chunks += b'prgi' + _CHUNK_HEADER
+        chunks += b'kgrp' + _CHUNK_HEADER
+    if with_pcmd:
+        chunks += b'pcmd' + _CHUNK_HEADER
+        dse_write_uintle(header, 0x10, 0x40, 4)
+    else:
+        dse_write_uintle(header, 0xAAAA0000, 0x40, 4)
+    chunks += b'eod ' + _CHUNK_HEADER
+    dse_write_uintle(header, len(header) + len(chunks), 0x08, 4)
+    return Swdl(bytes(header + chunks))
+
+
+def _wavi(wavi_id: int, sample_pos: int, sample_length: int, sample_format: int,
+          rnd: random.Random) -> SwdlSampleInfoTblEntry:
+    wavi = SwdlSampleInfoTblEntry(None, None)
+    vars(wavi).update(dict(
+        id=wavi_id, ftune=0, ctune=0, rootkey=rnd.randint(36, 84), ktps=0, volume=127, pan=64, unk5=0, unk58=0,
+        sample_format=sample_format, unk9=0, loop=True, unk10=0, unk11=0, unk12=0, unk13=0,
+        sample_rate=rnd.choice((11025, 22050, 32728)), sample=None, _sample_pos=sample_pos, loop_begin_pos=1,
+        loop_length=sample_length // 4 - 1, envelope=1, envelope_multiplier=1, unk19=0, unk20=0, unk21=0, unk22=0,
+        attack_volume=0, attack=0, decay=0, sustain=127, hold=0, decay2=127, release=rnd.randint(20, 60), unk57=0
+    ))
+    return wavi
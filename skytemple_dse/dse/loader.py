@@ -0,0 +1,143 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Loads all DSE files of a sound directory at once, parsing them in parallel."""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Mapping, Tuple, Union, List
+
+from skytemple_dse.dse.cache import DseParseCache, unpickle_models
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.util import DseAutoString
+
+# With fewer files, starting the worker processes takes longer than parsing them in one process.
+MIN_PARALLEL_FILES = 8
+
+
+class DseSoundPair(DseAutoString):
+    """A song (SMDL) and the sub-bank (SWDL) with the same name. Either may be missing."""
+    def __init__(self, name: str):
+        self.name = name
+        self.swdl: Optional[Swdl] = None
+        self.smdl: Optional[Smdl] = None
+
+
+class DseSoundSet(DseAutoString):
+    def __init__(self):
+        # File name of the main bank (the SWDL with sample data but no programs).
+        self.main_bank_name: Optional[str] = None
+        self.main_bank: Optional[Swdl] = None
+        # Sub-banks and songs by their file name without the extension.
+        self.pairs: Dict[str, DseSoundPair] = {}
+        # Error messages of the files that could not be loaded, by file name.
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def sub_banks(self) -> Dict[str, Swdl]:
+        return {name: pair.swdl for name, pair in self.pairs.items() if pair.swdl is not None}
+
+    @property
+    def songs(self) -> Dict[str, Smdl]:
+        return {name: pair.smdl for name, pair in self.pairs.items() if pair.smdl is not None}
+
+
+def _parse(
+        job: Tuple[str, bytes, Optional[DseParseCache]]
+) -> Tuple[str, Optional[Union[Swdl, Smdl]], Optional[str]]:
+    """Parses one file. Runs in the worker processes. Returns the file name, the model and an error message."""
+    filename, data, cache = job
+    try:
+        if filename.lower().endswith('.swd'):
+            return filename, cache.swdl(data) if cache is not None else Swdl(data), None
+        return filename, cache.smdl(data) if cache is not None else Smdl(data), None
+    except Exception as ex:
+        return filename, None, f'{type(ex).__name__}: {ex}'
+
+
+def _parse_pickled(
+        job: Tuple[str, bytes, Optional[DseParseCache]]
+) -> Tuple[str, Optional[bytes], Optional[str], int, int]:
+    """
+    Like _parse, but returns the model pickled. The pool would unpickle the results in its own thread, this way
+    they are unpickled by load_sound_files instead, see unpickle_models.
+    The worker processes use copies of the cache, so the number of cache hits and misses is returned as well.
+    """
+    cache = job[2]
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    filename, model, error = _parse(job)
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    if model is None:
+        return filename, None, error, hits, misses
+    return filename, pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL), None, hits, misses
+
+
+def load_sound_files(
+        files: Mapping[str, bytes], *, max_workers: int = None, cache: DseParseCache = None
+) -> DseSoundSet:
+    """
+    Parses all SWDL (.swd) and SMDL (.smd) files of the mapping of file names to data, using a pool of
+    max_workers processes (default: number of CPUs). Other files are ignored. With only one worker, or too few
+    files to make up for starting the processes, the files are parsed in this process instead.
+
+    The SWDL that has sample data but no programs is returned as the main bank. All other files are grouped into
+    DseSoundPairs by their name without the extension. Files that can not be parsed don't stop the loading, their
+    errors are collected in the `errors` of the result instead. If a cache is given, it's used to load the models,
+    it's `hits` and `misses` include the files parsed by the worker processes.
+    """
+    jobs: List[Tuple[str, bytes, Optional[DseParseCache]]] = [
+        (filename, data, cache) for filename, data in files.items()
+        if filename.lower().endswith('.swd') or filename.lower().endswith('.smd')
+    ]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or len(jobs) < MIN_PARALLEL_FILES:
+        results = map(_parse, jobs)
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            pickled_results = list(
+                executor.map(_parse_pickled, jobs, chunksize=max(1, len(jobs) // (max_workers * 4)))
+            )
+        if cache is not None:
+            cache.hits += sum(hits for _, _, _, hits, _ in pickled_results)
+            cache.misses += sum(misses for _, _, _, _, misses in pickled_results)
+        results = (
+            (filename, unpickle_models(pickled) if pickled is not None else None, error)
+            for filename, pickled, error, _, _ in pickled_results
+        )
+
+    sound_set = DseSoundSet()
+    for filename, model, error in results:
+        if error is not None:
+            sound_set.errors[filename] = error
+            continue
+        if isinstance(model, Swdl) and model.prgi is None and model.pcmd is not None:
+            if sound_set.main_bank is not None:
+                sound_set.errors[filename] = f'Multiple main banks found. Already using {sound_set.main_bank_name}.'
+                continue
+            sound_set.main_bank_name = filename
+            sound_set.main_bank = model
+            continue
+        name = os.path.splitext(filename)[0]
+        if name not in sound_set.pairs:
+            sound_set.pairs[name] = DseSoundPair(name)
+        if isinstance(model, Swdl):
+            sound_set.pairs[name].swdl = model
+        else:
+            sound_set.pairs[name].smdl = model
+    return sound_set
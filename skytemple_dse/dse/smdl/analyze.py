@@ -0,0 +1,149 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Reads the length, loop point and tempo changes of SMDL songs directly from the file data, without parsing them."""
+from bisect import bisect_right
+from typing import List, Tuple, Optional, Union
+
+from skytemple_dse.dse.smdl.model import SmdlEventPlayNote, SmdlEventPause, SmdlPause, SMDL_PARAMETER_BYTES
+from skytemple_dse.dse.smdl.timeline import DEFAULT_BPM
+from skytemple_dse.util import DseAutoString, DseFormatError, dse_read_uintle
+
+# Length in ticks of the pause events by op code.
+_PAUSE_LENGTHS = {pause.value: pause.length for pause in SmdlPause}
+
+
+class SmdlSongLength(DseAutoString):
+    """The length and loop point of a song in ticks and seconds, and its tempo changes."""
+    def __init__(self, tpqn: int, ticks: int, loop_tick: Optional[int], tempo_changes: List[Tuple[int, int]]):
+        self.tpqn = tpqn
+        # Tick at which the last track ends
+        self.ticks = ticks
+        # Tick of the loop point, None if the song doesn't loop.
+        self.loop_tick = loop_tick
+        # Tempo changes as (tick, beats per minute), ascending.
+        self.tempo_changes = tempo_changes
+        self._tempo_ticks = [t for t, _ in tempo_changes]
+        # Seconds at each tempo change.
+        self._tempo_seconds = []
+        seconds = 0.0
+        prev_tick, prev_bpm = 0, DEFAULT_BPM
+        for tick, bpm in tempo_changes:
+            seconds += (tick - prev_tick) * 60 / (prev_bpm * tpqn)
+            self._tempo_seconds.append(seconds)
+            prev_tick, prev_bpm = tick, bpm
+
+    @property
+    def seconds(self) -> float:
+        return self.ticks_to_seconds(self.ticks)
+
+    @property
+    def loop_seconds(self) -> Optional[float]:
+        """The time of the loop point in seconds, None if the song doesn't loop."""
+        return None if self.loop_tick is None else self.ticks_to_seconds(self.loop_tick)
+
+    def ticks_to_seconds(self, tick: int) -> float:
+        i = bisect_right(self._tempo_ticks, tick)
+        if i == 0:
+            return tick * 60 / (DEFAULT_BPM * self.tpqn)
+        start_tick, bpm = self.tempo_changes[i - 1]
+        return self._tempo_seconds[i - 1] + (tick - start_tick) * 60 / (bpm * self.tpqn)
+
+
+def smdl_song_length(data: Union[bytes, memoryview]) -> SmdlSongLength:
+    """
+    Reads the length, loop point and tempo changes of the SMDL file. The tracks are read up to their TRACK_END
+    event, with the same timing as Smdl and smdl_to_midi; the song ends with the longest track. The loop point is the
+    earliest one of all tracks.
+    Raises DseFormatError if the data is not a valid SMDL file.
+    """
+    if len(data) < 128 or data[0:4] != b'smdl' or data[64:68] != b'song':
+        raise DseFormatError("Data is not valid SMDL")
+    tpqn = dse_read_uintle(data, 64 + 0x12, 2)
+    if tpqn == 0:
+        raise DseFormatError("Data is not valid SMDL: The song has 0 ticks per quarter note.")
+    track_count = dse_read_uintle(data, 64 + 0x16, 1)
+    tempo_changes = []
+    loop_tick = None
+    ticks = 0
+    pnt = 128
+    for track_id in range(track_count):
+        if pnt + 16 > len(data) or data[pnt:pnt + 4] != b'trk ':
+            raise DseFormatError(f"Data is not valid SMDL: Track {track_id} not found at 0x{pnt:x}.")
+        length = dse_read_uintle(data, pnt + 0x0C, 4)
+        start = pnt + 16
+        end = start + length
+        if end > len(data):
+            raise DseFormatError(
+                f"Data is not valid SMDL: Track {track_id} at 0x{pnt:x} ends after the end of the file."
+            )
+        track_ticks, track_loop_tick = _read_track(data, start + 4, end, tempo_changes)
+        ticks = max(ticks, track_ticks)
+        if track_loop_tick is not None and (loop_tick is None or track_loop_tick < loop_tick):
+            loop_tick = track_loop_tick
+        pnt = end + (-length % 4)
+    tempo_changes.sort(key=lambda t: t[0])
+    return SmdlSongLength(tpqn, ticks, loop_tick, tempo_changes)
+
+
+def _read_track(data, pnt: int, end: int, tempo_changes: List[Tuple[int, int]]) -> Tuple[int, Optional[int]]:
+    """Reads the events from pnt to end. Returns the tick at the end of the track and the tick of its loop point."""
+    pause_lengths = _PAUSE_LENGTHS
+    param_bytes = SMDL_PARAMETER_BYTES
+    tick = 0
+    last_wait = 0
+    loop_tick = None
+    while pnt < end:
+        op = data[pnt]
+        pnt += 1
+        if op <= SmdlEventPlayNote.MAX:
+            # Skip the key down duration bytes, notes don't advance the time.
+            pnt += 1 + (data[pnt] >> 6 & 0x3) if pnt < end else 1
+            if pnt > end:
+                raise DseFormatError("Tried to read past EOF while reading SMDL track data")
+            continue
+        if op <= SmdlEventPause.MAX:
+            tick += pause_lengths[op]
+            continue
+        count = param_bytes[op]
+        if count is None:
+            raise DseFormatError(f"Data is not valid SMDL: Unknown event 0x{op:02x} at 0x{pnt - 1:x}.")
+        # The parameters are checked before they are read.
+        if pnt + count > end:
+            raise DseFormatError("Tried to read past EOF while reading SMDL track data")
+        if op == 0x90:  # WAIT_AGAIN
+            tick += last_wait
+        elif op == 0x91:  # WAIT_ADD
+            last_wait += data[pnt]
+            tick += last_wait
+        elif op == 0x92:  # WAIT_1BYTE
+            last_wait = data[pnt]
+            tick += last_wait
+        elif op == 0x93:  # WAIT_2BYTE
+            last_wait = data[pnt] | data[pnt + 1] << 8
+            tick += last_wait
+        elif op == 0x94:  # WAIT_3BYTE
+            last_wait = data[pnt] | data[pnt + 1] << 8 | data[pnt + 2] << 16
+            tick += last_wait
+        elif op == 0x98:  # TRACK_END
+            break
+        elif op == 0x99:  # LOOP_POINT
+            loop_tick = tick
+        elif op == 0xA4:  # SET_TEMPO
+            if data[pnt] > 0:
+                tempo_changes.append((tick, data[pnt]))
+        pnt += count
+    return tick, loop_tick
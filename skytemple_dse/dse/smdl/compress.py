@@ -0,0 +1,110 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Re-encodes the timing of SMDL events with the shortest possible encodings."""
+from typing import Optional, Dict
+
+from skytemple_dse.dse.smdl.model import SmdlTrack, SmdlEvent, SmdlEventPause, SmdlEventPlayNote, SmdlEventSpecial, \
+    SmdlSpecialOpCode, SmdlPause, SmdlTimingResolver
+
+# Fixed pause events by their length in ticks.
+_FIXED_PAUSES: Dict[int, SmdlPause] = {pause.length: pause for pause in SmdlPause}
+_WAIT_OPS = (
+    SmdlSpecialOpCode.WAIT_AGAIN, SmdlSpecialOpCode.WAIT_ADD, SmdlSpecialOpCode.WAIT_1BYTE,
+    SmdlSpecialOpCode.WAIT_2BYTE, SmdlSpecialOpCode.WAIT_3BYTE
+)
+
+
+class SmdlTimingCompressor:
+    """
+    Re-encodes the pauses and note lengths of the events of a track, so that they take up as little space as possible:
+
+    - Consecutive pauses are merged and then encoded with a fixed pause event (1 byte) if one matches, with WAIT_AGAIN
+      (1 byte) if the last wait time matches, or else the shortest of WAIT_1BYTE, WAIT_ADD and WAIT_2BYTE.
+    - The key down duration of notes is omitted, if it is the same as the one of the previous note.
+
+    It is not known whether the game counts fixed pauses as the last wait time, so WAIT_AGAIN and WAIT_ADD are only
+    used when both interpretations result in the same timing. After a loop point the last wait time and note length
+    are treated as unknown, since they depend on the end of the track when looping.
+
+    Events are appended like to a list. The re-encoded events are appended to `target`, which can be anything with an
+    `append` method. Call flush after appending the last event.
+    """
+    def __init__(self, target):
+        self.target = target
+        self._pending_wait = 0
+        # Resolves the times of the appended events.
+        self._in = SmdlTimingResolver()
+        # Timing state of the re-encoded events, None if not known.
+        self._out_last_wait: Optional[int] = None
+        self._out_last_note_len: Optional[int] = None
+
+    def append(self, event: SmdlEvent):
+        duration = self._in.resolve(event)
+        if isinstance(event, SmdlEventPause) or (isinstance(event, SmdlEventSpecial) and event.op in _WAIT_OPS):
+            self._pending_wait += duration
+            return
+        self.flush()
+        if isinstance(event, SmdlEventPlayNote):
+            length = duration
+            if length == self._out_last_note_len:
+                event = SmdlEventPlayNote(event.velocity, event.octave_mod, event.note, -1)
+            elif length != event.key_down_duration:
+                event = SmdlEventPlayNote(event.velocity, event.octave_mod, event.note, length)
+            self._out_last_note_len = length
+        elif isinstance(event, SmdlEventSpecial) and event.op == SmdlSpecialOpCode.LOOP_POINT:
+            self._out_last_wait = None
+            self._out_last_note_len = None
+        self.target.append(event)
+
+    def flush(self):
+        """Writes the pauses that were appended since the last other event."""
+        wait = self._pending_wait
+        self._pending_wait = 0
+        while wait > 0xFFFF:
+            self._write_wait(0xFFFF)
+            wait -= 0xFFFF
+        if wait > 0:
+            self._write_wait(wait)
+
+    def _write_wait(self, wait: int):
+        last_wait = self._out_last_wait
+        if wait == last_wait:
+            self.target.append(SmdlEventSpecial(SmdlSpecialOpCode.WAIT_AGAIN, params=[]))
+            return
+        if wait in _FIXED_PAUSES:
+            self.target.append(SmdlEventPause(_FIXED_PAUSES[wait]))
+            # The game may or may not remember this as the last wait time.
+            self._out_last_wait = None
+            return
+        if wait <= 0xFF:
+            self.target.append(SmdlEventSpecial(SmdlSpecialOpCode.WAIT_1BYTE, params=[wait]))
+        elif last_wait is not None and 0 <= wait - last_wait <= 0xFF:
+            self.target.append(SmdlEventSpecial(SmdlSpecialOpCode.WAIT_ADD, params=[wait - last_wait]))
+        else:
+            params = list(int.to_bytes(wait, 2, byteorder='little', signed=False))
+            self.target.append(SmdlEventSpecial(SmdlSpecialOpCode.WAIT_2BYTE, params=params))
+        self._out_last_wait = wait
+
+
+def compress_track(track: SmdlTrack):
+    """Re-encodes the timing of the events of the track in place. See SmdlTimingCompressor."""
+    events = []
+    compressor = SmdlTimingCompressor(events)
+    for event in track.events:
+        compressor.append(event)
+    compressor.flush()
+    track.events = events
@@ -16,12 +16,14 @@
 #  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
 import warnings
 from enum import Enum
-from typing import Union, List, Optional
+from typing import Union, List, Optional, Iterable
 
 from skytemple_dse.dse.common.date import DseDate
 from skytemple_dse.dse.common.string import DseFilenameString
 from skytemple_dse.util import *
 SMDL_VERSION = 1045
+# Maximum number of events of all tracks of a SMDL file together, read by the parser.
+MAX_EVENTS = 0x100000
 
 
 class SmdlHeader(DseAutoString):
@@ -37,14 +39,16 @@ class SmdlHeader(DseAutoString):
             self.unk8 = 0xFFFFFFFF  # UNKNOWN!! Usual value.
             self.unk9 = 0xFFFFFFFF  # UNKNOWN!! Usual value.
             return
-        assert data[0:4] == b'smdl', "Data is not valid SMDL"
-        assert data[4:8] == bytes(4), "Data is not valid SMDL"
+        if len(data) < 64 or data[0:4] != b'smdl' or data[4:8] != bytes(4):
+            raise DseFormatError("Data is not valid SMDL")
         self._in_length = dse_read_uintle(data, 0x08, 4)
-        assert len(data) == self._in_length, "Data is not valid SMDL"
+        if len(data) != self._in_length:
+            raise DseFormatError("Data is not valid SMDL: Wrong file length in header.")
         self.version = dse_read_uintle(data, 0x0C, 2)
         self.unk1 = dse_read_uintle(data, 0x0E, 1)
         self.unk2 = dse_read_uintle(data, 0x0F, 1)
-        assert data[0x10:0x18] == bytes(8), "Data is not valid SMDL"
+        if data[0x10:0x18] != bytes(8):
+            raise DseFormatError("Data is not valid SMDL")
         self.modified_date = DseDate.from_bytes(data[0x18:0x20])
         self.file_name = DseFilenameString.from_bytes(data[0x20:0x30])
         self.unk5 = dse_read_uintle(data, 0x30, 4)
@@ -90,7 +94,8 @@ class SmdlSong(DseAutoString):
             self.unk11 = 0x0800  # UNKNOWN!! Usual value
             self.unk12 = 0xFFFFFF00  # UNKNOWN!! Usual value
             return
-        assert data[0:4] == b'song', "Data is not valid SMDL"
+        if len(data) < 64 or data[0:4] != b'song':
+            raise DseFormatError("Data is not valid SMDL")
         self.unk1 = dse_read_uintle(data, 0x04, 4)
         self.unk2 = dse_read_uintle(data, 0x08, 4)
         self.unk3 = dse_read_uintle(data, 0x0C, 4)
@@ -108,7 +113,8 @@ class SmdlSong(DseAutoString):
         self.unk10 = dse_read_uintle(data, 0x28, 2)
         self.unk11 = dse_read_uintle(data, 0x2A, 2)
         self.unk12 = dse_read_uintle(data, 0x2C, 4)
-        assert data[0x30:0x40] == bytes([0xFF] * 16), "Data is not valid SMDL"
+        if data[0x30:0x40] != bytes([0xFF] * 16):
+            raise DseFormatError("Data is not valid SMDL")
 
     def get_initial_track_count(self):
         return self._nbtrks
@@ -145,10 +151,12 @@ class SmdlEoc(DseAutoString):
             self.param1 = 16777216  # UNKNOWN!! Usual value
             self.param2 = 65284  # UNKNOWN!! Usual value
             return
-        assert data[0:4] == b'eoc\x20', "Data is not valid SMDL"
+        if len(data) < 16 or data[0:4] != b'eoc\x20':
+            raise DseFormatError("Data is not valid SMDL")
         self.param1 = dse_read_uintle(data, 0x04, 4)
         self.param2 = dse_read_uintle(data, 0x08, 4)
-        assert dse_read_uintle(data, 0x0C, 4) == 0
+        if dse_read_uintle(data, 0x0C, 4) != 0:
+            raise DseFormatError("Data is not valid SMDL")
 
     @classmethod
     def new(cls):
@@ -168,7 +176,8 @@ class SmdlTrackHeader(DseAutoString):
             self.param1 = 16777216  # UNKNOWN!! Value often used.
             self.param2 = 65284  # UNKNOWN!! Value often used.
             return
-        assert data[0:4] == b'trk\x20', "Data is not valid SMDL"
+        if len(data) < 16 or data[0:4] != b'trk\x20':
+            raise DseFormatError("Data is not valid SMDL")
         self.param1 = dse_read_uintle(data, 0x4, 4)
         self.param2 = dse_read_uintle(data, 0x8, 4)
         self._len = dse_read_uintle(data, 0xC, 4)
@@ -293,7 +302,7 @@ class SmdlSpecialOpCode(Enum):
     WAIT_ADD = 0x91, 1
     WAIT_1BYTE = 0x92, 1
     WAIT_2BYTE = 0x93, 2  # LE
-    WAIT_3BYTE = 0x94, 2  # LE
+    WAIT_3BYTE = 0x94, 3  # LE
     TRACK_END = 0x98, 0
     LOOP_POINT = 0x99, 0
     SET_OCTAVE = 0xA0, 1
@@ -340,6 +349,16 @@ class SmdlSpecialOpCode(Enum):
         self.parameters = parameters
 
 
+# Number of parameter bytes of the special events by op code, None for op codes that are not special events.
+# Includes the unknown op codes the parser skips (0xAB, 0xCB and 0xF8).
+SMDL_PARAMETER_BYTES: List[Optional[int]] = [None] * 256
+for _op in SmdlSpecialOpCode:
+    SMDL_PARAMETER_BYTES[_op.value] = _op.parameters
+SMDL_PARAMETER_BYTES[0xAB] = 1
+SMDL_PARAMETER_BYTES[0xCB] = 2
+SMDL_PARAMETER_BYTES[0xF8] = 2
+
+
 class SmdlEventSpecial(DseAutoString):
     def __init__(self, op: SmdlSpecialOpCode, params: List[int]):
         self.op = op
@@ -384,20 +403,149 @@ class SmdlEventSpecial(DseAutoString):
 SmdlEvent = Union[SmdlEventSpecial, SmdlEventPause, SmdlEventPlayNote]
 
 
+class SmdlEventList(list):
+    """
+    The list of events of a track. It counts changes to the list in `version`, so that data computed from the
+    events can be cached. Changes to the events themselves are not counted.
+    """
+    version = 0
+
+    def __setitem__(self, key, value):
+        self.version += 1
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.version += 1
+        super().__delitem__(key)
+
+    def __iadd__(self, other):
+        self.version += 1
+        return super().__iadd__(other)
+
+    def __imul__(self, other):
+        self.version += 1
+        return super().__imul__(other)
+
+    def append(self, event: 'SmdlEvent'):
+        self.version += 1
+        super().append(event)
+
+    def extend(self, events: Iterable['SmdlEvent']):
+        self.version += 1
+        super().extend(events)
+
+    def insert(self, index: int, event: 'SmdlEvent'):
+        self.version += 1
+        super().insert(index, event)
+
+    def pop(self, index: int = -1) -> 'SmdlEvent':
+        self.version += 1
+        return super().pop(index)
+
+    def remove(self, event: 'SmdlEvent'):
+        self.version += 1
+        super().remove(event)
+
+    def clear(self):
+        self.version += 1
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self.version += 1
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self.version += 1
+        super().reverse()
+
+
+class SmdlTimingResolver:
+    """
+    Resolves the timing of events one after another, see SmdlTrackTiming. `tick` is the absolute tick of the next
+    event and `octave` the current octave. The track is over after TRACK_END, the tick doesn't advance anymore after
+    it. The durations of later events are still resolved.
+    """
+    def __init__(self):
+        self.tick = 0
+        self.octave = 0
+        self.last_wait = 0
+        self.last_note_len = 0
+        self.ended = False
+
+    def resolve(self, event: 'SmdlEvent') -> int:
+        """Advances over the event and returns its duration."""
+        duration = 0
+        if isinstance(event, SmdlEventPlayNote):
+            self.octave += event.octave_mod
+            duration = event.key_down_duration
+            if duration < 0:
+                duration = self.last_note_len
+            self.last_note_len = duration
+            return duration
+        if isinstance(event, SmdlEventPause):
+            duration = event.value.length
+        elif isinstance(event, SmdlEventSpecial):
+            op = event.op
+            if op == SmdlSpecialOpCode.WAIT_AGAIN:
+                duration = self.last_wait
+            elif op == SmdlSpecialOpCode.WAIT_ADD:
+                duration = self.last_wait = self.last_wait + event.params[0]
+            elif op == SmdlSpecialOpCode.WAIT_1BYTE or op == SmdlSpecialOpCode.WAIT_2BYTE \
+                    or op == SmdlSpecialOpCode.WAIT_3BYTE:
+                for i, param in enumerate(event.params):
+                    duration |= param << (8 * i)
+                self.last_wait = duration
+            elif op == SmdlSpecialOpCode.SET_OCTAVE:
+                self.octave = event.params[0]
+            elif op == SmdlSpecialOpCode.TRACK_END:
+                self.ended = True
+        if not self.ended:
+            self.tick += duration
+        return duration
+
+
+class SmdlTrackTiming:
+    """
+    The timing of the events of a track, resolved in one pass: For every event the absolute tick at which it
+    happens, its duration and the octave. The duration is the key down duration for notes (also when it's omitted
+    and the one of the previous note is used) and the wait time for pauses and waits, else 0. The octave is the
+    current octave after the event, for notes the octave they are played in. Events after TRACK_END are not
+    played, they all have the tick of the TRACK_END.
+    """
+    def __init__(self, events: Iterable['SmdlEvent']):
+        self.ticks: List[int] = []
+        self.durations: List[int] = []
+        self.octaves: List[int] = []
+        resolver = SmdlTimingResolver()
+        for event in events:
+            self.ticks.append(resolver.tick)
+            self.durations.append(resolver.resolve(event))
+            self.octaves.append(resolver.octave)
+        # Tick after the last event, or of the TRACK_END.
+        self.length = resolver.tick
+
+
 class SmdlTrack(DseAutoString):
     def __init__(
             self, header: SmdlTrackHeader, data: Optional[Union[bytes, memoryview]],
-            *, preamble: SmdlTrackPreamble = None
+            *, preamble: SmdlTrackPreamble = None, max_events: int = MAX_EVENTS
     ):
         self.header = header
-        self.events: List[SmdlEvent] = []
+        self.events = SmdlEventList()
+        self._timing: Optional[SmdlTrackTiming] = None
+        self._timing_of: Optional[SmdlEventList] = None
+        self._timing_version = 0
         if data is None:
             self.preamble = preamble
             return
-        self.preamble = SmdlTrackPreamble(data)
         length = header.get_initial_length()
+        padding_needed = -length % 4
+        if len(data) < max(length, 4) + padding_needed:
+            raise DseFormatError("Data is not valid SMDL: Track exceeds the file.")
+        self.preamble = SmdlTrackPreamble(data)
 
         pnt = 4
+        events = []
 
         while pnt < length:
             op_code = dse_read_uintle(data, pnt)
@@ -409,37 +557,67 @@ class SmdlTrack(DseAutoString):
                 number_params = (param1 >> 6) & 0x3
                 octave_mod = ((param1 >> 4) & 0x3) - 2
                 note = param1 & 0xF
-                #assert note < 0xC
-                assert number_params < 4
                 key_down_duration = -1
                 if number_params > 0:
                     # todo: big endian?? really??
                     key_down_duration = dse_read_uintbe(data, pnt, number_params)
                 pnt += number_params
-                self.events.append(SmdlEventPlayNote(velocity, octave_mod, SmdlNote(note), key_down_duration))
+                events.append(SmdlEventPlayNote(velocity, octave_mod, SmdlNote(note), key_down_duration))
             elif op_code <= SmdlEventPause.MAX:
-                self.events.append(SmdlEventPause(SmdlPause(op_code)))
+                events.append(SmdlEventPause(SmdlPause(op_code)))
             elif op_code == 0xAB:  # skip byte
                 pnt += 1
             elif op_code == 0xCB or op_code == 0xF8:  # skip 2 bytes
                 pnt += 2
             else:
-                op_code = SmdlSpecialOpCode(op_code)
+                try:
+                    op_code = SmdlSpecialOpCode(op_code)
+                except ValueError:
+                    raise DseFormatError(f"Data is not valid SMDL: Unknown event 0x{op_code:02x}.") from None
                 params = []
                 for i in range(0, op_code.parameters):
                     params.append(dse_read_uintle(data, pnt))
                     pnt += 1
 
-                self.events.append(SmdlEventSpecial(op_code, params))
+                events.append(SmdlEventSpecial(op_code, params))
 
             if pnt > length:
-                raise ValueError("Tried to read past EOF while reading SMDL track data")
+                raise DseFormatError("Tried to read past EOF while reading SMDL track data")
+            if len(events) > max_events:
+                raise DseFormatError(f"SMDL track exceeds the limit of {max_events} events.")
+        self.events = SmdlEventList(events)
 
         # Padding
-        padding_needed = (4 - (length % 4))
-        if 0 < padding_needed < 4:
-            for i in range(length, length + padding_needed):
-                assert dse_read_uintle(data, i) == SmdlSpecialOpCode.TRACK_END.value
+        if data[length:length + padding_needed] != bytes([SmdlSpecialOpCode.TRACK_END.value] * padding_needed):
+            raise DseFormatError("Data is not valid SMDL: Invalid track padding.")
+
+    @property
+    def events(self) -> SmdlEventList:
+        return self._events
+
+    @events.setter
+    def events(self, events: Iterable[SmdlEvent]):
+        self._events = events if isinstance(events, SmdlEventList) else SmdlEventList(events)
+
+    def timing(self) -> SmdlTrackTiming:
+        """
+        The resolved timing of the events. It's cached until the event list is changed or replaced, it must not be
+        modified. Call invalidate_timing after changing events in the list.
+        """
+        events = self._events
+        if self._timing is None or self._timing_of is not events or self._timing_version != events.version:
+            self._timing = SmdlTrackTiming(events)
+            self._timing_of = events
+            self._timing_version = events.version
+        return self._timing
+
+    def invalidate_timing(self):
+        self._timing = None
+
+    def __str__(self):
+        # The events are behind a property, so DseAutoString would leave them out.
+        attributes = {'header': self.header, 'events': self.events, 'preamble': self.preamble}
+        return f"{self.__class__.__name__}<{str({k: v for k, v in attributes.items() if v is not None})}>"
 
     @classmethod
     def new(cls, track_id, channel_id):
@@ -467,15 +645,16 @@ class Smdl:
 
         self.tracks = []
         pnt = 128
+        number_events = 0
         for i in range(0, self.song.get_initial_track_count()):
-            assert pnt % 4 == 0
-            assert pnt <= len(data), "Data is not valid SMDL"
-
             track_header = SmdlTrackHeader(data[pnt:])
 
             pnt += 16
-            assert pnt + track_header.get_initial_length() <= len(data), "Data is not valid SMDL"
-            self.tracks.append(SmdlTrack(track_header, data[pnt:]))
+            if pnt + track_header.get_initial_length() > len(data):
+                raise DseFormatError("Data is not valid SMDL: Track exceeds the file.")
+            track = SmdlTrack(track_header, data[pnt:], max_events=MAX_EVENTS - number_events)
+            number_events += len(track.events)
+            self.tracks.append(track)
             mod = 4 - (track_header.get_initial_length() % 4)
             if mod == 4:
                 mod = 0
@@ -0,0 +1,165 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Index of the absolute times of SMDL events, for seeking to ticks and reading the track state at them."""
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+from skytemple_dse.dse.smdl.model import Smdl, SmdlTrack, SmdlEvent, SmdlEventSpecial, SmdlSpecialOpCode
+from skytemple_dse.util import DseAutoString
+
+DEFAULT_BPM = 120
+DEFAULT_VOLUME = 100
+DEFAULT_EXPRESSION = 127
+DEFAULT_PAN = 64
+DEFAULT_CHECKPOINT_INTERVAL = 256
+
+
+class SmdlTrackState(DseAutoString):
+    """The state of a track before the event at event_index, which is at tick."""
+    def __init__(self):
+        self.event_index = 0
+        self.tick = 0
+        self.octave = 0
+        self.program = 0
+        self.volume = DEFAULT_VOLUME
+        self.expression = DEFAULT_EXPRESSION
+        self.pan = DEFAULT_PAN
+        # Pitch bend, -8192 to 8191 like MIDI.
+        self.bend = 0
+        # The tempo last set by this track, or None.
+        self.tempo = None
+        self.ended = False
+
+    def copy(self) -> 'SmdlTrackState':
+        state = SmdlTrackState()
+        vars(state).update(vars(self))
+        return state
+
+    def apply(self, event: SmdlEvent):
+        """
+        Advances the state over the event. The tick and octave are not changed, they are resolved by
+        SmdlTrack.timing and set by the timeline.
+        """
+        self.event_index += 1
+        if self.ended:
+            return
+        if isinstance(event, SmdlEventSpecial):
+            op = event.op
+            if op == SmdlSpecialOpCode.SET_SAMPLE:
+                self.program = event.params[0]
+            elif op == SmdlSpecialOpCode.SET_TEMPO:
+                self.tempo = event.params[0]
+            elif op == SmdlSpecialOpCode.SET_VOLUME:
+                self.volume = event.params[0]
+            elif op == SmdlSpecialOpCode.SET_XPRESS:
+                self.expression = event.params[0]
+            elif op == SmdlSpecialOpCode.SET_PAN:
+                self.pan = event.params[0]
+            elif op == SmdlSpecialOpCode.SET_BEND:
+                self.bend = (((event.params[0] << 8) | event.params[1]) >> 2) - 8192
+            elif op == SmdlSpecialOpCode.TRACK_END:
+                self.ended = True
+
+
+class SmdlTrackTimeline:
+    """
+    The absolute tick of every event of a track, and a copy of the track state every checkpoint_interval events.
+    Finding the events at a tick is a bisect, getting the state at a tick a bisect and the replay of less than
+    checkpoint_interval events.
+
+    This is a snapshot of the events: It has to be created again after the events of the track were changed.
+    """
+    def __init__(self, track: SmdlTrack, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        if checkpoint_interval < 1:
+            raise ValueError("The checkpoint interval must be at least 1.")
+        self.events = list(track.events)
+        self.checkpoint_interval = checkpoint_interval
+        # The timing is not changed once created, it's replaced when the events are changed.
+        self._timing = track.timing()
+        # Tick of every event, ascending.
+        self.ticks: List[int] = self._timing.ticks
+        self._checkpoints: List[SmdlTrackState] = []
+        state = SmdlTrackState()
+        for i, event in enumerate(self.events):
+            if i % checkpoint_interval == 0:
+                self._checkpoints.append(self._with_timing(state.copy()))
+            state.apply(event)
+        self.end_state = self._with_timing(state)
+
+    @property
+    def length(self) -> int:
+        """Tick after the last event, or of the TRACK_END."""
+        return self._timing.length
+
+    def _with_timing(self, state: SmdlTrackState) -> SmdlTrackState:
+        """Sets the tick and octave of the state from the timing."""
+        i = state.event_index
+        state.tick = self.ticks[i] if i < len(self.ticks) else self._timing.length
+        state.octave = self._timing.octaves[i - 1] if i > 0 else 0
+        return state
+
+    def event_index_at(self, tick: int) -> int:
+        """Index of the first event at or after the tick (len(events) if there is none)."""
+        return bisect_left(self.ticks, tick)
+
+    def events_between(self, start_tick: int, end_tick: int) -> Tuple[int, int]:
+        """The range of indices of the events from start_tick (inclusive) to end_tick (exclusive)."""
+        return bisect_left(self.ticks, start_tick), bisect_left(self.ticks, end_tick)
+
+    def state_before(self, event_index: int) -> SmdlTrackState:
+        """The state of the track before the event with the index (after all events, for len(events))."""
+        if not 0 <= event_index <= len(self.events):
+            raise ValueError(f"Event index {event_index} out of range.")
+        if event_index == len(self.events):
+            return self.end_state.copy()
+        state = self._checkpoints[event_index // self.checkpoint_interval].copy()
+        for i in range(state.event_index, event_index):
+            state.apply(self.events[i])
+        return self._with_timing(state)
+
+    def state_at(self, tick: int) -> SmdlTrackState:
+        """The state of the track at the tick, after all events up to and including the tick."""
+        return self.state_before(bisect_right(self.ticks, tick))
+
+
+class SmdlTimeline:
+    """SmdlTrackTimelines for all tracks of a song, and its tempo changes. See SmdlTrackTimeline."""
+    def __init__(self, smdl: Smdl, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        self.tpqn = smdl.song.tpqn
+        self.tracks = [SmdlTrackTimeline(track, checkpoint_interval) for track in smdl.tracks]
+        tempo_changes = []
+        for track in self.tracks:
+            for tick, event in zip(track.ticks, track.events):
+                if isinstance(event, SmdlEventSpecial) and event.op == SmdlSpecialOpCode.SET_TEMPO:
+                    tempo_changes.append((tick, event.params[0]))
+        tempo_changes.sort(key=lambda t: t[0])
+        # Tempo changes as ascending ticks and the beats per minute set at them.
+        self.tempo_ticks = [t for t, _ in tempo_changes]
+        self.tempos = [bpm for _, bpm in tempo_changes]
+
+    @property
+    def length(self) -> int:
+        return max((track.length for track in self.tracks), default=0)
+
+    def tempo_at(self, tick: int) -> int:
+        """The tempo in beats per minute at the tick."""
+        i = bisect_right(self.tempo_ticks, tick)
+        return DEFAULT_BPM if i == 0 else self.tempos[i - 1]
+
+    def state_at(self, tick: int) -> List[SmdlTrackState]:
+        """The states of all tracks at the tick."""
+        return [track.state_at(tick) for track in self.tracks]
@@ -50,36 +50,41 @@ class SmdlWriter:
     def _events_to_bytes(self, events: List[SmdlEvent]):
         buffer = bytearray()
         for event in events:
-            if isinstance(event, SmdlEventPlayNote):
-                buffer.append(event.velocity)
-                note = event.note.value
-                octmod = event.octave_mod
-                if event.key_down_duration > 0xFFFFFF:
-                    raise ValueError("Key down duration too large to encode.")
-                elif event.key_down_duration > 0xFFFF:
-                    n_p = 3
-                elif event.key_down_duration > 0xFF:
-                    n_p = 2
-                elif event.key_down_duration >= 0:
-                    n_p = 1
-                else:
-                    n_p = 0
-                note_data = note & 0xF
-                note_data += ((octmod + 2) & 0x3) << 4
-                note_data += (n_p & 0x3) << 6
-                buffer.append(note_data)
-                if n_p > 0:
-                    i = int.to_bytes(event.key_down_duration, n_p, byteorder='big', signed=False)
-                    assert len(i) == n_p
-                    buffer += i
-            elif isinstance(event, SmdlEventPause):
-                buffer.append(event.value.value)
-            elif isinstance(event, SmdlEventSpecial):
-                buffer.append(event.op.value)
-                for param in event.params:
-                    if param > 0xFF or param < 0:
-                        raise ValueError("An SMDL special event parameter must be unsigned 0-255.")
-                    buffer.append(param)
-            else:
-                raise TypeError(f"Invalid event type: {type(event)}")
+            self.write_event(buffer, event)
         return buffer
+
+    @staticmethod
+    def write_event(buffer: bytearray, event: SmdlEvent):
+        """Encodes a single event and appends it to the buffer."""
+        if isinstance(event, SmdlEventPlayNote):
+            buffer.append(event.velocity)
+            note = event.note.value
+            octmod = event.octave_mod
+            if event.key_down_duration > 0xFFFFFF:
+                raise ValueError("Key down duration too large to encode.")
+            elif event.key_down_duration > 0xFFFF:
+                n_p = 3
+            elif event.key_down_duration > 0xFF:
+                n_p = 2
+            elif event.key_down_duration >= 0:
+                n_p = 1
+            else:
+                n_p = 0
+            note_data = note & 0xF
+            note_data += ((octmod + 2) & 0x3) << 4
+            note_data += (n_p & 0x3) << 6
+            buffer.append(note_data)
+            if n_p > 0:
+                i = int.to_bytes(event.key_down_duration, n_p, byteorder='big', signed=False)
+                assert len(i) == n_p
+                buffer += i
+        elif isinstance(event, SmdlEventPause):
+            buffer.append(event.value.value)
+        elif isinstance(event, SmdlEventSpecial):
+            buffer.append(event.op.value)
+            for param in event.params:
+                if param > 0xFF or param < 0:
+                    raise ValueError("An SMDL special event parameter must be unsigned 0-255.")
+                buffer.append(param)
+        else:
+            raise TypeError(f"Invalid event type: {type(event)}")
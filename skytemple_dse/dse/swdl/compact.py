@@ -0,0 +1,259 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Removes unused keygroups, sample info entries and sample data from Swdl models."""
+from bisect import bisect_right
+from typing import Iterable, List, Set, Optional
+
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.dse.swdl.pcmd import SwdlPcmd
+from skytemple_dse.dse.swdl.prgi import SwdlSplitEntry
+from skytemple_dse.dse.swdl.wavi import SwdlSampleInfoTblEntry, SwdlPcmdReference
+from skytemple_dse.util import DseAutoString
+
+
+class SwdlCompactionResult(DseAutoString):
+    def __init__(self, removed_keygroups: int, removed_wavis: int, removed_sample_bytes: int, bytes_saved: int):
+        self.removed_keygroups = removed_keygroups
+        self.removed_wavis = removed_wavis
+        # Number of bytes removed from the PCMD sample data.
+        self.removed_sample_bytes = removed_sample_bytes
+        # Number of bytes the SWDL file is smaller by when written with the SwdlWriter.
+        self.bytes_saved = bytes_saved
+
+
+def compact_swdl(swdl: Swdl) -> SwdlCompactionResult:
+    """
+    Removes all keygroups and WAVI entries from the SWDL that no split of any program references and updates the
+    `keygroup_id` references of the splits.
+
+    If the SWDL contains it's own sample data (PRGI and PCMD), WAVI entries are renumbered (and the `sample_id`
+    references updated) and sample data no WAVI entry references is removed from the PCMD. Otherwise the WAVI IDs
+    have to match the IDs of the main bank, so unused slots are only emptied.
+
+    Main banks (no PRGI) are not changed, since their entries are referenced by the other SWDLs.
+    Use repack_main_bank for them instead.
+
+    Raises ValueError if the SWDL contains it's own sample data and a split references a WAVI slot that is empty or
+    doesn't exist, the SWDL is not changed then.
+    """
+    if swdl.prgi is None:
+        return SwdlCompactionResult(0, 0, 0, 0)
+    size_before = _chunks_size(swdl)
+
+    removed_sample_bytes = 0
+    if swdl.pcmd is not None:
+        # First, since it checks the references before changing anything.
+        removed_wavis = _renumber_wavi(swdl)
+        removed_sample_bytes = repack_pcmd(swdl.pcmd, swdl.wavi.sample_info_table)
+    else:
+        removed_wavis = _clear_unused_wavi(swdl)
+    removed_keygroups = compact_keygroups(swdl)
+
+    return SwdlCompactionResult(
+        removed_keygroups, removed_wavis, removed_sample_bytes, size_before - _chunks_size(swdl)
+    )
+
+
+def repack_main_bank(main_bank: Swdl, sub_banks: Iterable[Swdl], remove_unused_wavis=False) -> SwdlCompactionResult:
+    """
+    Rewrites the PCMD of the main bank, so that it only contains the sample data referenced by its WAVI entries.
+    The sample positions of the main bank WAVI entries are updated.
+
+    The sample data of a WAVI entry of a sub-bank without sample data of it's own is the one of the main bank entry
+    with the same ID, so the main bank entries cover the sample data used by the sub-banks as well. The sample
+    positions of those sub-banks don't point into the main bank's sample data, they are set again with
+    set_sub_bank_sample_positions. Sub-banks with sample data of their own are not changed.
+
+    If remove_unused_wavis is True, the main bank WAVI entries that no sub-bank uses are removed first
+    (the slots are emptied, IDs are not changed), which frees their sample data as well.
+    """
+    if main_bank.pcmd is None:
+        raise ValueError("The main bank has no sample data.")
+    sub_banks = list(sub_banks)
+    size_before = _chunks_size(main_bank)
+    table = main_bank.wavi.sample_info_table
+
+    removed_wavis = 0
+    if remove_unused_wavis:
+        used = set()
+        for sub_bank in sub_banks:
+            used.update(i for i, w in enumerate(sub_bank.wavi.sample_info_table) if w is not None)
+            if sub_bank.prgi is not None:
+                used.update(_used_wavi_ids(sub_bank))
+        for wavi_id, wavi in enumerate(table):
+            if wavi is not None and wavi_id not in used:
+                table[wavi_id] = None
+                removed_wavis += 1
+        while len(table) > 0 and table[-1] is None:
+            table.pop()
+
+    removed_sample_bytes = repack_pcmd(main_bank.pcmd, table)
+
+    for sub_bank in sub_banks:
+        if sub_bank.pcmd is None:
+            set_sub_bank_sample_positions(sub_bank)
+
+    return SwdlCompactionResult(0, removed_wavis, removed_sample_bytes, size_before - _chunks_size(main_bank))
+
+
+def set_sub_bank_sample_positions(sub_bank: Swdl):
+    """
+    Sets the sample positions of the WAVI entries of a sub-bank, that has no sample data of it's own.
+    The sample data of these entries is the one of the main bank entry with the same ID, their sample positions
+    don't point into the main bank's sample data. Like in the game's files, they start at 0 and increase by the
+    sample length of each entry, in ID order.
+    """
+    cursor = 0
+    for wavi in sub_bank.wavi.sample_info_table:
+        if wavi is not None:
+            wavi.force_set_sample_pos(cursor)
+            cursor += wavi.sample_length
+
+
+def compact_keygroups(swdl: Swdl, renumber=True) -> int:
+    """
+    Removes all keygroups that no split of any program references, renumbers the remaining keygroups
+    and updates the `keygroup_id` references of the splits. Returns the number of removed keygroups.
+    Invalid keygroup references are left unchanged.
+
+    If renumber is False, only the unused keygroups at the end of the table are removed, so the IDs of the
+    remaining keygroups and the references to them don't change.
+    """
+    if swdl.kgrp is None or swdl.prgi is None:
+        return 0
+    used = {split.keygroup_id for split in _iter_splits(swdl)}
+    if not renumber:
+        removed = 0
+        while len(swdl.kgrp.keygroups) > 0 and len(swdl.kgrp.keygroups) - 1 not in used:
+            swdl.kgrp.keygroups.pop()
+            removed += 1
+        return removed
+    new_ids: List[Optional[int]] = []
+    keygroups = []
+    for kgrp_id, kgrp in enumerate(swdl.kgrp.keygroups):
+        if kgrp_id in used:
+            new_ids.append(len(keygroups))
+            kgrp.id = len(keygroups)
+            keygroups.append(kgrp)
+        else:
+            new_ids.append(None)
+    removed = len(swdl.kgrp.keygroups) - len(keygroups)
+    if removed == 0:
+        return 0
+
+    for split in _iter_splits(swdl):
+        if 0 <= split.keygroup_id < len(new_ids):
+            split.keygroup_id = new_ids[split.keygroup_id]
+    swdl.kgrp.keygroups = keygroups
+    return removed
+
+
+def repack_pcmd(pcmd: SwdlPcmd, wavis: Iterable[Optional[SwdlSampleInfoTblEntry]]) -> int:
+    """
+    Rewrites the sample data of the PCMD, so that it only contains the sample data referenced by the
+    provided WAVI entries (None entries are skipped). Sample data shared between entries stays shared.
+    The sample positions of the WAVI entries are updated. Returns the number of bytes removed.
+    """
+    wavis = [w for w in wavis if w is not None]
+    data = pcmd.chunk_data
+    # Merge the (possibly overlapping) ranges of all samples.
+    blocks: List[List[int]] = []
+    for start, end in sorted((w.get_initial_sample_pos(), w.get_initial_sample_pos() + w.sample_length) for w in wavis):
+        if len(blocks) > 0 and start <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], end)
+        else:
+            blocks.append([start, end])
+
+    new_data = bytearray()
+    block_starts = []
+    new_block_starts = []
+    for start, end in blocks:
+        # Keep the word alignment of the sample data.
+        if len(new_data) % 4 != start % 4:
+            new_data += bytes((start % 4 - len(new_data) % 4) % 4)
+        block_starts.append(start)
+        new_block_starts.append(len(new_data))
+        new_data += data[start:end]
+
+    for wavi in wavis:
+        pos = wavi.get_initial_sample_pos()
+        block = bisect_right(block_starts, pos) - 1
+        new_pos = new_block_starts[block] + pos - block_starts[block]
+        had_reference = isinstance(wavi.sample, SwdlPcmdReference)
+        wavi.force_set_sample_pos(new_pos)
+        if had_reference:
+            wavi.sample = SwdlPcmdReference(pcmd, new_pos, wavi.sample_length)
+
+    removed = len(data) - len(new_data)
+    pcmd.chunk_data = bytes(new_data)
+    return removed
+
+
+def _renumber_wavi(swdl: Swdl) -> int:
+    old_table = swdl.wavi.sample_info_table
+    used = _used_wavi_ids(swdl)
+    for wavi_id in sorted(used):
+        if not 0 <= wavi_id < len(old_table) or old_table[wavi_id] is None:
+            # It can't be renumbered, it would end up pointing to another sample.
+            raise ValueError(f"A split references the WAVI slot {wavi_id}, which is empty or doesn't exist.")
+    new_ids: List[Optional[int]] = []
+    table = []
+    for wavi_id, wavi in enumerate(old_table):
+        if wavi is not None and wavi_id in used:
+            new_ids.append(len(table))
+            wavi.id = len(table)
+            table.append(wavi)
+        else:
+            new_ids.append(None)
+    removed = sum(1 for w in old_table if w is not None) - len(table)
+
+    for split in _iter_splits(swdl):
+        split.sample_id = new_ids[split.sample_id]
+    swdl.wavi.sample_info_table = table
+    return removed
+
+
+def _clear_unused_wavi(swdl: Swdl) -> int:
+    used = _used_wavi_ids(swdl)
+    table = swdl.wavi.sample_info_table
+    removed = 0
+    for wavi_id, wavi in enumerate(table):
+        if wavi is not None and wavi_id not in used:
+            table[wavi_id] = None
+            removed += 1
+    while len(table) > 0 and table[-1] is None:
+        table.pop()
+    return removed
+
+
+def _used_wavi_ids(swdl: Swdl) -> Set[int]:
+    return {split.sample_id for split in _iter_splits(swdl)}
+
+
+def _iter_splits(swdl: Swdl) -> Iterable[SwdlSplitEntry]:
+    for prg in swdl.prgi.program_table:
+        if prg is not None:
+            yield from prg.splits
+
+
+def _chunks_size(swdl: Swdl) -> int:
+    size = len(swdl.wavi.to_bytes())
+    if swdl.kgrp is not None:
+        size += len(swdl.kgrp.to_bytes())
+    if swdl.pcmd is not None:
+        size += len(swdl.pcmd.to_bytes())
+    return size
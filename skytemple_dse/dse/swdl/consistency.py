@@ -0,0 +1,139 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Checks, that the sub-banks of a sound directory agree with each other and with the main bank."""
+from enum import Enum, auto
+from typing import Mapping, List, Optional, Dict, Tuple, Iterable
+
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.dse.swdl.wavi import SwdlSampleInfoTblEntry
+from skytemple_dse.util import DseAutoString
+
+# Position of the sample position in packed WAVI entries.
+_WAVI_SAMPLE_POS = slice(0x24, 0x28)
+
+
+class SwdlInconsistencyKind(Enum):
+    # The WAVI entry differs from the one in the main bank (ignoring the sample position).
+    WAVI = auto()
+    # The main bank has no WAVI entry with this ID.
+    WAVI_MISSING = auto()
+    # The sample data of the WAVI entry, in the sub-bank's own sample data, differs from the sample data of the
+    # main bank entry.
+    SAMPLE = auto()
+    # The program differs from the program with the same ID in another sub-bank.
+    PROGRAM = auto()
+    # The keygroup differs from the keygroup with the same ID in another sub-bank.
+    KEYGROUP = auto()
+
+
+class SwdlInconsistency(DseAutoString):
+    def __init__(self, kind: SwdlInconsistencyKind, slot_id: int, bank_name: str, reference_bank_name: Optional[str]):
+        self.kind = kind
+        # ID of the WAVI entry, program or keygroup.
+        self.slot_id = slot_id
+        self.bank_name = bank_name
+        # The bank the entry was compared with.
+        self.reference_bank_name = reference_bank_name
+
+    def __str__(self):
+        if self.kind == SwdlInconsistencyKind.WAVI_MISSING:
+            return f'{self.bank_name}: WAVI {self.slot_id} does not exist in the main bank.'
+        return f'{self.bank_name}: {self.kind.name} {self.slot_id} differs from {self.reference_bank_name}.'
+
+
+def check_bank_consistency(
+        main_bank: Swdl, sub_banks: Mapping[str, Swdl], main_bank_name: str = 'main bank'
+) -> List[SwdlInconsistency]:
+    """
+    Checks, that all sub-banks agree with each other and with the main bank, in one pass over all banks:
+
+    - Every WAVI entry of a sub-bank must exist in the main bank and be the same, except for the sample position.
+    - If a sub-bank has sample data of it's own, the sample data of it's WAVI entries must be the same as the
+      sample data of the main bank entries.
+    - Programs and keygroups with the same ID must be the same in all sub-banks.
+
+    The sample data of a WAVI entry of a sub-bank without sample data of it's own is the one of the main bank entry
+    with the same ID, which the WAVI entry comparison covers (including length and loop). It's sample position
+    doesn't point into the main bank's sample data (see set_sub_bank_sample_positions), so it's not checked.
+
+    Entries are compared by their packed bytes. Returns every divergent entry of every sub-bank.
+    Programs and keygroups are compared with the first sub-bank (in iteration order) that has an entry with that ID.
+    """
+    inconsistencies = []
+    main_table = main_bank.wavi.sample_info_table
+    main_wavis: List[Optional[bytes]] = [_masked_wavi_bytes(w) if w is not None else None for w in main_table]
+    pcmd_data = main_bank.pcmd.chunk_data if main_bank.pcmd is not None else None
+    main_samples: Dict[int, bytes] = {}
+    programs: Dict[int, Tuple[bytes, str]] = {}
+    keygroups: Dict[int, Tuple[bytes, str]] = {}
+
+    for bank_name, bank in sub_banks.items():
+        for wavi_id, wavi in enumerate(bank.wavi.sample_info_table):
+            if wavi is None:
+                continue
+            if wavi_id >= len(main_wavis) or main_wavis[wavi_id] is None:
+                inconsistencies.append(
+                    SwdlInconsistency(SwdlInconsistencyKind.WAVI_MISSING, wavi_id, bank_name, None)
+                )
+                continue
+            if _masked_wavi_bytes(wavi) != main_wavis[wavi_id]:
+                inconsistencies.append(
+                    SwdlInconsistency(SwdlInconsistencyKind.WAVI, wavi_id, bank_name, main_bank_name)
+                )
+            if pcmd_data is None or bank.pcmd is None:
+                continue
+            if wavi_id not in main_samples:
+                main_samples[wavi_id] = _sample_data(pcmd_data, main_table[wavi_id])
+            if _sample_data(bank.pcmd.chunk_data, wavi) != main_samples[wavi_id]:
+                inconsistencies.append(
+                    SwdlInconsistency(SwdlInconsistencyKind.SAMPLE, wavi_id, bank_name, main_bank_name)
+                )
+
+        if bank.prgi is not None:
+            _check_slots(
+                ((i, prg.to_bytes()) for i, prg in enumerate(bank.prgi.program_table) if prg is not None),
+                programs, SwdlInconsistencyKind.PROGRAM, bank_name, inconsistencies
+            )
+        if bank.kgrp is not None:
+            _check_slots(
+                ((i, kgrp.to_bytes()) for i, kgrp in enumerate(bank.kgrp.keygroups)),
+                keygroups, SwdlInconsistencyKind.KEYGROUP, bank_name, inconsistencies
+            )
+
+    return inconsistencies
+
+
+def _check_slots(
+        entries: Iterable[Tuple[int, bytes]], seen: Dict[int, Tuple[bytes, str]],
+        kind: SwdlInconsistencyKind, bank_name: str, inconsistencies: List[SwdlInconsistency]
+):
+    for slot_id, data in entries:
+        if slot_id not in seen:
+            seen[slot_id] = (data, bank_name)
+        elif seen[slot_id][0] != data:
+            inconsistencies.append(SwdlInconsistency(kind, slot_id, bank_name, seen[slot_id][1]))
+
+
+def _masked_wavi_bytes(wavi: SwdlSampleInfoTblEntry) -> bytes:
+    data = bytearray(wavi.to_bytes())
+    data[_WAVI_SAMPLE_POS] = bytes(_WAVI_SAMPLE_POS.stop - _WAVI_SAMPLE_POS.start)
+    return bytes(data)
+
+
+def _sample_data(pcmd_data: bytes, wavi: SwdlSampleInfoTblEntry) -> bytes:
+    pos = wavi.get_initial_sample_pos()
+    return bytes(pcmd_data[pos:pos + wavi.sample_length])
@@ -26,7 +26,8 @@ class SwdlKeygroup(DseAutoString, HasId):
     def __init__(self, data: Union[bytes, memoryview], _assertId: int):
         self.id = dse_read_uintle(data, 0x00, 2)
         HasId.__init__(self, self.id)
-        assert self.id == _assertId, "Data is not valid WDL KGRP Keygroup"
+        if self.id != _assertId:
+            raise DseFormatError("Data is not valid WDL KGRP Keygroup")
         self.poly = dse_read_sintle(data, 0x02)
         self.priority = dse_read_uintle(data, 0x03)
         self.vclow = dse_read_uintle(data, 0x04)
@@ -54,18 +55,19 @@ class SwdlKeygroup(DseAutoString, HasId):
 
 class SwdlKgrp:
     def __init__(self, data: Union[bytes, memoryview]):
-        assert data[0x00:0x04] == b'kgrp', "Data is not valid SWDL KGRP"
-        assert data[0x004:0x06] == bytes(2), "Data is not valid SWDL KGRP"
-        assert data[0x006:0x08] == bytes([0x15, 0x04]), "Data is not valid SWDL KGRP"
-        assert data[0x008:0x0C] == bytes([0x10, 0x00, 0x00, 0x00]), "Data is not valid SWDL KGRP"
+        if data[0x00:0x04] != b'kgrp' or data[0x004:0x06] != bytes(2) or data[0x006:0x08] != bytes([0x15, 0x04]) or \
+                data[0x008:0x0C] != bytes([0x10, 0x00, 0x00, 0x00]):
+            raise DseFormatError("Data is not valid SWDL KGRP")
         len_chunk_data = dse_read_uintle(data, 0x0C, 4)
+        if 0x10 + len_chunk_data > len(data):
+            raise DseFormatError("Data is not valid SWDL KGRP: Chunk exceeds the file.")
 
         self._length = 0x10 + len_chunk_data + (len_chunk_data % 16)
         number_slots = len_chunk_data // KEYGROUP_LEN  # TODO: Is this the way to do it?
 
         self.keygroups = []
         for idx, pnt in enumerate(range(0, number_slots * KEYGROUP_LEN, KEYGROUP_LEN)):
-            self.keygroups.append(SwdlKeygroup(data[0x10 + pnt:], _assertId=idx))
+            self.keygroups.append(SwdlKeygroup(data[0x10 + pnt:0x10 + pnt + KEYGROUP_LEN], _assertId=idx))
 
     def get_initial_length(self):
         return self._length
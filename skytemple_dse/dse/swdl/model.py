@@ -60,23 +60,26 @@ class SwdlPcmdLen(DseAutoString):
 class SwdlHeader(DseAutoString):
     def __init__(self, data: Union[bytes, memoryview]):
         # Protected properties may only be valid during read of the model, you can get them with the getters.
-        assert data[0:4] == b'swdl', "Data is not valid SWDL"
-        assert data[4:8] == bytes(4), "Data is not valid SWDL"
+        if len(data) < LEN_HEADER or data[0:4] != b'swdl' or data[4:8] != bytes(4):
+            raise DseFormatError("Data is not valid SWDL")
         _in_length = dse_read_uintle(data, 0x08, 4)
-        assert len(data) == _in_length, "Data is not valid SWDL"
+        if len(data) != _in_length:
+            raise DseFormatError("Data is not valid SWDL: Wrong file length in header.")
         self.version = dse_read_uintle(data, 0x0C, 2)
         # HEADER2 VALUE OF SMDL???
         self.unk1 = dse_read_uintle(data, 0x0E, 1)
         # HEADER1 VALUE OF SMDL???
         self.unk2 = dse_read_uintle(data, 0x0F, 1)
-        assert data[0x10:0x18] == bytes(8), "Data is not valid SWDL"
+        if data[0x10:0x18] != bytes(8):
+            raise DseFormatError("Data is not valid SWDL")
         self.modified_date = DseDate.from_bytes(data[0x18:0x20])
         self.file_name = DseFilenameString.from_bytes(data[0x20:0x30])
-        assert data[0x30:0x34] == b'\x00\xaa\xaa\xaa', "Data is not valid SWDL"
-        assert data[0x34:0x3C] == bytes(8), "Data is not valid SWDL"
+        if data[0x30:0x34] != b'\x00\xaa\xaa\xaa' or data[0x34:0x3C] != bytes(8):
+            raise DseFormatError("Data is not valid SWDL")
         self.unk13 = dse_read_uintle(data, 0x3C, 4)
         self.pcmdlen = SwdlPcmdLen.from_bytes(data[0x40:0x44])
-        assert data[0x44:0x46] == bytes(2), "Data is not valid SWDL"
+        if data[0x44:0x46] != bytes(2):
+            raise DseFormatError("Data is not valid SWDL")
         self._number_wavi_slots = dse_read_uintle(data, 0x46, 2)
         self._number_prgi_slots = dse_read_uintle(data, 0x48, 2)
         self.unk17 = dse_read_uintle(data, 0x4A, 2)
@@ -102,7 +105,7 @@ class SwdlHeader(DseAutoString):
         data[0x20:0x30] = self.file_name.to_bytes(end_byte_0xaa=True)
         data[0x30:0x34] = b'\x00\xaa\xaa\xaa'
         dse_write_uintle(data, self.unk13, 0x3C, 4)
-        data[0x40:0x44] = self.pcmdlen.to_bytes()
+        data[0x40:0x44] = pcmdlen.to_bytes()
         dse_write_uintle(data, wavi_slots, 0x46, 2)
         dse_write_uintle(data, prgi_slots, 0x48, 2)
         dse_write_uintle(data, self.unk17, 0x4A, 2)
@@ -125,7 +128,8 @@ class Swdl:
         number_prgi_slots = self.header.get_initial_number_prgi_slots()
 
         self.wavi: SwdlWavi = SwdlWavi(data[LEN_HEADER:LEN_HEADER + len_wavi], number_wavi_slots)
-        assert len_wavi == self.wavi.get_initial_length(), "Data is not valid SWDL"
+        if len_wavi != self.wavi.get_initial_length():
+            raise DseFormatError("Data is not valid SWDL: WAVI length differs from header.")
 
         start_prgi = start_pcmd = LEN_HEADER + len_wavi
         self.pcmd: Optional[SwdlPcmd] = None
@@ -135,12 +139,15 @@ class Swdl:
             # Has PRGI & KGRP
             self.prgi = SwdlPrgi(data[start_prgi:], number_prgi_slots)
             start_kgrp = start_prgi + self.prgi.get_initial_length()
-            assert start_kgrp % 16 == 0
+            if start_kgrp % 16 != 0:
+                raise DseFormatError("Data is not valid SWDL: KGRP chunk is not aligned.")
             self.kgrp = SwdlKgrp(data[start_kgrp:])
 
             start_pcmd += self.prgi.get_initial_length() + self.kgrp.get_initial_length()
 
         if not self.header.pcmdlen.external and self.header.pcmdlen.ref:
+            if start_pcmd + self.header.pcmdlen.ref + 0x10 > len(data):
+                raise DseFormatError("Data is not valid SWDL: PCMD exceeds the file.")
             self.pcmd = SwdlPcmd(data[start_pcmd:start_pcmd + self.header.pcmdlen.ref + 0x10])  # (0x10 = Header size) TODO: Is this correct???
             self._dbg_pcmd_after_wavi = True
             start_prgi += self.pcmd.get_initial_length()
@@ -149,7 +156,8 @@ class Swdl:
             for sample in self.wavi.sample_info_table:
                 if sample:
                     offs, length = sample.get_initial_sample_pos(), sample.sample_length
-                    assert offs+length <= len(self.pcmd.chunk_data), "Invalid Swdl sample data"
+                    if offs + length > len(self.pcmd.chunk_data):
+                        raise DseFormatError("Invalid Swdl sample data")
                     sample.sample = SwdlPcmdReference(self.pcmd, offs, length)
 
     def __str__(self):
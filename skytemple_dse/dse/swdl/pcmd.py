@@ -21,13 +21,13 @@ from skytemple_dse.util import *
 
 class SwdlPcmd:
     def __init__(self, data: Union[bytes, memoryview]):
-        assert data[0x00:0x04] == b'pcmd', "Data is not valid SWDL PCMD"
-        assert data[0x004:0x06] == bytes(2), "Data is not valid SWDL PCMD"
-        assert data[0x006:0x08] == bytes([0x15, 0x04]), "Data is not valid SWDL PCMD"
-        assert data[0x008:0x0C] == bytes([0x10, 0x00, 0x00, 0x00]), "Data is not valid SWDL PCMD"
+        if data[0x00:0x04] != b'pcmd' or data[0x004:0x06] != bytes(2) or data[0x006:0x08] != bytes([0x15, 0x04]) or \
+                data[0x008:0x0C] != bytes([0x10, 0x00, 0x00, 0x00]):
+            raise DseFormatError("Data is not valid SWDL PCMD")
         len_chunk_data = dse_read_uintle(data, 0x0C, 4)
         self._length = 0x10 + len_chunk_data
-        assert len(data) >= self._length, "Data is not valid SWDL PCMD"
+        if len(data) < self._length:
+            raise DseFormatError("Data is not valid SWDL PCMD")
         self.chunk_data = bytes(data[0x10:self._length])
 
     def get_initial_length(self):
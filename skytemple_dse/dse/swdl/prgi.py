@@ -21,6 +21,9 @@ from skytemple_dse.util import *
 
 LEN_LFO = 16
 LEN_SPLITS = 48
+# Maximum number of splits and LFOs of all programs of a PRGI chunk together. Programs can be shared by many slots,
+# so a small chunk could otherwise make the parser create a huge number of entries.
+MAX_PRGI_ENTRIES = 0x10000
 
 
 class SwdlLfoDest(Enum):
@@ -48,8 +51,11 @@ class SwdlLfoEntry(DseAutoString):
             return
         self.unk34 = dse_read_uintle(data, 0x00)
         self.unk52 = dse_read_uintle(data, 0x01)
-        self.dest = SwdlLfoDest(dse_read_uintle(data, 0x02))
-        self.wshape = SwdlWshape(dse_read_uintle(data, 0x03))
+        try:
+            self.dest = SwdlLfoDest(dse_read_uintle(data, 0x02))
+            self.wshape = SwdlWshape(dse_read_uintle(data, 0x03))
+        except ValueError as ex:
+            raise DseFormatError(f"Data is not valid WDL PRGI LFO: {ex}") from None
         self.rate = dse_read_uintle(data, 0x04, 2)
         self.unk29 = dse_read_uintle(data, 0x06, 2)
         self.depth = dse_read_uintle(data, 0x08, 2)
@@ -98,18 +104,21 @@ class SwdlSplitEntry(DseAutoString):
     def __init__(self, data: Optional[Union[bytes, memoryview]]):
         if data is None:
             return
-        assert data[0] == 0, "Data is not valid WDL PRG Split Entry"
+        if data[0] != 0:
+            raise DseFormatError("Data is not valid WDL PRG Split Entry")
         self.id = dse_read_uintle(data, 0x01)
         self.unk11 = dse_read_uintle(data, 0x02)
         self.unk25 = dse_read_uintle(data, 0x03)
         self.lowkey = dse_read_sintle(data, 0x04)
         self.hikey = dse_read_sintle(data, 0x05)
-        assert self.lowkey == dse_read_sintle(data, 0x06), "Data is not valid WDL PRG Split Entry"  # Copy
-        assert self.hikey == dse_read_sintle(data, 0x07), "Data is not valid WDL PRG Split Entry"  # Copy
+        # Copy
+        if self.lowkey != dse_read_sintle(data, 0x06) or self.hikey != dse_read_sintle(data, 0x07):
+            raise DseFormatError("Data is not valid WDL PRG Split Entry")
         self.lolevel = dse_read_sintle(data, 0x08)
         self.hilevel = dse_read_sintle(data, 0x09)
-        assert self.lolevel == dse_read_sintle(data, 0x0A), "Data is not valid WDL PRG Split Entry"  # Copy
-        assert self.hilevel == dse_read_sintle(data, 0x0B), "Data is not valid WDL PRG Split Entry"  # Copy
+        # Copy
+        if self.lolevel != dse_read_sintle(data, 0x0A) or self.hilevel != dse_read_sintle(data, 0x0B):
+            raise DseFormatError("Data is not valid WDL PRG Split Entry")
         self.unk16 = dse_read_sintle(data, 0x0C, 4)
         self.unk17 = dse_read_sintle(data, 0x10, 2)
         self.sample_id = dse_read_uintle(data, 0x12, 2)
@@ -182,6 +191,11 @@ class SwdlSplitEntry(DseAutoString):
         })
         return n
 
+    def copy(self) -> 'SwdlSplitEntry':
+        n = SwdlSplitEntry(None)
+        vars(n).update(vars(self))
+        return n
+
     def to_bytes(self):
         data = bytearray(0x30)
         dse_write_uintle(data, self.id, 0x01)
@@ -238,7 +252,8 @@ class SwdlProgramTable(DseAutoString):
         if data is None:
             return
         self.id = dse_read_uintle(data, 0x00, 2)
-        assert self.id == _assertId, "Data is not valid WDL PRGI Program Entry"
+        if self.id != _assertId:
+            raise DseFormatError("Data is not valid WDL PRGI Program Entry")
         number_splits = dse_read_uintle(data, 0x02, 2)
         self.prg_volume = dse_read_sintle(data, 0x04)
         self.prg_pan = dse_read_sintle(data, 0x05)
@@ -257,11 +272,13 @@ class SwdlProgramTable(DseAutoString):
         self.splits = []
 
         end_lfos = 0x10 + number_lfos * LEN_LFO
+        end_splits = end_lfos + 16 + number_splits * LEN_SPLITS
+        if end_splits > len(data):
+            raise DseFormatError("Data is not valid WDL PRGI Program Entry: Splits exceed the chunk.")
         for off in range(0x10, end_lfos, LEN_LFO):
             self.lfos.append(SwdlLfoEntry(data[off:off + LEN_LFO]))
-        assert any(data[end_lfos:end_lfos + 16] == bytes([d] * 16) for d in
-                   delimiter), "Data is not valid WDL PRGI Program Entry"
-        end_splits = end_lfos + 16 + number_splits * LEN_SPLITS
+        if not any(data[end_lfos:end_lfos + 16] == bytes([d] * 16) for d in delimiter):
+            raise DseFormatError("Data is not valid WDL PRGI Program Entry")
         for off in range(end_lfos + 16, end_splits, LEN_SPLITS):
             self.splits.append(SwdlSplitEntry(data[off:off + LEN_SPLITS]))
 
@@ -291,6 +308,7 @@ class SwdlProgramTable(DseAutoString):
     def copy(self, new_wavi_ids: List[int] = None, new_kgrp_ids: List[int] = None) -> 'SwdlProgramTable':
         n = SwdlProgramTable(None, None)
         vars(n).update(vars(self))
+        n.splits = [split.copy() for split in self.splits]
         if new_wavi_ids is not None:
             for split, wid in zip(n.splits, new_wavi_ids):
                 split.sample_id = wid
@@ -329,22 +347,28 @@ class SwdlProgramTable(DseAutoString):
 
 class SwdlPrgi:
     def __init__(self, data: Union[bytes, memoryview], number_slots: int):
-        assert data[0x00:0x04] == b'prgi', "Data is not valid SWDL PRGI"
-        assert data[0x004:0x06] == bytes(2), "Data is not valid SWDL PRGI"
-        assert data[0x006:0x08] == bytes([0x15, 0x04]), "Data is not valid SWDL PRGI"
-        assert data[0x008:0x0C] == bytes([0x10, 0x00, 0x00, 0x00]), "Data is not valid SWDL PRGI"
+        if data[0x00:0x04] != b'prgi' or data[0x004:0x06] != bytes(2) or data[0x006:0x08] != bytes([0x15, 0x04]) or \
+                data[0x008:0x0C] != bytes([0x10, 0x00, 0x00, 0x00]):
+            raise DseFormatError("Data is not valid SWDL PRGI")
         len_chunk_data = dse_read_uintle(data, 0x0C, 4)
+        if 0x10 + len_chunk_data > len(data) or number_slots * 2 > len_chunk_data:
+            raise DseFormatError("Data is not valid SWDL PRGI: Chunk exceeds the file.")
 
         self._length = 0x10 + len_chunk_data
 
         self.program_table: List[Optional[SwdlProgramTable]] = []
+        number_entries = 0
         for idx, seek in enumerate(range(0, number_slots * 2, 2)):
             pnt = dse_read_uintle(data, 0x10 + seek, 2)
-            assert pnt < len_chunk_data, "Data is not valid SWDL PRGI"
             if pnt == 0:
                 self.program_table.append(None)
-            else:
-                self.program_table.append(SwdlProgramTable(data[0x10 + pnt:], _assertId=idx))
+                continue
+            if pnt + 0x10 > len_chunk_data:
+                raise DseFormatError("Data is not valid SWDL PRGI: Program exceeds the chunk.")
+            number_entries += dse_read_uintle(data, 0x10 + pnt + 0x02, 2) + dse_read_uintle(data, 0x10 + pnt + 0x0B)
+            if number_entries > MAX_PRGI_ENTRIES:
+                raise DseFormatError(f"SWDL PRGI has more than {MAX_PRGI_ENTRIES} splits and LFOs.")
+            self.program_table.append(SwdlProgramTable(data[0x10 + pnt:self._length], _assertId=idx))
 
     def to_bytes(self) -> bytes:
         chunk = bytearray(len(self.program_table) * 2)
@@ -45,10 +45,10 @@ class SwdlSampleInfoTblEntry(DseAutoString, HasId):
     def __init__(self, data: Optional[Union[bytes, memoryview]], _assertId: Optional[int]):
         if data is None:
             return
-        assert data[0x00:0x04] != bytes([0x01, 0xAA]), "Data is not valid WDL WAVI Sample Info"
         self.id = dse_read_uintle(data, 0x02, 2)
         HasId.__init__(self, self.id)
-        assert self.id == _assertId, "Data is not valid WDL WAVI Sample Info"
+        if self.id != _assertId:
+            raise DseFormatError("Data is not valid WDL WAVI Sample Info")
         self.ftune = dse_read_sintle(data, 0x04)
         self.ctune = dse_read_sintle(data, 0x05)
         self.rootkey = dse_read_sintle(data, 0x06)  # seems unused by game!
@@ -57,9 +57,9 @@ class SwdlSampleInfoTblEntry(DseAutoString, HasId):
         self.pan = dse_read_sintle(data, 0x09)  # (0-64-127)
         self.unk5 = dse_read_uintle(data, 0x0A)  # probably key_group, always 0
         self.unk58 = dse_read_uintle(data, 0x0B)
-        assert data[0x0C:0x0E] == bytes(2), "Data is not valid WDL WAVI Sample Info"
-        assert data[0x0E:0x10] == bytes([0xAA, 0xAA]), "Data is not valid WDL WAVI Sample Info"
-        assert data[0x10:0x12] == bytes([0x15, 0x04]), "Data is not valid WDL WAVI Sample Info"
+        if data[0x0C:0x0E] != bytes(2) or data[0x0E:0x10] != bytes([0xAA, 0xAA]) or \
+                data[0x10:0x12] != bytes([0x15, 0x04]):
+            raise DseFormatError("Data is not valid WDL WAVI Sample Info")
         self.sample_format = dse_read_uintle(data, 0x12, 2)  # compare against SampleFormatConsts
         self.unk9 = dse_read_uintle(data, 0x14)
         self.loop = bool(dse_read_uintle(data, 0x15))
@@ -190,22 +190,26 @@ class SwdlSampleInfoTblEntry(DseAutoString, HasId):
 
 class SwdlWavi:
     def __init__(self, data: Union[bytes, memoryview], number_slots: int):
-        assert data[0x00:0x04] == b'wavi', "Data is not valid SWDL WAVI"
-        assert data[0x04:0x06] == bytes(2), "Data is not valid SWDL WAVI"
-        assert data[0x06:0x08] == bytes([0x15, 0x04]), "Data is not valid SWDL WAVI"
-        assert data[0x08:0x0C] == bytes([0x10, 0x00, 0x00, 0x00]), "Data is not valid SWDL WAVI"
+        if data[0x00:0x04] != b'wavi' or data[0x04:0x06] != bytes(2) or data[0x06:0x08] != bytes([0x15, 0x04]) or \
+                data[0x08:0x0C] != bytes([0x10, 0x00, 0x00, 0x00]):
+            raise DseFormatError("Data is not valid SWDL WAVI")
         len_chunk_data = dse_read_uintle(data, 0x0C, 4)
+        if 0x10 + len_chunk_data > len(data) or number_slots * 2 > len_chunk_data:
+            raise DseFormatError("Data is not valid SWDL WAVI: Chunk exceeds the file.")
         self.sample_info_table: List[Optional[SwdlSampleInfoTblEntry]] = []
 
         self._length = 0x10 + len_chunk_data
 
         for idx, seek in enumerate(range(0, number_slots * 2, 2)):
             pnt = dse_read_uintle(data, 0x10 + seek, 2)
-            assert pnt < len_chunk_data, "Data is not valid SWDL WAVI"
             if pnt == 0:
                 self.sample_info_table.append(None)
+            elif pnt + LEN_SAMPLE_INFO_ENTRY > len_chunk_data:
+                raise DseFormatError("Data is not valid SWDL WAVI: Entry exceeds the chunk.")
             else:
-                self.sample_info_table.append(SwdlSampleInfoTblEntry(data[0x10 + pnt:], _assertId=idx))
+                self.sample_info_table.append(
+                    SwdlSampleInfoTblEntry(data[0x10 + pnt:0x10 + pnt + LEN_SAMPLE_INFO_ENTRY], _assertId=idx)
+                )
 
     def get_initial_length(self):
         return self._length
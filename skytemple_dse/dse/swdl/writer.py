@@ -29,9 +29,11 @@ class SwdlWriter:
         kgrp = self.model.kgrp.to_bytes() if self.model.kgrp is not None else bytes()
         pcmd = self.model.pcmd.to_bytes() if self.model.pcmd is not None else bytes()
         if len(pcmd) > 0:
-            pcmdlen = SwdlPcmdLen(len(pcmd), False)
+            pcmdlen = SwdlPcmdLen(len(self.model.pcmd.chunk_data), False)
         else:
-            pcmdlen = SwdlPcmdLen(self.model.header.pcmdlen.ref, True)
+            # Keep whether the header marks the sample data as external. If not, there is no sample data.
+            external = self.model.header.pcmdlen.external
+            pcmdlen = SwdlPcmdLen(self.model.header.pcmdlen.ref if external else 0, external)
 
         # The file might have PRGI slots set, even if none are defined
         prgi_slots = self.model.header.get_initial_number_prgi_slots()
@@ -0,0 +1,326 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Checks, that SWDL and SMDL files are structurally valid, without building their models.
+The checks are the same as the ones the parsers of Swdl and Smdl make.
+"""
+from typing import List, Optional, Union, Tuple
+
+from skytemple_dse.dse.smdl.model import SmdlEventPlayNote, SmdlEventPause, SmdlSpecialOpCode, SMDL_PARAMETER_BYTES
+from skytemple_dse.dse.swdl.kgrp import KEYGROUP_LEN
+from skytemple_dse.dse.swdl.model import LEN_HEADER
+from skytemple_dse.dse.swdl.prgi import LEN_LFO, LEN_SPLITS, SwdlLfoDest, SwdlWshape
+from skytemple_dse.dse.swdl.wavi import LEN_SAMPLE_INFO_ENTRY
+from skytemple_dse.util import DseAutoString, dse_read_uintle
+
+# Bytes 0x04-0x0C of all SWDL chunk headers.
+_CHUNK_HEADER = b'\0\0\x15\x04\x10\0\0\0'
+_LEN_CHUNK_HEADER = 0x10
+_LEN_SMDL_HEADER = 64
+_LEN_TRACK_HEADER = 16
+_LEN_TRACK_PREAMBLE = 4
+# Size in bytes of the events by op code, including the op code. None for notes (the size depends on their second
+# byte) and for unknown op codes.
+_EVENT_SIZES: List[Optional[int]] = [None] * 256
+for _op in range(SmdlEventPlayNote.MAX + 1, SmdlEventPause.MAX + 1):
+    _EVENT_SIZES[_op] = 1
+for _op in range(SmdlEventPause.MAX + 1, 256):
+    if SMDL_PARAMETER_BYTES[_op] is not None:
+        _EVENT_SIZES[_op] = 1 + SMDL_PARAMETER_BYTES[_op]
+_LFO_DESTS = {dest.value for dest in SwdlLfoDest}
+_LFO_WSHAPES = {wshape.value for wshape in SwdlWshape}
+
+
+class DseValidationError(DseAutoString):
+    def __init__(self, chunk: str, offset: int, message: str):
+        # Name of the chunk the error is in ('swdl' and 'smdl' for the file headers).
+        self.chunk = chunk
+        # Offset of the invalid data in the file.
+        self.offset = offset
+        self.message = message
+
+    def __str__(self):
+        return f'0x{self.offset:x} ({self.chunk}): {self.message}'
+
+
+def validate_dse(data: Union[bytes, memoryview]) -> List[DseValidationError]:
+    """Validates a SWDL or SMDL file, depending on its magic number. See validate_swdl and validate_smdl."""
+    if data[0:4] == b'swdl':
+        return validate_swdl(data)
+    if data[0:4] == b'smdl':
+        return validate_smdl(data)
+    return [DseValidationError('file', 0, 'Not a SWDL or SMDL file.')]
+
+
+def validate_swdl(data: Union[bytes, memoryview]) -> List[DseValidationError]:
+    """
+    Validates the structure of a SWDL file: The header, the chunk headers and lengths, the pointer tables, the IDs
+    of the WAVI entries, programs and keygroups, the padding and the sample positions.
+    Returns all errors found, an empty list if the file is valid. If an error makes the position of the following
+    chunks unknown, they are not checked.
+    """
+    errors: List[DseValidationError] = []
+
+    def error(chunk: str, offset: int, message: str):
+        errors.append(DseValidationError(chunk, offset, message))
+
+    if len(data) < LEN_HEADER:
+        error('swdl', 0, f'The file is too short for the header ({len(data)} bytes).')
+        return errors
+    if data[0:4] != b'swdl':
+        error('swdl', 0, "Expected the 'swdl' magic number.")
+        return errors
+    if data[0x04:0x08] != bytes(4):
+        error('swdl', 0x04, 'Expected 4 zero bytes.')
+    length = dse_read_uintle(data, 0x08, 4)
+    if length != len(data):
+        error('swdl', 0x08, f'The header has a file length of {length}, but the file has {len(data)} bytes.')
+    if data[0x10:0x18] != bytes(8):
+        error('swdl', 0x10, 'Expected 8 zero bytes.')
+    _check_file_name(data, 'swdl', 0x20, errors)
+    if data[0x30:0x34] != b'\x00\xaa\xaa\xaa':
+        error('swdl', 0x30, 'Expected 00 AA AA AA.')
+    if data[0x34:0x3C] != bytes(8):
+        error('swdl', 0x34, 'Expected 8 zero bytes.')
+    pcmdlen = dse_read_uintle(data, 0x40, 4)
+    if data[0x44:0x46] != bytes(2):
+        error('swdl', 0x44, 'Expected 2 zero bytes.')
+    number_wavi_slots = dse_read_uintle(data, 0x46, 2)
+    number_prgi_slots = dse_read_uintle(data, 0x48, 2)
+    len_wavi = dse_read_uintle(data, 0x4C, 4)
+
+    # WAVI
+    start_wavi = LEN_HEADER
+    len_chunk = _check_chunk(data, b'wavi', start_wavi, errors)
+    if len_chunk is None:
+        return errors
+    if len_chunk != len_wavi:
+        error('wavi', start_wavi + 0x0C, f'The chunk has a length of {len_chunk}, the header says {len_wavi}.')
+        return errors
+    if number_wavi_slots * 2 > len_chunk:
+        error('wavi', start_wavi + _LEN_CHUNK_HEADER, f'The table of {number_wavi_slots} slots exceeds the chunk.')
+        return errors
+    # Slot IDs and offsets of the WAVI entries, for checking the sample positions.
+    wavis: List[Tuple[int, int]] = []
+    for slot, pnt_offset in enumerate(range(start_wavi + 0x10, start_wavi + 0x10 + number_wavi_slots * 2, 2)):
+        pnt = dse_read_uintle(data, pnt_offset, 2)
+        if pnt == 0:
+            continue
+        if pnt + LEN_SAMPLE_INFO_ENTRY > len_chunk:
+            error('wavi', pnt_offset, f'The entry of slot {slot} at 0x{pnt:x} exceeds the chunk.')
+            continue
+        entry = start_wavi + _LEN_CHUNK_HEADER + pnt
+        entry_id = dse_read_uintle(data, entry + 0x02, 2)
+        if entry_id != slot:
+            error('wavi', entry + 0x02, f'The entry in slot {slot} has the ID {entry_id}.')
+        if data[entry + 0x0C:entry + 0x0E] != bytes(2):
+            error('wavi', entry + 0x0C, f'Entry {slot}: Expected 2 zero bytes.')
+        if data[entry + 0x0E:entry + 0x10] != b'\xaa\xaa':
+            error('wavi', entry + 0x0E, f'Entry {slot}: Expected AA AA.')
+        if data[entry + 0x10:entry + 0x12] != b'\x15\x04':
+            error('wavi', entry + 0x10, f'Entry {slot}: Expected 15 04.')
+        wavis.append((slot, entry))
+
+    # PRGI & KGRP
+    start_pcmd = start_wavi + _LEN_CHUNK_HEADER + len_wavi
+    if data[start_pcmd:start_pcmd + 4] == b'prgi':
+        start_prgi = start_pcmd
+        len_chunk = _check_chunk(data, b'prgi', start_prgi, errors)
+        if len_chunk is None:
+            return errors
+        if number_prgi_slots * 2 > len_chunk:
+            error('prgi', start_prgi + _LEN_CHUNK_HEADER, f'The table of {number_prgi_slots} slots exceeds the chunk.')
+            return errors
+        end_prgi = start_prgi + _LEN_CHUNK_HEADER + len_chunk
+        for slot, pnt_offset in enumerate(range(start_prgi + 0x10, start_prgi + 0x10 + number_prgi_slots * 2, 2)):
+            pnt = dse_read_uintle(data, pnt_offset, 2)
+            if pnt == 0:
+                continue
+            entry = start_prgi + _LEN_CHUNK_HEADER + pnt
+            if entry + 0x10 > end_prgi:
+                error('prgi', pnt_offset, f'The program of slot {slot} at 0x{pnt:x} exceeds the chunk.')
+                continue
+            entry_id = dse_read_uintle(data, entry, 2)
+            if entry_id != slot:
+                error('prgi', entry, f'The program in slot {slot} has the ID {entry_id}.')
+            number_splits = dse_read_uintle(data, entry + 0x02, 2)
+            end_lfos = entry + 0x10 + dse_read_uintle(data, entry + 0x0B) * LEN_LFO
+            end_splits = end_lfos + 16 + number_splits * LEN_SPLITS
+            if end_splits > end_prgi:
+                error('prgi', entry, f'The LFOs and splits of program {slot} exceed the chunk.')
+                continue
+            for i, lfo in enumerate(range(entry + 0x10, end_lfos, LEN_LFO)):
+                if data[lfo + 0x02] not in _LFO_DESTS or data[lfo + 0x03] not in _LFO_WSHAPES:
+                    error('prgi', lfo + 0x02, f'Program {slot}: LFO {i} has an unknown destination or wave shape.')
+            delimiter = data[end_lfos:end_lfos + 16]
+            if delimiter != bytes(16) and delimiter != b'\xaa' * 16:
+                error('prgi', end_lfos, f'Program {slot}: Expected 16 bytes of 00 or AA after the LFOs.')
+            for i, split in enumerate(range(end_lfos + 16, end_splits, LEN_SPLITS)):
+                if data[split] != 0:
+                    error('prgi', split, f'Program {slot}: Split {i} does not start with 00.')
+                # The key and velocity ranges are stored twice.
+                if data[split + 0x04:split + 0x06] != data[split + 0x06:split + 0x08] or \
+                        data[split + 0x08:split + 0x0A] != data[split + 0x0A:split + 0x0C]:
+                    error('prgi', split + 0x04, f'Program {slot}: The ranges of split {i} differ from their copies.')
+
+        start_kgrp = end_prgi
+        if start_kgrp % 16 != 0:
+            error('kgrp', start_kgrp, 'The chunk is not aligned to 16 bytes.')
+        len_chunk = _check_chunk(data, b'kgrp', start_kgrp, errors)
+        if len_chunk is None:
+            return errors
+        start_keygroups = start_kgrp + _LEN_CHUNK_HEADER
+        end_keygroups = start_keygroups + len_chunk // KEYGROUP_LEN * KEYGROUP_LEN
+        for idx, entry in enumerate(range(start_keygroups, end_keygroups, KEYGROUP_LEN)):
+            entry_id = dse_read_uintle(data, entry, 2)
+            if entry_id != idx:
+                error('kgrp', entry, f'Keygroup {idx} has the ID {entry_id}.')
+        start_pcmd = start_kgrp + _LEN_CHUNK_HEADER + len_chunk + len_chunk % 16
+
+    # PCMD
+    if pcmdlen >> 0x10 != 0xAAAA and pcmdlen != 0:
+        len_chunk = _check_chunk(data, b'pcmd', start_pcmd, errors)
+        if len_chunk is None:
+            return errors
+        if len_chunk > pcmdlen:
+            error('pcmd', start_pcmd + 0x0C, f'The chunk has a length of {len_chunk}, the header says {pcmdlen}.')
+        if start_pcmd + _LEN_CHUNK_HEADER + pcmdlen > len(data):
+            error('swdl', 0x40, f'The PCMD length of {pcmdlen} exceeds the file.')
+        for slot, entry in wavis:
+            sample_pos = dse_read_uintle(data, entry + 0x24, 4)
+            sample_length = (dse_read_uintle(data, entry + 0x28, 4) + dse_read_uintle(data, entry + 0x2C, 4)) * 4
+            if sample_pos + sample_length > len_chunk:
+                error(
+                    'wavi', entry + 0x24,
+                    f'The sample of entry {slot} (0x{sample_pos:x}, {sample_length} bytes) exceeds the PCMD chunk.'
+                )
+    return errors
+
+
+def validate_smdl(data: Union[bytes, memoryview]) -> List[DseValidationError]:
+    """
+    Validates the structure of a SMDL file: The header, the song chunk, the track headers and lengths, the events
+    (only known op codes, no event exceeds its track), the track padding and the end of chunks.
+    Returns all errors found, an empty list if the file is valid. If a track is broken, the tracks after it and the
+    end of chunks are not checked. Events after the first invalid event of a track are not checked.
+    """
+    errors: List[DseValidationError] = []
+
+    def error(chunk: str, offset: int, message: str):
+        errors.append(DseValidationError(chunk, offset, message))
+
+    if len(data) < _LEN_SMDL_HEADER * 2:
+        error('smdl', 0, f'The file is too short for the header and song chunk ({len(data)} bytes).')
+        return errors
+    if data[0:4] != b'smdl':
+        error('smdl', 0, "Expected the 'smdl' magic number.")
+        return errors
+    if data[0x04:0x08] != bytes(4):
+        error('smdl', 0x04, 'Expected 4 zero bytes.')
+    length = dse_read_uintle(data, 0x08, 4)
+    if length != len(data):
+        error('smdl', 0x08, f'The header has a file length of {length}, but the file has {len(data)} bytes.')
+    if data[0x10:0x18] != bytes(8):
+        error('smdl', 0x10, 'Expected 8 zero bytes.')
+    _check_file_name(data, 'smdl', 0x20, errors)
+
+    song = _LEN_SMDL_HEADER
+    if data[song:song + 4] != b'song':
+        error('song', song, "Expected the 'song' chunk.")
+        return errors
+    if data[song + 0x30:song + 0x40] != b'\xff' * 16:
+        error('song', song + 0x30, 'Expected 16 FF bytes.')
+    number_tracks = dse_read_uintle(data, song + 0x16)
+
+    pnt = song + _LEN_SMDL_HEADER
+    for track_id in range(number_tracks):
+        if data[pnt:pnt + 4] != b'trk\x20':
+            error('trk', pnt, f"Expected the 'trk ' chunk of track {track_id}.")
+            return errors
+        len_track = dse_read_uintle(data, pnt + 0x0C, 4)
+        start = pnt + _LEN_TRACK_HEADER
+        end = start + len_track
+        if end > len(data):
+            error('trk', pnt + 0x0C, f'Track {track_id} with a length of {len_track} exceeds the file.')
+            return errors
+        _check_events(data, track_id, start + _LEN_TRACK_PREAMBLE, end, errors)
+        padding = -len_track % 4
+        if data[end:end + padding] != bytes([SmdlSpecialOpCode.TRACK_END.value] * padding):
+            error('trk', end, f'Track {track_id}: Expected {padding} padding bytes of 98.')
+        pnt = end + padding
+
+    if data[pnt:pnt + 4] != b'eoc\x20':
+        error('eoc', pnt, "Expected the 'eoc ' chunk.")
+    elif pnt + 16 > len(data):
+        error('eoc', pnt, 'The chunk exceeds the file.')
+    elif dse_read_uintle(data, pnt + 0x0C, 4) != 0:
+        error('eoc', pnt + 0x0C, 'Expected 4 zero bytes.')
+    return errors
+
+
+def _check_chunk(data, magic: bytes, offset: int, errors: List[DseValidationError]) -> Optional[int]:
+    """Checks the SWDL chunk header at offset. Returns the length of the chunk data, None if it's invalid."""
+    chunk = str(magic, 'ascii')
+    if data[offset:offset + 4] != magic:
+        errors.append(DseValidationError(chunk, offset, f"Expected the '{chunk}' chunk."))
+        return None
+    if offset + _LEN_CHUNK_HEADER > len(data):
+        errors.append(DseValidationError(chunk, offset, 'The chunk header exceeds the file.'))
+        return None
+    if data[offset + 0x04:offset + 0x0C] != _CHUNK_HEADER:
+        errors.append(DseValidationError(chunk, offset + 0x04, 'Expected 00 00 15 04 10 00 00 00.'))
+    len_chunk = dse_read_uintle(data, offset + 0x0C, 4)
+    if offset + _LEN_CHUNK_HEADER + len_chunk > len(data):
+        errors.append(DseValidationError(
+            chunk, offset + 0x0C, f'The chunk with a length of {len_chunk} exceeds the file.'
+        ))
+        return None
+    return len_chunk
+
+
+def _check_file_name(data, chunk: str, offset: int, errors: List[DseValidationError]):
+    """Checks the 16 byte file name at offset, like DseFilenameString does."""
+    name = bytes(data[offset:offset + 16])
+    end = name.find(0)
+    if end == -1:
+        errors.append(DseValidationError(chunk, offset, 'The file name is not null-terminated.'))
+        return
+    if any(c >= 0x80 for c in name[:end]):
+        errors.append(DseValidationError(chunk, offset, 'The file name is not ASCII.'))
+    rest = name[end + 1:]
+    if rest != b'\xaa' * len(rest) and rest != b'\xff' * len(rest):
+        errors.append(DseValidationError(chunk, offset + end + 1, 'The file name padding must be all AA or all FF.'))
+
+
+def _check_events(data, track_id: int, pnt: int, end: int, errors: List[DseValidationError]):
+    """Checks the events of a track from pnt to end, like SmdlTrack reads them."""
+    sizes = _EVENT_SIZES
+    note_max = SmdlEventPlayNote.MAX
+    while pnt < end:
+        op = data[pnt]
+        if op <= note_max:
+            # The top two bits of the second byte are the number of key down duration bytes.
+            size = 2 + (data[pnt + 1] >> 6) if pnt + 1 < end else 2
+        else:
+            size = sizes[op]
+            if size is None:
+                errors.append(DseValidationError('trk', pnt, f'Track {track_id}: Unknown event 0x{op:02x}.'))
+                return
+        if pnt + size > end:
+            errors.append(DseValidationError('trk', pnt, f'Track {track_id}: Event 0x{op:02x} exceeds the track.'))
+            return
+        pnt += size
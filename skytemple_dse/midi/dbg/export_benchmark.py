@@ -0,0 +1,49 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+import os
+import time
+
+from ndspy.rom import NintendoDSRom
+
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.midi.smdl_to_midi import smdl_to_midi
+from skytemple_files.common.util import get_files_from_rom_with_extension
+
+ROUNDS = 5
+
+base_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')
+rom = NintendoDSRom.fromFile(os.path.join(base_dir, 'skyworkcopy_us_unpatched.nds'))
+
+smdls = []
+for fname in get_files_from_rom_with_extension(rom, 'smd'):
+    if not fname.startswith("SOUND") or 'bgm' not in fname or fname == 'SOUND/BGM/bgm.smd':
+        continue
+    smdls.append(Smdl(rom.getFileByName(fname)))
+
+number_events = sum(len(track.events) for smdl in smdls for track in smdl.tracks)
+print(f"{len(smdls)} songs, {number_events} events.")
+
+timings = []
+for i in range(0, ROUNDS):
+    start = time.perf_counter()
+    for smdl in smdls:
+        smdl_to_midi(smdl)
+    timings.append(time.perf_counter() - start)
+    print(f"Round {i + 1}: {timings[-1]:.3f}s")
+
+best = min(timings)
+print(f"Best: {best:.3f}s ({number_events / best:.0f} events/s)")
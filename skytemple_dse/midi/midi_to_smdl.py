@@ -14,15 +14,21 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+import heapq
 import re
+from collections import deque
 from enum import Enum, auto
-from typing import Tuple, List, Iterable, Optional
+from itertools import islice
+from operator import itemgetter
+from typing import Tuple, List, Iterable, Optional, Dict, Deque
 
 from mido import MidiFile, Message, MetaMessage
 from mido.messages import BaseMessage
 
 from skytemple_dse.dse.smdl.model import Smdl, SmdlTrack, SmdlEventPlayNote, SmdlEventSpecial, SmdlSpecialOpCode, \
-    SmdlNote
+    SmdlNote, SmdlEvent, SmdlTrackPreamble, SmdlTrackHeader
+from skytemple_dse.dse.smdl.compress import SmdlTimingCompressor, compress_track
+from skytemple_dse.dse.smdl.writer import SmdlWriter
 PATTERN_MATCH_MARKER = re.compile(r'UNK 0x([0-9a-fA-F][0-9a-fA-F]?) (?:0x([0-9a-fA-F][0-9a-fA-F]?))?' + \
                                   ('(?: 0x([0-9a-fA-F][0-9a-fA-F]?))?' * 7) + ' ?')
 EXPRESSION_DEFAULT = 113
@@ -77,8 +83,8 @@ def _correct_octave(smdl_track: SmdlTrack, midi_note: int, s: MidiExportState):
     return octave - s.current_octave
 
 
-def _insert_pause(smdl_track: SmdlTrack, event: BaseMessage, s: MidiExportState):
-    pause_in_ticks = event.abs_time - s.previous_tick
+def _insert_pause(smdl_track: SmdlTrack, abs_time: int, s: MidiExportState):
+    pause_in_ticks = abs_time - s.previous_tick
     #if pause_in_ticks > 0xFFFFFF:
     #    # TODO: We could technically still encode this.
     #    raise ValueError("The MIDI contains a VERY long pause, this is currently not supported.")
@@ -96,12 +102,11 @@ def _insert_pause(smdl_track: SmdlTrack, event: BaseMessage, s: MidiExportState)
     elif pause_in_ticks < 0:
         raise ValueError("Internal MIDI timing error.")
 
-    s.previous_tick = event.abs_time
+    s.previous_tick = abs_time
 
 
-def _read_note(smdl_track: SmdlTrack, event_on: Message, event_off: Message, s: MidiExportState):
-    hold_duration = event_off.abs_time - event_on.abs_time
-    _insert_pause(smdl_track, event_on, s)
+def _read_note(smdl_track: SmdlTrack, event_on: Message, abs_time: int, hold_duration: int, s: MidiExportState):
+    _insert_pause(smdl_track, abs_time, s)
     octave_mod = _correct_octave(smdl_track, event_on.note, s)
     s.current_octave += octave_mod
     s.last_note_hold_time = hold_duration
@@ -110,15 +115,15 @@ def _read_note(smdl_track: SmdlTrack, event_on: Message, event_off: Message, s:
     ))
 
 
-def _read_program_change(smdl_track: SmdlTrack, event: Message, s: MidiExportState):
-    _insert_pause(smdl_track, event, s)
+def _read_program_change(smdl_track: SmdlTrack, event: Message, abs_time: int, s: MidiExportState):
+    _insert_pause(smdl_track, abs_time, s)
     smdl_track.events.append(SmdlEventSpecial(
         SmdlSpecialOpCode.SET_SAMPLE, params=[event.program]
     ))
 
 
-def _read_control_change(smdl_track: SmdlTrack, event: Message, s: MidiExportState, warnings: List[SmdlConvertWarning]):
-    _insert_pause(smdl_track, event, s)
+def _read_control_change(smdl_track: SmdlTrack, event: Message, abs_time: int, s: MidiExportState, warnings: List[SmdlConvertWarning]):
+    _insert_pause(smdl_track, abs_time, s)
     if event.control == 1:
         smdl_track.events.append(SmdlEventSpecial(
             SmdlSpecialOpCode.SET_MODU, params=[event.value]
@@ -139,8 +144,8 @@ def _read_control_change(smdl_track: SmdlTrack, event: Message, s: MidiExportSta
         warnings.append(SmdlConvertWarning(smdl_track.preamble.track_id, event, SmdlConvertWarningReason.UNKNOWN_CONTROL))
 
 
-def _read_pitchwheel(smdl_track: SmdlTrack, event: Message, s: MidiExportState):
-    _insert_pause(smdl_track, event, s)
+def _read_pitchwheel(smdl_track: SmdlTrack, event: Message, abs_time: int, s: MidiExportState):
+    _insert_pause(smdl_track, abs_time, s)
 
     bend = event.pitch
     bend += (16384 // 2)
@@ -153,9 +158,9 @@ def _read_pitchwheel(smdl_track: SmdlTrack, event: Message, s: MidiExportState):
     ))
 
 
-def _read_marker(smdl_track: SmdlTrack, event: MetaMessage, s: MidiExportState, warnings: List[SmdlConvertWarning]):
-    _insert_pause(smdl_track, event, s)
-    if 'loop' in event.text.lower() and event.text.lower() != 'loopstart':
+def _read_marker(smdl_track: SmdlTrack, event: MetaMessage, abs_time: int, s: MidiExportState, warnings: List[SmdlConvertWarning]):
+    _insert_pause(smdl_track, abs_time, s)
+    if _is_loop_marker(event):
         smdl_track.events.append(SmdlEventSpecial(
             SmdlSpecialOpCode.LOOP_POINT, params=[]
         ))
@@ -195,126 +200,353 @@ def _read_marker(smdl_track: SmdlTrack, event: MetaMessage, s: MidiExportState,
         )
 
 
-def _read_end_of_track(smdl_track: SmdlTrack, event: MetaMessage, s: MidiExportState):
-    _insert_pause(smdl_track, event, s)
+def _is_loop_marker(event: MetaMessage) -> bool:
+    return 'loop' in event.text.lower() and event.text.lower() != 'loopstart'
+
+
+def _read_end_of_track(smdl_track: SmdlTrack, event: MetaMessage, abs_time: int, s: MidiExportState):
+    _insert_pause(smdl_track, abs_time, s)
     smdl_track.events.append(SmdlEventSpecial(
         SmdlSpecialOpCode.TRACK_END, params=[]
     ))
 
 
-def _read_set_tempo(smdl_track: SmdlTrack, event: MetaMessage, s: MidiExportState):
-    _insert_pause(smdl_track, event, s)
+def _read_set_tempo(smdl_track: SmdlTrack, event: MetaMessage, abs_time: int, s: MidiExportState):
+    _insert_pause(smdl_track, abs_time, s)
     smdl_track.events.append(SmdlEventSpecial(
         SmdlSpecialOpCode.SET_TEMPO, params=[60000000 // event.tempo]
     ))
 
 
+def _note_durations(msgs: Iterable[Tuple[int, BaseMessage]]) -> Dict[int, int]:
+    """
+    Pairs every note_on with it's note_off in one pass over the messages of a track, which are given as tuples of
+    absolute time and message. A note_on with velocity 0 counts as a note_off. If the same note is played again
+    before it is released, note_offs release the notes in the order they were played.
+    Returns the key down durations by the index of the note_on message.
+    """
+    open_notes: Dict[Tuple[int, int], Deque[Tuple[int, int]]] = {}
+    durations = {}
+    for i, (abs_time, msg) in enumerate(msgs):
+        if msg.type == 'note_on' and msg.velocity > 0:
+            key = (msg.channel, msg.note)
+            if key not in open_notes:
+                open_notes[key] = deque()
+            open_notes[key].append((i, abs_time))
+        elif msg.type == 'note_off' or msg.type == 'note_on':
+            playing = open_notes.get((msg.channel, msg.note))
+            if playing:
+                on_index, on_time = playing.popleft()
+                durations[on_index] = abs_time - on_time
+    if any(len(playing) > 0 for playing in open_notes.values()):
+        raise ValueError("Invalid MIDI. A played note was never released.")
+    return durations
+
+
 def times_to_absolute(msgs: Iterable[BaseMessage]) -> List[BaseMessage]:
     l = []
-    tick = 0
-    for m in msgs:
-        tick += m.time
+    for tick, m in _absolute_times(msgs):
         vars(m)['abs_time'] = tick
         l.append(m)
     return l
 
 
-# TODO: Convert using Channels, not Tracks
-def midi_to_smdl(midi: MidiFile, header1val, header2val) -> Tuple[Smdl, List[SmdlConvertWarning]]:
-    smdl = Smdl.new(midi.filename.split('/')[-1][0:15])
-    warnings = []
+def _absolute_times(msgs: Iterable[BaseMessage]) -> Iterable[Tuple[int, BaseMessage]]:
+    """Yields tuples of absolute time and message, without changing the messages."""
+    tick = 0
+    for m in msgs:
+        tick += m.time
+        yield tick, m
 
-    free_channels = list(range(0, 16))
-    max_channel = 0
 
-    for track_id, track in enumerate(midi.tracks):
-        # Assert, that all messages are on the same channel
-        channel = -1
-        track = times_to_absolute(track)
-        for event in track:
-            if channel == -1:
-                if hasattr(event, 'channel'):
-                    channel = event.channel
-                    assert channel > -1
-                    max_channel = max(max_channel, channel)
-                else:
-                    continue
-            elif hasattr(event, 'channel') and event.channel != channel:
-                raise ValueError("To convert a MIDI to an SMDL, all messages on the MIDI "
-                                 "track must play on the same channel.")
+class _AbsoluteTimes:
+    """The messages as tuples of absolute time and message. Can be iterated multiple times, without copying them."""
+    def __init__(self, msgs: Iterable[BaseMessage]):
+        self.msgs = msgs
+
+    def __iter__(self):
+        return _absolute_times(self.msgs)
+
+
+class _SmdlEventEncoder:
+    """Used in place of the events list of an SmdlTrack. Encodes appended events into the buffer right away."""
+    def __init__(self, buffer: bytearray):
+        self.buffer = buffer
+
+    def append(self, event: SmdlEvent):
+        SmdlWriter.write_event(self.buffer, event)
 
-        if channel == -1:
-            channel = 0
 
-        if channel not in free_channels:
-            if channel == 0 and track_id == 1:
-                # We allow duplicate channel 0 in this case
-                pass
+class _SmdlTrackEncoder:
+    """Used in place of an SmdlTrack while converting, if the events should be encoded right away."""
+    def __init__(self, preamble: SmdlTrackPreamble, buffer: bytearray):
+        self.preamble = preamble
+        self.events = _SmdlEventEncoder(buffer)
+
+
+def _track_channel(track_id: int, track: Iterable[BaseMessage], free_channels: List[int]) -> Tuple[int, int]:
+    """
+    Returns the channel the SMDL track for the MIDI track should use and the channel the MIDI messages play on
+    (or -1 if no message has a channel). The channel used is removed from free_channels.
+    """
+    # Assert, that all messages are on the same channel
+    midi_channel = -1
+    for event in track:
+        if midi_channel == -1:
+            if hasattr(event, 'channel'):
+                midi_channel = event.channel
+                assert midi_channel > -1
             else:
-                if len(free_channels) < 1:
-                    raise ValueError("The MIDI uses too many channels. Please limit to 16.")
-                channel = free_channels.pop(0)
+                continue
+        elif hasattr(event, 'channel') and event.channel != midi_channel:
+            raise ValueError("To convert a MIDI to an SMDL by tracks, all messages on the MIDI "
+                             "track must play on the same channel. Convert it by channels instead.")
+
+    channel = midi_channel
+    if channel == -1:
+        channel = 0
+
+    if channel not in free_channels:
+        if channel == 0 and track_id == 1:
+            # We allow duplicate channel 0 in this case
+            pass
         else:
-            free_channels.remove(channel)
+            if len(free_channels) < 1:
+                raise ValueError("The MIDI uses too many channels. Please limit to 16.")
+            channel = free_channels.pop(0)
+    else:
+        free_channels.remove(channel)
+
+    return channel, midi_channel
+
+
+def _channel_tracks(midi: MidiFile) -> Iterable[Tuple[int, int, Iterable[Tuple[int, BaseMessage]]]]:
+    """
+    Demultiplexes the messages of all tracks of the MIDI by channel, in one pass over the messages of all tracks
+    merged by time (after finding the channel of each MIDI track). The first SMDL track gets all meta messages and
+    messages without a channel, all other SMDL tracks get the messages of one channel each. Loop markers are added
+    to all tracks and all tracks end with the song.
+    Other markers (like the ones for DSE events smdl_to_midi creates) of a MIDI track, whose messages all play on
+    one channel, go to the SMDL track of that channel.
+    Markers of MIDI tracks that play on more than one channel (like the track of a format 0 MIDI) can't be assigned
+    to a channel, they go to the first SMDL track, even if the events only applied to the track of one channel.
+    Yields the channel, MIDI channel and messages (as tuples of absolute time and message) of each SMDL track.
+    """
+    track_channels = [_single_channel(track) for track in midi.tracks]
+    meta_track: List[Tuple[int, BaseMessage]] = []
+    channel_tracks: Dict[int, List[Tuple[int, BaseMessage]]] = {}
+    loop_markers = []
+    end_time = 0
+    merged = heapq.merge(*(_with_track_id(track_id, track) for track_id, track in enumerate(midi.tracks)),
+                         key=itemgetter(0))
+    for abs_time, event, track_id in merged:
+        end_time = abs_time
+        if isinstance(event, MetaMessage):
+            if event.type == 'end_of_track':
+                continue
+            if event.type == 'marker':
+                if _is_loop_marker(event):
+                    loop_markers.append((abs_time, event))
+                    for channel_track in channel_tracks.values():
+                        channel_track.append((abs_time, event))
+                elif track_channels[track_id] > -1:
+                    _channel_track(channel_tracks, track_channels[track_id], loop_markers).append((abs_time, event))
+                    continue
+            meta_track.append((abs_time, event))
+        elif hasattr(event, 'channel'):
+            _channel_track(channel_tracks, event.channel, loop_markers).append((abs_time, event))
+        else:
+            meta_track.append((abs_time, event))
+
+    end_of_track = MetaMessage('end_of_track')
+    meta_track.append((end_time, end_of_track))
+    yield 0, -1, meta_track
+    for channel in sorted(channel_tracks.keys()):
+        channel_tracks[channel].append((end_time, end_of_track))
+        yield channel, channel, channel_tracks[channel]
+
+
+def _channel_track(
+        channel_tracks: Dict[int, List[Tuple[int, BaseMessage]]], channel: int, loop_markers: List
+) -> List[Tuple[int, BaseMessage]]:
+    """Returns the messages of the channel, if there are none yet, the list is created with the loop markers so far."""
+    if channel not in channel_tracks:
+        channel_tracks[channel] = list(loop_markers)
+    return channel_tracks[channel]
+
+
+def _with_track_id(track_id: int, track: Iterable[BaseMessage]) -> Iterable[Tuple[int, BaseMessage, int]]:
+    """Yields tuples of absolute time, message and the ID of the MIDI track."""
+    for abs_time, event in _absolute_times(track):
+        yield abs_time, event, track_id
+
+
+def _single_channel(track: Iterable[BaseMessage]) -> int:
+    """Returns the channel all messages of the MIDI track play on, or -1 if no message or more than one channel."""
+    channel = -1
+    for event in track:
+        if hasattr(event, 'channel'):
+            if channel == -1:
+                channel = event.channel
+            elif event.channel != channel:
+                return -1
+    return channel
+
+
+def _tracks(midi: MidiFile, by_channel: bool) -> Iterable[Tuple[int, int, Iterable[Tuple[int, BaseMessage]]]]:
+    """
+    Yields the channel, MIDI channel (or -1 if no message has a channel) and messages (as tuples of absolute time
+    and message) of each SMDL track to create.
+    """
+    if by_channel:
+        yield from _channel_tracks(midi)
+        return
+    free_channels = list(range(0, 16))
+    for track_id, track in enumerate(midi.tracks):
+        channel, midi_channel = _track_channel(track_id, track, free_channels)
+        yield channel, midi_channel, _AbsoluteTimes(track)
+
+
+def _convert_track(
+        smdl_track: SmdlTrack, track_id: int, track: Iterable[Tuple[int, BaseMessage]],
+        header1val: int, header2val: int, warnings: List[SmdlConvertWarning]
+):
+    """
+    Converts the messages of the MIDI track, given as tuples of absolute time and message, and appends the resulting
+    events to the events of smdl_track. The messages are iterated twice.
+    """
+    s = MidiExportState()
+    first_events = [event for _, event in islice(track, 2)]
+
+    # Check if first message is setting expression, otherwise generate.
+    expression_event = None
+    if len(first_events) < 1 or not isinstance(first_events[0], Message) \
+            or first_events[0].type != 'control_change' or first_events[0].control != 11:
+        warnings.append(SmdlConvertWarning(track_id, None, SmdlConvertWarningReason.SET_XPRESS_AUTOGEN))
+        expression_event = Message('control_change', control=11, value=EXPRESSION_DEFAULT)
+
+    def timed_messages() -> Iterable[Tuple[int, BaseMessage]]:
+        if expression_event is not None:
+            yield 0, expression_event
+        yield from track
+
+    note_durations = _note_durations(timed_messages())
+    second_event = None
+    if expression_event is not None and len(first_events) > 0:
+        second_event = first_events[0]
+    elif len(first_events) > 1:
+        second_event = first_events[1]
+
+    for ei, (abs_time, event) in enumerate(timed_messages()):
+        if isinstance(event, Message):
+            if event.type == 'note_on' and event.velocity > 0:
+                _read_note(smdl_track, event, abs_time, note_durations[ei], s)
+            elif event.type == 'program_change':
+                _read_program_change(smdl_track, event, abs_time, s)
+            elif event.type == 'control_change':
+                _read_control_change(smdl_track, event, abs_time, s, warnings)
+                if event.control == 11 and ei == 0 and track_id != 0:
+                    # Look ahead. If first message, not first track and next message does
+                    # not set HEADER1, auto generate
+                    evt = second_event
+                    if not isinstance(evt, MetaMessage) or evt.type != 'marker' or not evt.text.startswith('HEADER1 '):
+                        warnings.append(SmdlConvertWarning(track_id, None, SmdlConvertWarningReason.HEADER_EVENTS_AUTOGEN))
+                        smdl_track.events.append(SmdlEventSpecial(
+                            SmdlSpecialOpCode.SET_HEADER1, params=[header1val]
+                        ))
+                        smdl_track.events.append(SmdlEventSpecial(
+                            SmdlSpecialOpCode.SET_HEADER2, params=[header2val]
+                        ))
+            elif event.type == 'pitchwheel':
+                _read_pitchwheel(smdl_track, event, abs_time, s)
+            elif event.type != 'note_off' and event.type != 'note_on':
+                warnings.append(SmdlConvertWarning(track_id, event))
+        elif isinstance(event, MetaMessage):
+            if event.type == 'marker':
+                _read_marker(smdl_track, event, abs_time, s, warnings)
+            elif event.type == 'end_of_track':
+                _read_end_of_track(smdl_track, event, abs_time, s)
+            elif event.type == 'set_tempo':
+                _read_set_tempo(smdl_track, event, abs_time, s)
+            else:
+                warnings.append(SmdlConvertWarning(track_id, event))
+
+
+def midi_to_smdl(
+        midi: MidiFile, header1val, header2val, *, compress_timing=False, by_channel=False
+) -> Tuple[Smdl, List[SmdlConvertWarning]]:
+    """
+    Converts the MIDI into an Smdl model.
+    If compress_timing is True, the pauses and note lengths of the tracks are re-encoded to use as little space as
+    possible (see SmdlTimingCompressor).
+
+    By default every MIDI track is converted into one SMDL track and all messages of a MIDI track must play on the
+    same channel. If by_channel is True, the messages are instead split into one SMDL track per MIDI channel, plus a
+    first track for tempo changes and other meta messages. Use this for format 0 MIDIs and tracks that mix channels.
+    Markers of MIDI tracks that mix channels are added to the first track then (see _channel_tracks).
+    """
+    smdl = Smdl.new(midi.filename.split('/')[-1][0:15])
+    warnings = []
+
+    max_channel = 0
+
+    for track_id, (channel, midi_channel, track) in enumerate(_tracks(midi, by_channel)):
+        max_channel = max(max_channel, midi_channel)
 
         smdl_track = SmdlTrack.new(track_id, channel)
         smdl.tracks.append(smdl_track)
-
-        s = MidiExportState()
-
-        # Check if first message is setting expression, otherwise generate.
-        if not isinstance(track[0], Message) or track[0].type != 'control_change' or track[0].control != 11:
-            warnings.append(SmdlConvertWarning(track_id, None, SmdlConvertWarningReason.SET_XPRESS_AUTOGEN))
-            m = Message('control_change', control=11, value=EXPRESSION_DEFAULT)
-            vars(m)['abs_time'] = 0
-            track.insert(0, m)
-
-        for ei, event in enumerate(track):
-            if isinstance(event, Message):
-                if event.type == 'note_on':
-                    # Look ahead for note_off
-                    event_on = event
-                    event_off = None
-                    for evt in track[ei:]:
-                        if isinstance(event, Message) and evt.type == 'note_off':
-                            if evt.channel == event_on.channel \
-                                    and evt.note == event_on.note:
-                                event_off = evt
-                                break
-                    if event_off is None:
-                        raise ValueError("Invalid MIDI. A played note was never released.")
-                    _read_note(smdl_track, event_on, event_off, s)
-                elif event.type == 'program_change':
-                    _read_program_change(smdl_track, event, s)
-                elif event.type == 'control_change':
-                    _read_control_change(smdl_track, event, s, warnings)
-                    if event.control == 11 and ei == 0 and track_id != 0:
-                        # Look ahead. If first message, not first track and next message does
-                        # not set HEADER1, auto generate
-                        evt = track[ei + 1]
-                        if not isinstance(evt, MetaMessage) or evt.type != 'marker' or not evt.text.startswith('HEADER1 '):
-                            warnings.append(SmdlConvertWarning(track_id, None, SmdlConvertWarningReason.HEADER_EVENTS_AUTOGEN))
-                            smdl_track.events.append(SmdlEventSpecial(
-                                SmdlSpecialOpCode.SET_HEADER1, params=[header1val]
-                            ))
-                            smdl_track.events.append(SmdlEventSpecial(
-                                SmdlSpecialOpCode.SET_HEADER2, params=[header2val]
-                            ))
-                elif event.type == 'pitchwheel':
-                    _read_pitchwheel(smdl_track, event, s)
-                elif event.type != 'note_off':
-                    warnings.append(SmdlConvertWarning(track_id, event))
-            elif isinstance(event, MetaMessage):
-                if event.type == 'marker':
-                    _read_marker(smdl_track, event, s, warnings)
-                elif event.type == 'end_of_track':
-                    _read_end_of_track(smdl_track, event, s)
-                elif event.type == 'set_tempo':
-                    _read_set_tempo(smdl_track, event, s)
-                else:
-                    warnings.append(SmdlConvertWarning(track_id, event))
+        _convert_track(smdl_track, track_id, track, header1val, header2val, warnings)
+        if compress_timing:
+            compress_track(smdl_track)
 
     smdl.song.tpqn = midi.ticks_per_beat
     smdl.song.nbchans = max_channel + 1
 
     return smdl, warnings
+
+
+def midi_to_smdl_bytes(
+        midi: MidiFile, header1val, header2val, *, compress_timing=False, by_channel=False
+) -> Tuple[bytes, List[SmdlConvertWarning]]:
+    """
+    Like midi_to_smdl, but returns the SMDL in the binary format used by the game (like the SmdlWriter).
+    Events are encoded as soon as they are converted, track by track, without building an Smdl model or
+    changing the MIDI messages. Use this for large MIDI files.
+    """
+    smdl = Smdl.new(midi.filename.split('/')[-1][0:15])
+    warnings = []
+
+    max_channel = 0
+    number_of_tracks = 0
+
+    data = bytearray(128)
+    for track_id, (channel, midi_channel, track) in enumerate(_tracks(midi, by_channel)):
+        number_of_tracks += 1
+        max_channel = max(max_channel, midi_channel)
+
+        header_start = len(data)
+        data += bytes(16)
+        track_start = len(data)
+        preamble = SmdlTrackPreamble.new(track_id, channel)
+        data += preamble.to_bytes()
+        track_encoder = _SmdlTrackEncoder(preamble, data)
+        compressor = None
+        if compress_timing:
+            compressor = SmdlTimingCompressor(track_encoder.events)
+            track_encoder.events = compressor
+        _convert_track(track_encoder, track_id, track, header1val, header2val, warnings)
+        if compressor is not None:
+            compressor.flush()
+        data[header_start:track_start] = SmdlTrackHeader.new().to_bytes(len(data) - track_start)
+        # padding
+        if len(data) % 4 != 0:
+            data += bytes([0x98] * (4 - len(data) % 4))
+
+    smdl.song.tpqn = midi.ticks_per_beat
+    smdl.song.nbchans = max_channel + 1
+
+    data += smdl.eoc.to_bytes()
+    data[0:64] = smdl.header.to_bytes(len(data))
+    data[64:128] = smdl.song.to_bytes(number_of_tracks)
+
+    return bytes(data), warnings
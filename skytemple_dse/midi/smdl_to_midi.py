@@ -14,7 +14,8 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
-from typing import Tuple, Dict, Iterable
+from operator import itemgetter
+from typing import Tuple, Iterable, Dict, Callable
 
 from mido import MidiFile, MidiTrack, Message, MetaMessage, bpm2tempo
 from mido.messages import BaseMessage
@@ -24,11 +25,11 @@ LOOP_POINT = "Loop Point"
 
 
 class MidiWriteState:
+    """The timing of the current event, from SmdlTrack.timing, and the channel of the track."""
     def __init__(self, channel: int):
         self.tick_current = 0
         self.oct_current = 0
-        self.last_note_len = 0
-        self.last_wait_time = 0
+        self.duration = 0
         self.channel = channel
 
 
@@ -46,43 +47,31 @@ class TimedContainer:
     """mido uses relative timings... SMDL doesn't work like this. This container stores them absolutely and then
     returns them as messages in relative order, with relative time attributes."""
     def __init__(self):
-        self.container: Dict[int, List[BaseMessage]] = {}
+        self.container: List[Tuple[int, BaseMessage]] = []
 
     def append(self, time: int, message: BaseMessage):
-        if time not in self.container:
-            self.container[time] = []
-        self.container[time].append(message)
+        self.container.append((time, message))
 
     def __iter__(self) -> Iterable[BaseMessage]:
+        # The sort is stable, so messages with the same time stay in the order they were added in. Most messages
+        # are already added in order (only note offs are added ahead of time), so this is mostly merging sorted runs.
+        self.container.sort(key=itemgetter(0))
         prev_time = 0
-        for time, msgs in sorted(self.container.items(), key=lambda item: item[0]):
-            first = msgs.pop(0)
-            first.time = time - prev_time
-            prev_time += first.time
-            yield first
-            for msg in msgs:
-                msg.time = 0
-                yield msg
+        for time, msg in self.container:
+            # The times are already known to be valid, skip mido's attribute checks.
+            vars(msg)['time'] = time - prev_time
+            prev_time = time
+            yield msg
 
 
 def _read_note(event: SmdlEventPlayNote, track: TimedContainer, state: MidiWriteState):
-    midi_note = smdl_note_to_midi(event.note, state.oct_current + event.octave_mod)
-    n_length = event.key_down_duration
-    if n_length < 0:
-        n_length = state.last_note_len
-    off_time = state.tick_current + n_length
+    midi_note = smdl_note_to_midi(event.note, state.oct_current)
+    off_time = state.tick_current + state.duration
     track.append(state.tick_current, Message('note_on', note=midi_note, channel=state.channel, velocity=event.velocity))
     track.append(off_time, Message('note_off', note=midi_note, channel=state.channel, velocity=event.velocity))
 
-    state.oct_current = state.oct_current + event.octave_mod
-    state.last_note_len = n_length
 
-
-def _read_delta_time(event: SmdlEventPause, state: MidiWriteState):
-    state.tick_current += event.value.length
-
-
-def _read_loop_point_event(track: TimedContainer, state: MidiWriteState):
+def _read_loop_point_event(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
     track.append(state.tick_current, MetaMessage('marker', text='loop'))
 
 
@@ -99,10 +88,6 @@ def _read_mod_wheel_change(event: SmdlEventSpecial, track: TimedContainer, state
     track.append(state.tick_current, Message('control_change', control=1, value=event.params[0], channel=state.channel))
 
 
-def _read_octave_set(event: SmdlEventSpecial, state: MidiWriteState):
-    state.oct_current = event.params[0]
-
-
 def _read_pan_change(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
     track.append(state.tick_current, Message('control_change', control=10, value=event.params[0], channel=state.channel))
 
@@ -124,30 +109,13 @@ def _read_expression_set(event: SmdlEventSpecial, track: TimedContainer, state:
     track.append(state.tick_current, Message('control_change', control=11, value=event.params[0], channel=state.channel))
 
 
-def _read_track_end_event(track: TimedContainer,  state: MidiWriteState):
+def _read_track_end_event(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
     track.append(state.tick_current, MetaMessage('end_of_track'))
 
 
-def _read_wait_event(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
-    if event.op == SmdlSpecialOpCode.WAIT_1BYTE:
-        wait_time = event.params[0]
-    elif event.op == SmdlSpecialOpCode.WAIT_2BYTE:
-        wait_time = event.params[1]
-        wait_time <<= 8
-        wait_time |= event.params[0] & 0xFF
-    elif event.op == SmdlSpecialOpCode.WAIT_3BYTE:
-        wait_time = event.params[2]
-        wait_time <<= 8
-        wait_time = event.params[1]
-        wait_time <<= 8
-        wait_time |= event.params[0] & 0xFF
-    elif event.op == SmdlSpecialOpCode.WAIT_ADD:
-        wait_time = state.last_wait_time + event.params[0]
-    elif event.op == SmdlSpecialOpCode.WAIT_AGAIN:
-        wait_time = state.last_wait_time
-
-    state.tick_current += wait_time
-    state.last_wait_time = wait_time
+def _read_timing_event(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
+    # Waits and octave changes are already resolved into the tick and octave of the events.
+    pass
 
 
 def _read_unknown_event(event: SmdlEventSpecial, track: TimedContainer, state: MidiWriteState):
@@ -162,58 +130,54 @@ def _read_header_event(event: SmdlEventSpecial, track: TimedContainer, state: Mi
     track.append(state.tick_current, MetaMessage('marker', text=f'HEADER{i} {event.params[0]}'))
 
 
+# Handlers for all event types, except special events. Pauses only change the timing.
+_EVENT_HANDLERS: Dict[type, Callable[[SmdlEvent, TimedContainer, MidiWriteState], None]] = {
+    SmdlEventPlayNote: _read_note,
+}
+# Handlers for special events by op code. All op codes not in here are handled by _read_unknown_event.
+_SPECIAL_EVENT_HANDLERS: Dict[SmdlSpecialOpCode, Callable[[SmdlEventSpecial, TimedContainer, MidiWriteState], None]] = {
+    SmdlSpecialOpCode.LOOP_POINT: _read_loop_point_event,
+    SmdlSpecialOpCode.SET_BEND: _read_pitch_bend_set,
+    SmdlSpecialOpCode.SET_MODU: _read_mod_wheel_change,
+    SmdlSpecialOpCode.SET_OCTAVE: _read_timing_event,
+    SmdlSpecialOpCode.SET_PAN: _read_pan_change,
+    SmdlSpecialOpCode.SET_SAMPLE: _read_program_change,
+    SmdlSpecialOpCode.SET_TEMPO: _read_tempo_set,
+    SmdlSpecialOpCode.SET_VOLUME: _read_volume_set,
+    SmdlSpecialOpCode.SET_XPRESS: _read_expression_set,
+    SmdlSpecialOpCode.TRACK_END: _read_track_end_event,
+    SmdlSpecialOpCode.WAIT_1BYTE: _read_timing_event,
+    SmdlSpecialOpCode.WAIT_2BYTE: _read_timing_event,
+    SmdlSpecialOpCode.WAIT_3BYTE: _read_timing_event,
+    SmdlSpecialOpCode.WAIT_ADD: _read_timing_event,
+    SmdlSpecialOpCode.WAIT_AGAIN: _read_timing_event,
+    SmdlSpecialOpCode.SET_HEADER1: _read_header_event,
+    SmdlSpecialOpCode.SET_HEADER2: _read_header_event,
+}
+
+
 def smdl_to_midi(smdl: Smdl) -> MidiFile:
     mid = MidiFile(ticks_per_beat=smdl.song.tpqn)
     mid.filename = smdl.header.file_name
+    event_handlers = _EVENT_HANDLERS
+    special_event_handlers = _SPECIAL_EVENT_HANDLERS
     for track in smdl.tracks:
         midi_track = MidiTrack()
         timed_track = TimedContainer()
         state = MidiWriteState(track.preamble.channel_id)
         mid.tracks.append(midi_track)
-        for event in track.events:
-            if isinstance(event, SmdlEventPlayNote):
-                _read_note(event, timed_track, state)
-            elif isinstance(event, SmdlEventPause):
-                _read_delta_time(event, state)
-            elif isinstance(event, SmdlEventSpecial):
-                if event.op == SmdlSpecialOpCode.LOOP_POINT:
-                    _read_loop_point_event(timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_BEND:
-                    _read_pitch_bend_set(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_MODU:
-                    _read_mod_wheel_change(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_OCTAVE:
-                    _read_octave_set(event, state)
-                elif event.op == SmdlSpecialOpCode.SET_PAN:
-                    _read_pan_change(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_SAMPLE:
-                    _read_program_change(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_TEMPO:
-                    _read_tempo_set(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_VOLUME:
-                    _read_volume_set(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_XPRESS:
-                    _read_expression_set(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.TRACK_END:
-                    _read_track_end_event(timed_track, state)
-                elif event.op == SmdlSpecialOpCode.WAIT_1BYTE:
-                    _read_wait_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.WAIT_2BYTE:
-                    _read_wait_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.WAIT_3BYTE:
-                    _read_wait_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.WAIT_ADD:
-                    _read_wait_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.WAIT_AGAIN:
-                    _read_wait_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_HEADER1:
-                    _read_header_event(event, timed_track, state)
-                elif event.op == SmdlSpecialOpCode.SET_HEADER2:
-                    _read_header_event(event, timed_track, state)
-                else:
-                    _read_unknown_event(event, timed_track, state)
-
-        for entry in timed_track:
-            midi_track.append(entry)
+        timing = track.timing()
+        for event, tick, duration, octave in zip(track.events, timing.ticks, timing.durations, timing.octaves):
+            state.tick_current = tick
+            state.duration = duration
+            state.oct_current = octave
+            if type(event) is SmdlEventSpecial:
+                special_event_handlers.get(event.op, _read_unknown_event)(event, timed_track, state)
+            else:
+                handler = event_handlers.get(type(event))
+                if handler is not None:
+                    handler(event, timed_track, state)
+
+        midi_track.extend(timed_track)
 
     return mid
@@ -14,10 +14,11 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+import copy
 import logging
-from typing import Optional, List
+from typing import Optional, List, Dict
 
-from skytemple_dse.dse.common import HasId
+from skytemple_dse.dse.swdl.compact import compact_keygroups, set_sub_bank_sample_positions
 from skytemple_dse.dse.swdl.kgrp import SwdlKeygroup
 from skytemple_dse.dse.swdl.model import Swdl
 from skytemple_dse.dse.swdl.prgi import SwdlProgramTable
@@ -51,93 +52,145 @@ class Program:
         an exception is raised instead). Additionally if an exact match of a wavi is found, that one is used, instead
         of a new wavi being inserted into both the main bank and it's copy into the swdl. Keygroups are also checked if
         they already exist in the swdl, and are re-used if so.
+        Returns whether the main bank swdl was modified.
+
+        To load multiple programs into the same SWDL, use load_many_into_swdl instead."""
+        return self.load_many_into_swdl({program_id: self}, swdl, main_bank_swdl, allow_add_samples)
+
+    @classmethod
+    def load_many_into_swdl(
+            cls, programs: Dict[int, 'Program'], swdl: Swdl, main_bank_swdl: Swdl, allow_add_samples=True
+    ) -> bool:
+        """Load multiple programs into the provided SWDL at once. The keys of `programs` are the program slots.
+        This has the same result as calling load_into_swdl for each program in order, but samples, wavis and
+        keygroups are only looked up once per batch and the WAVI table of the SWDL is only rebuilt once.
         Returns whether the main bank swdl was modified."""
-
         modified = False
-        logger.info(f'Importing a program into slot {program_id} in {swdl.header.file_name}.')
-
-        # lookup wavis and create in main bank if needed
-        wavi_ids = []
-        for src_sample, src_wavi in zip(self.sample_data, self.wavis):
-            wavi_id = self._lookup_list(src_wavi, main_bank_swdl.wavi.sample_info_table, ignore_id=True)
-            if wavi_id is None:
-                logger.warning(f'Had to create a new wavi.')
-                wavi_id = self._create_new_wavi(main_bank_swdl, src_wavi)
-                modified = True
-            src_wavi.id = wavi_id
-            wavi_ids.append(wavi_id)
-            assert main_bank_swdl.wavi.sample_info_table[wavi_id].id == wavi_id
-            # lookup samples in wavis and create in main bank if needed
-            sample_start = self._lookup_bytes(src_sample, main_bank_swdl.pcmd.chunk_data)
-            if sample_start is None:
-                if not allow_add_samples:
-                    raise ValueError("Sample not found in main bank.")
-                logger.warning(f'Had to create a new sample.')
-                sample_start = self._create_new_sample(main_bank_swdl, src_sample)
-                modified = True
-                main_bank_swdl.wavi.sample_info_table[wavi_id].force_set_sample_pos(sample_start)
-            src_wavi.force_set_sample_pos(sample_start)
-            #assert main_bank_swdl.wavi.sample_info_table[wavi_id] == src_wavi
-
-        # lookup keygroups and create in swdl if needed
-        kgrp_ids = []
-        for src_kgrp in self.kgrps:
-            kgrp_id = self._lookup_list(src_kgrp, swdl.kgrp.keygroups)
-            if kgrp_id is None:
-                logger.info(f'Had to create a new keygroup.')
-                kgrp_id = self._create_new_keygroup(swdl, src_kgrp)
-            src_kgrp.id = kgrp_id
-            kgrp_ids.append(kgrp_id)
-            assert swdl.kgrp.keygroups[kgrp_id] == src_kgrp
 
-        # Collect all still used wavi IDs
-        used_wavi_ids = []
-        for prg_id, prg in enumerate(swdl.prgi.program_table):
-            if prg_id != program_id and prg is not None:
-                for split in prg.splits:
-                    used_wavi_ids.append(split.sample_id)
+        # Lookup tables for the main bank wavis, the main bank samples and the keygroups of the swdl.
+        # The first matching entry wins, just like for a linear search.
+        wavi_lookup: Dict[bytes, int] = {}
+        for i, wavi in enumerate(main_bank_swdl.wavi.sample_info_table):
+            if wavi is not None:
+                wavi_lookup.setdefault(cls._wavi_lookup_key(wavi), i)
+        kgrp_lookup: Dict[tuple, int] = {}
+        for i, kgrp in enumerate(swdl.kgrp.keygroups):
+            if kgrp is not None:
+                kgrp_lookup.setdefault(cls._kgrp_lookup_key(kgrp), i)
+        sample_lookup: Dict[bytes, Optional[int]] = {}
+        main_pcmd_len = len(main_bank_swdl.pcmd.chunk_data)
+        new_sample_data = bytearray()
+
+        for program_id, program in programs.items():
+            logger.info(f'Importing a program into slot {program_id} in {swdl.header.file_name}.')
+
+            # lookup wavis and create in main bank if needed
+            wavi_ids = []
+            for src_sample, src_wavi in zip(program.sample_data, program.wavis):
+                wavi_id = wavi_lookup.get(cls._wavi_lookup_key(src_wavi))
+                created_wavi = False
+                if wavi_id is None:
+                    logger.warning(f'Had to create a new wavi.')
+                    wavi_id = cls._create_new_wavi(main_bank_swdl, src_wavi)
+                    created_wavi = True
+                    modified = True
+                src_wavi.id = wavi_id
+                wavi_ids.append(wavi_id)
+                assert main_bank_swdl.wavi.sample_info_table[wavi_id].id == wavi_id
+                # lookup samples in wavis and create in main bank if needed
+                src_sample = bytes(src_sample)
+                if src_sample not in sample_lookup:
+                    sample_start = cls._lookup_bytes(src_sample, main_bank_swdl.pcmd.chunk_data)
+                    if sample_start is None:
+                        sample_start = cls._lookup_bytes(src_sample, new_sample_data)
+                        if sample_start is not None:
+                            sample_start += main_pcmd_len
+                    sample_lookup[src_sample] = sample_start
+                sample_start = sample_lookup[src_sample]
+                if sample_start is None:
+                    if not allow_add_samples:
+                        raise ValueError("Sample not found in main bank.")
+                    logger.warning(f'Had to create a new sample.')
+                    sample_start = main_pcmd_len + len(new_sample_data)
+                    new_sample_data += src_sample
+                    sample_lookup[src_sample] = sample_start
+                    modified = True
+                    main_wavi = main_bank_swdl.wavi.sample_info_table[wavi_id]
+                    if not created_wavi:
+                        # The key of this wavi changes, since it's sample position changes.
+                        old_key = cls._wavi_lookup_key(main_wavi)
+                        if wavi_lookup.get(old_key) == wavi_id:
+                            del wavi_lookup[old_key]
+                    main_wavi.force_set_sample_pos(sample_start)
+                    wavi_lookup.setdefault(cls._wavi_lookup_key(main_wavi), wavi_id)
+                src_wavi.force_set_sample_pos(sample_start)
+                if created_wavi:
+                    wavi_lookup.setdefault(cls._wavi_lookup_key(src_wavi), wavi_id)
+
+            # lookup keygroups and create in swdl if needed
+            kgrp_ids = []
+            for src_kgrp in program.kgrps:
+                kgrp_id = kgrp_lookup.get(cls._kgrp_lookup_key(src_kgrp))
+                if kgrp_id is None:
+                    logger.info(f'Had to create a new keygroup.')
+                    # The SWDL gets its own copy, compact_keygroups renumbers the keygroups of the SWDL in place.
+                    new_kgrp = copy.copy(src_kgrp)
+                    kgrp_id = cls._create_new_keygroup(swdl, new_kgrp)
+                    new_kgrp.id = kgrp_id
+                    src_kgrp.id = kgrp_id
+                    kgrp_lookup.setdefault(cls._kgrp_lookup_key(new_kgrp), kgrp_id)
+                else:
+                    src_kgrp.id = kgrp_id
+                kgrp_ids.append(kgrp_id)
+                assert swdl.kgrp.keygroups[kgrp_id] == src_kgrp
+
+            # Copy program info and assign references to wavi and keygroupds
+            while len(swdl.prgi.program_table) <= program_id:
+                swdl.prgi.program_table.append(None)
+            swdl.prgi.program_table[program_id] = program.prg.copy(wavi_ids, kgrp_ids)
+            swdl.prgi.program_table[program_id].id = program_id
 
-        used_wavi_ids += wavi_ids
+        if len(new_sample_data) > 0:
+            main_bank_swdl.pcmd.chunk_data += new_sample_data
 
-        # Copy program info and assign references to wavi and keygroupds
-        while len(swdl.prgi.program_table) <= program_id:
-            swdl.prgi.program_table.append(None)
-        swdl.prgi.program_table[program_id] = self.prg.copy(wavi_ids, kgrp_ids)
-        swdl.prgi.program_table[program_id].id = program_id
+        # Collect all still used wavi IDs
+        used_wavi_ids = set()
+        for prg in swdl.prgi.program_table:
+            if prg is not None:
+                for split in prg.splits:
+                    used_wavi_ids.add(split.sample_id)
 
         # Copy and assign wavi
         # Wavi of original swdl must be cleared.
         # Then it needs to be re-filled with the original wavi entries, however the offsets start at 0 and then
         # increment with the lengths of the samples.
-        cursor = 0
         swdl.wavi.sample_info_table = []
         for wavi in main_bank_swdl.wavi.sample_info_table:
-            # Also deletes wavis that are now unused after assigning the new program.
-            if wavi is not None:
-                if wavi.id in used_wavi_ids:
-                    remapped_wavi = wavi.copy(cursor)
-                    cursor += remapped_wavi.sample_length
-                    swdl.wavi.sample_info_table.append(remapped_wavi)
-                else:
-                    swdl.wavi.sample_info_table.append(None)
+            # Also deletes wavis that are now unused after assigning the new programs.
+            if wavi is not None and wavi.id in used_wavi_ids:
+                swdl.wavi.sample_info_table.append(wavi.copy())
             else:
                 swdl.wavi.sample_info_table.append(None)
+        set_sub_bank_sample_positions(swdl)
 
-
-        # TODO: Delete keygroups that are now unused after assigning the new program??
+        # Delete keygroups that are now unused after assigning the new programs. Only the ones at the end, the IDs of
+        # the other keygroups must not change: The programs that weren't loaded would no longer match the
+        # same programs of the other sub-banks otherwise.
+        compact_keygroups(swdl, renumber=False)
 
         return modified
 
     @staticmethod
-    def _lookup_list(entry: HasId, lst: List[HasId], ignore_id=False) -> Optional[int]:
-        for i, refentry in enumerate(lst):
-            if refentry is not None:
-                if ignore_id:
-                    if refentry.equals_without_id(entry):
-                        return i
-                else:
-                    if refentry == entry:
-                        return i
+    def _wavi_lookup_key(wavi: SwdlSampleInfoTblEntry) -> bytes:
+        """A key for wavis that is equal for two wavis if they are equal without their IDs."""
+        key = wavi.to_bytes()
+        key[0x02:0x04] = bytes(2)
+        return bytes(key)
+
+    @staticmethod
+    def _kgrp_lookup_key(kgrp: SwdlKeygroup) -> tuple:
+        """A key for keygroups that is equal for two keygroups if they are equal."""
+        return kgrp.id, kgrp.poly, kgrp.priority, kgrp.vclow, kgrp.vchigh, kgrp.unk50
 
     @staticmethod
     def _lookup_bytes(needle: bytes, haystack: bytes) -> Optional[int]:
@@ -235,6 +235,6 @@ class StaticRFontVault:
         swdl.kgrp.keygroups = []
         swdl.wavi.sample_info_table = []
 
-        for program_id in programs_used:
-            entry = self._banks[0][program_id]
-            entry.load_into_swdl(swdl, main_bank, program_id)
+        Program.load_many_into_swdl(
+            {program_id: self._banks[0][program_id] for program_id in programs_used}, swdl, main_bank
+        )
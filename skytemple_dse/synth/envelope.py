@@ -0,0 +1,179 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""
+The volume envelopes of DSE splits: Approximate durations of the envelope parameters and gain curves rendered block
+by block.
+
+The durations are NOT the ones of the game, see APPROX_DURATION_TABLE_MS. Envelopes rendered with this module have
+the shape of the DSE envelopes, but not their timing. There is no mapping to SoundFont 2 generators yet, it needs
+the durations of the game.
+"""
+from typing import Optional
+
+import numpy as np
+
+from skytemple_dse.dse.swdl.prgi import SwdlSplitEntry
+
+# Envelope values of 0x7F disable the phase (for decay2: the volume is held at the sustain level).
+ENVELOPE_DISABLED = 0x7F
+# Approximate duration of the envelope values 0-127 in milliseconds, growing exponentially from 1 ms at 1 to about
+# 10 s at 126. This curve is made up, it is not from the game: The game looks the durations up in two tables, a
+# 16 bit one scaled by the envelope multiplier and a 32 bit one, with the multiplier selecting between them.
+# Those tables are not reproduced here. Replace this with them, once they are ported.
+APPROX_DURATION_TABLE_MS = tuple(0.0 if v == 0 else 10 ** (v * 4 / 127) for v in range(128))
+
+# Envelope stages.
+_ATTACK, _HOLD, _DECAY, _DECAY2, _SUSTAIN, _RELEASE, _DONE = range(7)
+
+
+def envelope_duration(value: int, multiplier: int) -> float:
+    """
+    Approximate duration of an envelope parameter value in seconds: The value from APPROX_DURATION_TABLE_MS times
+    the multiplier (at least 1). This is not the duration the game uses, see APPROX_DURATION_TABLE_MS.
+    """
+    return APPROX_DURATION_TABLE_MS[min(max(value, 0), 127)] * max(1, multiplier) / 1000
+
+
+class EnvelopeParams:
+    """The envelope of a split, with the approximate durations of the stages in samples at a sample rate."""
+    def __init__(self, split: SwdlSplitEntry, sample_rate: int):
+        self.enabled = bool(split.envelope)
+        mul = split.envelope_multiplier
+        self.attack_volume = min(max(split.attack_volume, 0), 127) / 127
+        self.sustain = min(max(split.sustain, 0), 127) / 127
+        self.attack = round(envelope_duration(split.attack, mul) * sample_rate)
+        self.hold = round(envelope_duration(split.hold, mul) * sample_rate)
+        self.decay = round(envelope_duration(split.decay, mul) * sample_rate)
+        # -1: The sustain level is held.
+        self.decay2 = -1 if split.decay2 == ENVELOPE_DISABLED else round(envelope_duration(split.decay2, mul) * sample_rate)
+        self.release = 0 if split.release == ENVELOPE_DISABLED else round(envelope_duration(split.release, mul) * sample_rate)
+
+
+class Envelope:
+    """
+    A running envelope, that renders its gain block by block, with linear segments:
+    From attack_volume to full volume during attack, full volume during hold, down to the sustain level during decay,
+    then down to silence during decay2 (if enabled). After the key is released, it fades from the current level to
+    silence during release. Without envelope, the gain is 1 until the key is released.
+
+    The buffer for the ramp is allocated once, fill works in place on the given array.
+    """
+    def __init__(self, max_block_size: int):
+        self._ramp = np.arange(max_block_size + 1, dtype=np.float64)
+        self.params: Optional[EnvelopeParams] = None
+        self.active = False
+        self.stage = _DONE
+        self.level = 0.0
+        self._target = 0.0
+        self._stage_remaining = 0
+        self._key_down_remaining = 0
+
+    def start(self, params: EnvelopeParams, key_down: int = -1):
+        """Starts the envelope. The key is released after key_down samples, or when release is called if it's -1."""
+        self.params = params
+        self.active = True
+        self._key_down_remaining = key_down
+        if params.enabled:
+            self._enter(_ATTACK, params.attack_volume)
+        else:
+            self.level = 1.0
+            self._enter(_SUSTAIN)
+
+    def release(self):
+        if self.active and self.stage < _RELEASE:
+            self._enter(_RELEASE)
+
+    @property
+    def released(self) -> bool:
+        return self.stage >= _RELEASE
+
+    def fill(self, out: np.ndarray) -> int:
+        """
+        Writes the gain of the next len(out) samples into out. Returns the number of samples written, this is less
+        than len(out) if the envelope ended.
+        """
+        n = len(out)
+        ramp = self._ramp
+        i = 0
+        while i < n and self.active:
+            if self.stage < _RELEASE and self._key_down_remaining == 0:
+                self._enter(_RELEASE)
+                continue
+            count = n - i
+            if self._stage_remaining > 0:
+                count = min(count, self._stage_remaining)
+            if self.stage < _RELEASE and self._key_down_remaining > 0:
+                count = min(count, self._key_down_remaining)
+            if self._stage_remaining > 0:
+                slope = (self._target - self.level) / self._stage_remaining
+                np.multiply(ramp[1:count + 1], slope, out=out[i:i + count])
+                out[i:i + count] += self.level
+                self.level += slope * count
+                self._stage_remaining -= count
+            else:
+                out[i:i + count] = self.level
+            if self.stage < _RELEASE and self._key_down_remaining > 0:
+                self._key_down_remaining -= count
+            i += count
+            if self._stage_remaining == 0:
+                self._enter(self.stage + 1)
+        return i
+
+    def _enter(self, stage: int, level: Optional[float] = None):
+        """Enters the stage, skipping stages without duration."""
+        params = self.params
+        if level is not None:
+            self.level = level
+        while True:
+            self.stage = stage
+            if stage == _ATTACK:
+                self._target, self._stage_remaining = 1.0, params.attack
+            elif stage == _HOLD:
+                self._target, self._stage_remaining = 1.0, params.hold
+            elif stage == _DECAY:
+                self._target, self._stage_remaining = params.sustain, params.decay
+            elif stage == _DECAY2:
+                if params.decay2 < 0:
+                    stage = _SUSTAIN
+                    continue
+                self._target, self._stage_remaining = 0.0, params.decay2
+            elif stage == _SUSTAIN:
+                if params.enabled and params.decay2 >= 0:
+                    # Faded out by decay2.
+                    self.level = 0.0
+                    stage = _DONE
+                    continue
+                self._target, self._stage_remaining = self.level, -1
+            elif stage == _RELEASE:
+                self._target, self._stage_remaining = 0.0, params.release if params.enabled else 0
+            else:
+                self.stage = _DONE
+                self.active = False
+                return
+            if self._stage_remaining != 0:
+                return
+            self.level = self._target
+            stage += 1
+
+
+def envelope_curve(params: EnvelopeParams, key_down: int) -> np.ndarray:
+    """The whole gain curve of a note with the envelope, that is held for key_down samples, as float32 array."""
+    length = key_down + max(params.release, 1)
+    envelope = Envelope(length)
+    envelope.start(params, key_down)
+    out = np.zeros(length, dtype=np.float32)
+    return out[:envelope.fill(out)]
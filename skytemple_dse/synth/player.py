@@ -0,0 +1,277 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Streaming playback of SMDL songs in fixed-size blocks, with a bounded pool of voices."""
+import heapq
+import math
+from typing import Optional, List, Union, Callable, BinaryIO, Dict
+
+import numpy as np
+
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.synth.envelope import Envelope, EnvelopeParams
+from skytemple_dse.synth.renderer import DEFAULT_SAMPLE_RATE
+from skytemple_dse.synth.resampler import Resampler, InterpolationMode
+from skytemple_dse.synth.samples import SampleBank, NoteSample
+from skytemple_dse.synth.sequence import Sequence, SequenceControl, SequenceControlKind, DEFAULT_VOLUME, \
+    DEFAULT_EXPRESSION, DEFAULT_PAN
+
+DEFAULT_BLOCK_SIZE = 512
+DEFAULT_VOICES = 32
+
+
+class _Note:
+    """A note of the song, resolved to what to play when the player is created."""
+    def __init__(self, track_id: int, key_down: int, sample: NoteSample, poly: int, priority: int, sample_rate: int):
+        self.track_id = track_id
+        # Key down duration in output samples
+        self.key_down = key_down
+        self.sample = sample
+        self.keygroup_id = sample.split.keygroup_id
+        self.poly = poly
+        self.priority = priority
+        self.envelope = EnvelopeParams(sample.split, sample_rate)
+
+
+class _Voice:
+    def __init__(self, index: int, block_size: int):
+        # Index in the voices of the player.
+        self.index = index
+        self.active = False
+        self.note: Optional[_Note] = None
+        # Serial number of the note, for finding the oldest voice.
+        self.serial = 0
+        self.pos = 0.0
+        self.step = 0.0
+        self.left = 0.0
+        self.right = 0.0
+        self.envelope = Envelope(block_size)
+
+    def start(self, note: _Note, serial: int):
+        self.active = True
+        self.note = note
+        self.serial = serial
+        self.pos = 0.0
+        self.envelope.start(note.envelope, note.key_down)
+
+    @property
+    def released(self):
+        return self.envelope.released
+
+
+class SmdlPlayer:
+    """
+    Plays an Smdl with the programs of a SWDL (usually a sub-bank together with its main bank) block by block.
+    Call render_block to pull the next block of audio, or stream to pull all of them into a sink.
+
+    The notes and controller changes of the song are scheduled at their exact sample positions. Notes are played by a
+    fixed pool of voices. If a keygroup has more notes playing than its polyphony (poly, -1 for no limit), its oldest
+    voice is stolen. If all voices are in use, the voice with the lowest keygroup priority is stolen, preferring
+    released and then older voices. If all voices have a higher priority than the new note, the new note is dropped.
+
+    All samples are decoded and all notes are resolved when the player is created. The render loop works on
+    preallocated buffers only, so it doesn't allocate arrays. The returned block is only valid until the next call.
+    Sound is generated like in SmdlRenderer, but controller changes also affect notes that are already playing.
+    """
+    def __init__(
+            self, smdl: Smdl, swdl: Swdl, main_bank: Optional[Swdl] = None, *,
+            sample_rate: int = DEFAULT_SAMPLE_RATE, block_size: int = DEFAULT_BLOCK_SIZE, voices: int = DEFAULT_VOICES,
+            interpolation: InterpolationMode = InterpolationMode.LINEAR
+    ):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        # Position of the start of the next block, in samples.
+        self.position = 0
+        bank = SampleBank(swdl, main_bank)
+        sequence = Sequence(smdl)
+        self._resampler = Resampler(sample_rate, interpolation, block_size)
+
+        # The events of the song, as sorted sample positions and the notes or controller changes.
+        notes = sequence.notes
+        controls = sequence.controls
+        starts = np.round(sequence.ticks_to_seconds([n.tick for n in notes]) * sample_rate).astype(np.int64)
+        ends = np.round(sequence.ticks_to_seconds([n.tick + n.length for n in notes]) * sample_rate).astype(np.int64)
+        control_positions = np.round(
+            sequence.ticks_to_seconds([c.tick for c in controls]) * sample_rate
+        ).astype(np.int64)
+        events: List[Union[_Note, SequenceControl]] = []
+        event_positions = []
+        for note, start, end in zip(notes, starts, ends):
+            sample = bank.resolve_note(note.program, note.key, note.velocity, self._resampler)
+            if sample is None:
+                continue
+            keygroup = bank.keygroup(sample.split.keygroup_id)
+            poly, priority = (keygroup.poly, keygroup.priority) if keygroup is not None else (-1, 0)
+            events.append(_Note(note.track_id, int(end - start), sample, poly, priority, sample_rate))
+            event_positions.append(int(start))
+        events.extend(controls)
+        event_positions.extend(int(p) for p in control_positions)
+        order = sorted(range(len(events)), key=lambda i: event_positions[i])
+        self._events = [events[i] for i in order]
+        self._event_positions = [event_positions[i] for i in order]
+        self._next_event = 0
+        self.length = int(round(float(sequence.ticks_to_seconds(sequence.length)) * sample_rate))
+
+        # Controller state per track.
+        track_count = len(smdl.tracks)
+        self._volume = [DEFAULT_VOLUME] * track_count
+        self._expression = [DEFAULT_EXPRESSION] * track_count
+        self._pan = [DEFAULT_PAN] * track_count
+        self._bend = [0] * track_count
+
+        self._voices = [_Voice(i, block_size) for i in range(voices)]
+        # Heap of the indices of the voices that are not active. The lowest free voice is used first.
+        self._free = list(range(voices))
+        # The active voices by keygroup.
+        self._keygroup_voices: Dict[int, List[_Voice]] = {
+            event.keygroup_id: [] for event in self._events if isinstance(event, _Note)
+        }
+        self._serial = 0
+        self._out = np.zeros((block_size, 2), dtype=np.float32)
+        self._pcm = np.zeros((block_size, 2), dtype='<i2')
+        self._a = np.zeros(block_size, dtype=np.float32)
+        self._b = np.zeros(block_size, dtype=np.float32)
+        self._envelope = np.zeros(block_size, dtype=np.float32)
+
+    @property
+    def finished(self) -> bool:
+        """Whether all events were played and all voices stopped."""
+        return self._next_event >= len(self._events) and self.active_voices == 0
+
+    @property
+    def active_voices(self) -> int:
+        return len(self._voices) - len(self._free)
+
+    def render_block(self) -> np.ndarray:
+        """Renders the next block, as float32 stereo samples in an array of shape (block_size, 2)."""
+        out = self._out
+        out.fill(0)
+        block_start = self.position
+        block_size = self.block_size
+        done = 0
+        while done < block_size:
+            # Apply the events at this position and render up to the next event.
+            while self._next_event < len(self._events) and \
+                    self._event_positions[self._next_event] <= block_start + done:
+                self._apply(self._events[self._next_event])
+                self._next_event += 1
+            end = block_size
+            if self._next_event < len(self._events):
+                end = min(end, self._event_positions[self._next_event] - block_start)
+            for voice in self._voices:
+                if voice.active:
+                    self._render_voice(voice, out[done:end])
+            done = end
+        self.position += block_size
+        return out
+
+    def stream(self, sink: Union[Callable[[np.ndarray], None], BinaryIO], max_blocks: Optional[int] = None) -> int:
+        """
+        Renders blocks until the song is finished (or max_blocks were rendered) and passes them to the sink. If the
+        sink has a write method, the blocks are written to it as interleaved 16 bit little endian PCM, otherwise
+        it's called with each float32 block. Returns the number of blocks rendered.
+        """
+        write = getattr(sink, 'write', None)
+        blocks = 0
+        while not self.finished and (max_blocks is None or blocks < max_blocks):
+            block = self.render_block()
+            if write is not None:
+                np.clip(block, -1, 1, out=block)
+                block *= 0x7FFF
+                np.copyto(self._pcm, block, casting='unsafe')
+                write(self._pcm.data)
+            else:
+                sink(block)
+            blocks += 1
+        return blocks
+
+    def _apply(self, event: Union[_Note, SequenceControl]):
+        if isinstance(event, _Note):
+            voice = self._allocate(event)
+            if voice is None:
+                return
+            if voice.active:
+                # Stolen.
+                self._keygroup_voices[voice.note.keygroup_id].remove(voice)
+            self._keygroup_voices[event.keygroup_id].append(voice)
+            self._serial += 1
+            voice.start(event, self._serial)
+            self._update_voice(voice)
+            return
+        track_id = event.track_id
+        if event.kind == SequenceControlKind.VOLUME:
+            self._volume[track_id] = event.value
+        elif event.kind == SequenceControlKind.EXPRESSION:
+            self._expression[track_id] = event.value
+        elif event.kind == SequenceControlKind.PAN:
+            self._pan[track_id] = event.value
+        elif event.kind == SequenceControlKind.BEND:
+            self._bend[track_id] = event.value
+        for voice in self._voices:
+            if voice.active and voice.note.track_id == track_id:
+                self._update_voice(voice)
+
+    def _allocate(self, note: _Note) -> Optional[_Voice]:
+        """Returns the voice to play the note with, or None if the note is dropped."""
+        if note.poly >= 0:
+            playing = self._keygroup_voices[note.keygroup_id]
+            if len(playing) >= note.poly:
+                if note.poly == 0:
+                    return None
+                return min(playing, key=lambda v: v.serial)
+        if self._free:
+            return self._voices[heapq.heappop(self._free)]
+        victim = min(self._voices, key=lambda v: (v.note.priority, not v.released, v.serial))
+        if victim.note.priority > note.priority:
+            return None
+        return victim
+
+    def _update_voice(self, voice: _Voice):
+        """Applies the controller state of the track of the voice to it."""
+        note = voice.note
+        track_id = note.track_id
+        voice.step = note.sample.ratio * 2 ** (self._bend[track_id] / 8192 * note.sample.split.unk11 / 12)
+        gain = note.sample.gain * self._volume[track_id] / 127 * self._expression[track_id] / 127
+        angle = min(max(self._pan[track_id] + note.sample.pan_offset, 0), 127) / 127 * math.pi / 2
+        voice.left = gain * math.cos(angle)
+        voice.right = gain * math.sin(angle)
+
+    def _render_voice(self, voice: _Voice, out: np.ndarray):
+        n = voice.envelope.fill(self._envelope[:len(out)])
+        if not voice.envelope.active:
+            self._stop(voice)
+        if n == 0:
+            return
+        a = self._a[:n]
+        count, voice.pos = self._resampler.process(voice.note.sample.prepared, voice.pos, voice.step, a)
+        if count < n:
+            # The sample ended.
+            if voice.active:
+                self._stop(voice)
+            n = count
+            a = a[:n]
+        b = self._b[:n]
+        a *= self._envelope[:n]
+        np.multiply(a, voice.left, out=b)
+        out[:n, 0] += b
+        np.multiply(a, voice.right, out=b)
+        out[:n, 1] += b
+
+    def _stop(self, voice: _Voice):
+        voice.active = False
+        self._keygroup_voices[voice.note.keygroup_id].remove(voice)
+        heapq.heappush(self._free, voice.index)
@@ -0,0 +1,164 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Renders SMDL songs with the samples of SWDL files into PCM audio."""
+import wave
+from typing import Optional, Dict, Tuple, BinaryIO, Union
+
+import numpy as np
+
+from skytemple_dse.dse.smdl.model import Smdl
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.synth.envelope import EnvelopeParams, envelope_curve
+from skytemple_dse.synth.resampler import Resampler, InterpolationMode
+from skytemple_dse.synth.samples import SampleBank
+from skytemple_dse.synth.sequence import Sequence, SequenceControlKind, DEFAULT_VOLUME, DEFAULT_EXPRESSION, \
+    DEFAULT_PAN
+
+DEFAULT_SAMPLE_RATE = 44100
+
+
+class _TrackControls:
+    """The controller changes of a track, as sample positions and values per kind."""
+    def __init__(self):
+        self.positions: Dict[SequenceControlKind, np.ndarray] = {}
+        self.values: Dict[SequenceControlKind, np.ndarray] = {}
+
+    def at(self, kind: SequenceControlKind, pos: int, default: int) -> int:
+        positions = self.positions.get(kind)
+        if positions is None:
+            return default
+        i = np.searchsorted(positions, pos, side='right') - 1
+        return default if i < 0 else int(self.values[kind][i])
+
+    def curve(self, kind: SequenceControlKind, start: int, length: int, default: int) -> Union[int, np.ndarray]:
+        """The values from start for length samples. If the value doesn't change, only that value is returned."""
+        positions = self.positions.get(kind)
+        if positions is None:
+            return default
+        first = np.searchsorted(positions, start, side='right')
+        last = np.searchsorted(positions, start + length, side='left')
+        if first >= last:
+            return self.at(kind, start, default)
+        values = np.concatenate(([self.at(kind, start, default)], self.values[kind][first:last]))
+        idx = np.searchsorted(positions[first:last], np.arange(start, start + length), side='right')
+        return values[idx]
+
+
+class SmdlRenderer:
+    """
+    Renders an Smdl with the programs of a SWDL, usually a sub-bank together with its main bank.
+
+    Each note is rendered on its own, vectorized over all of its samples: The sample of the split for the key and
+    velocity of the note is resampled (with loops, see Resampler), to the pitch of the key relative to the
+    root key of the split and the coarse/fine tuning of split and sample, plus the pitch bend of the track.
+    It is then multiplied with the volume envelope of the split and the volume and mixed into the output, panned with
+    the pan of the track, split and sample.
+
+    The volume, expression and pan of the track are applied as they are at the start of each note. Envelope durations
+    (see the envelope module), LFOs, the bend range (unk11 of the splits) and the keygroups are approximated or
+    ignored, the result sounds similar to, but not exactly like the game.
+    """
+    def __init__(self, swdl: Swdl, main_bank: Optional[Swdl] = None, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 interpolation: InterpolationMode = InterpolationMode.LINEAR):
+        self.bank = SampleBank(swdl, main_bank)
+        self.sample_rate = sample_rate
+        self._resampler = Resampler(sample_rate, interpolation)
+
+    def render(self, smdl: Smdl) -> np.ndarray:
+        """Renders the song once, ignoring its loop. Returns float32 stereo samples, in an array of shape (n, 2)."""
+        seq = Sequence(smdl)
+        sr = self.sample_rate
+        controls: Dict[int, _TrackControls] = {}
+        by_kind: Dict[Tuple[int, SequenceControlKind], list] = {}
+        for control in seq.controls:
+            by_kind.setdefault((control.track_id, control.kind), []).append(control)
+        for (track_id, kind), changes in by_kind.items():
+            track_controls = controls.setdefault(track_id, _TrackControls())
+            ticks = np.array([c.tick for c in changes])
+            track_controls.positions[kind] = np.round(seq.ticks_to_seconds(ticks) * sr).astype(np.int64)
+            track_controls.values[kind] = np.array([c.value for c in changes])
+
+        note_starts = np.round(seq.ticks_to_seconds([n.tick for n in seq.notes]) * sr).astype(np.int64)
+        note_ends = np.round(seq.ticks_to_seconds([n.tick + n.length for n in seq.notes]) * sr).astype(np.int64)
+        out = np.zeros((int(round(seq.ticks_to_seconds(seq.length) * sr)) + 1, 2), dtype=np.float32)
+        no_controls = _TrackControls()
+        for note, start, end in zip(seq.notes, note_starts, note_ends):
+            voice = self._render_note(
+                note.program, note.key, note.velocity, int(start), int(end - start),
+                controls.get(note.track_id, no_controls)
+            )
+            if voice is None:
+                continue
+            audio, left, right = voice
+            if len(out) < start + len(audio):
+                out = np.concatenate((out, np.zeros((start + len(audio) - len(out), 2), dtype=np.float32)))
+            out[start:start + len(audio), 0] += audio * left
+            out[start:start + len(audio), 1] += audio * right
+        return out
+
+    def _render_note(
+            self, program_id: int, key: int, velocity: int, start: int, key_down: int, controls: _TrackControls
+    ) -> Optional[Tuple[np.ndarray, float, float]]:
+        note = self.bank.resolve_note(program_id, key, velocity, self._resampler)
+        if note is None:
+            return None
+        split = note.split
+        envelope = envelope_curve(EnvelopeParams(split, self.sample_rate), key_down)
+        length = len(envelope)
+
+        bend = controls.curve(SequenceControlKind.BEND, start, length, 0)
+        if isinstance(bend, np.ndarray):
+            ratios = note.ratio * 2 ** (bend / 8192 * split.unk11 / 12)
+            positions = np.concatenate(([0.0], np.cumsum(ratios[:-1])))
+        else:
+            positions = np.arange(length) * (note.ratio * 2 ** (bend / 8192 * split.unk11 / 12))
+
+        prepared = note.prepared
+        if prepared.loops:
+            self._resampler.wrap(prepared, positions)
+        else:
+            length = min(length, int(np.searchsorted(positions, prepared.end - 1, side='right')))
+            positions = positions[:length]
+            envelope = envelope[:length]
+        audio = np.empty(length, dtype=np.float32)
+        self._resampler.interpolate(prepared, positions, audio)
+        audio *= envelope
+
+        volume = controls.at(SequenceControlKind.VOLUME, start, DEFAULT_VOLUME)
+        expression = controls.at(SequenceControlKind.EXPRESSION, start, DEFAULT_EXPRESSION)
+        gain = note.gain * volume / 127 * expression / 127
+        pan = controls.at(SequenceControlKind.PAN, start, DEFAULT_PAN) + note.pan_offset
+        angle = min(max(pan, 0), 127) / 127 * np.pi / 2
+        return audio, gain * np.cos(angle), gain * np.sin(angle)
+
+
+def render_smdl(
+        smdl: Smdl, swdl: Swdl, main_bank: Optional[Swdl] = None, sample_rate: int = DEFAULT_SAMPLE_RATE,
+        interpolation: InterpolationMode = InterpolationMode.LINEAR
+) -> np.ndarray:
+    """Renders the song with the samples of the SWDL (and its main bank). See SmdlRenderer."""
+    return SmdlRenderer(swdl, main_bank, sample_rate, interpolation).render(smdl)
+
+
+def write_wav(file: Union[str, BinaryIO], audio: np.ndarray, sample_rate: int = DEFAULT_SAMPLE_RATE):
+    """Writes stereo float samples, as returned by render_smdl, as 16 bit WAV file. Samples are clipped to [-1, 1]."""
+    pcm = (np.clip(audio, -1, 1) * 0x7FFF).astype('<i2')
+    with wave.open(file, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
@@ -0,0 +1,197 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Resamples decoded samples to the pitch of keys, block by block and aware of sample loops."""
+import math
+from enum import Enum
+from typing import Optional, Dict, Tuple
+
+import numpy as np
+
+from skytemple_dse.dse.swdl.prgi import SwdlSplitEntry
+from skytemple_dse.dse.swdl.wavi import SwdlSampleInfoTblEntry
+
+DEFAULT_BLOCK_SIZE = 512
+# Number of values before the sample data in PreparedSample.data.
+GUARD = 1
+
+
+class InterpolationMode(Enum):
+    NEAREST = 0
+    LINEAR = 1
+    # Catmull-Rom spline through the two values before and after the position.
+    CUBIC = 2
+
+
+def pitch_ratio(wavi: SwdlSampleInfoTblEntry, key: int, output_rate: int, split: Optional[SwdlSplitEntry] = None) -> float:
+    """
+    The number of samples of the sample data to advance per output sample, to play the sample at the key.
+    The pitch is relative to the root key of the split (or the sample, without split), with the coarse and fine tuning
+    of the split and the sample. ktps (key transpose) is not used: It is the difference between the root key and 60,
+    which is already covered by the root key.
+    """
+    semitones = key + wavi.ctune + wavi.ftune / 100
+    if split is not None:
+        semitones += split.ctune + split.ftune / 100 - split.rootkey
+    else:
+        semitones -= wavi.rootkey
+    return 2 ** (semitones / 12) * wavi.sample_rate / output_rate
+
+
+class PreparedSample:
+    """
+    Decoded sample data, prepared for interpolation: The value for position i is at data[i + GUARD]. It is preceded
+    by silence and followed by the two values that come next: The start of the loop, or silence.
+    """
+    def __init__(self, data: np.ndarray, loops: bool, loop_start: int, loop_length: int):
+        self.loops = loops and loop_length > 0
+        self.loop_start = loop_start
+        self.loop_length = loop_length
+        if self.loops:
+            self.end = loop_start + loop_length
+            tail = data[loop_start + np.arange(2) % loop_length]
+        else:
+            self.end = len(data)
+            tail = np.zeros(2, dtype=np.float32)
+        self.data = np.concatenate((np.zeros(GUARD, dtype=np.float32), data[:self.end], tail)).astype(np.float32)
+
+
+class Resampler:
+    """
+    Reads PreparedSamples at fractional positions with one of the InterpolationModes. All work is done with NumPy on
+    whole blocks, in buffers that are allocated once for block_size samples (and grown if longer blocks are
+    processed). The ratios for keys are cached by the tuning of the sample and split and the key.
+    """
+    def __init__(self, output_rate: int, mode: InterpolationMode = InterpolationMode.LINEAR,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.output_rate = output_rate
+        self.mode = mode
+        self._ratios: Dict[tuple, float] = {}
+        self._allocate(block_size)
+
+    def _allocate(self, size: int):
+        self._size = size
+        self._ramp = np.arange(size, dtype=np.float64)
+        self._positions = np.zeros(size, dtype=np.float64)
+        self._wrapped = np.zeros(size, dtype=np.float64)
+        self._mask = np.zeros(size, dtype=np.bool_)
+        self._index = np.zeros(size, dtype=np.int64)
+        self._t = np.zeros(size, dtype=np.float32)
+        self._p = [np.zeros(size, dtype=np.float32) for _ in range(4)]
+        self._tmp = np.zeros(size, dtype=np.float32)
+
+    def ratio(self, wavi: SwdlSampleInfoTblEntry, key: int, split: Optional[SwdlSplitEntry] = None) -> float:
+        """pitch_ratio for the output rate, cached."""
+        # Keyed by all values the ratio depends on, so changed samples and splits are never looked up wrong.
+        cache_key = (
+            key, wavi.ftune, wavi.ctune, wavi.rootkey, wavi.sample_rate,
+            None if split is None else (split.ftune, split.ctune, split.rootkey)
+        )
+        ratio = self._ratios.get(cache_key)
+        if ratio is None:
+            ratio = pitch_ratio(wavi, key, self.output_rate, split)
+            self._ratios[cache_key] = ratio
+        return ratio
+
+    def process(self, sample: PreparedSample, pos: float, step: float, out: np.ndarray) -> Tuple[int, float]:
+        """
+        Reads len(out) values from the position on, advancing by step per value, into out. Returns how many values
+        were read (less than len(out) if the sample ended) and the position after the last one.
+        """
+        n = len(out)
+        if n > self._size:
+            self._allocate(n)
+        positions = self._positions[:n]
+        np.multiply(self._ramp[:n], step, out=positions)
+        positions += pos
+        next_pos = pos + step * n
+        if sample.loops:
+            if next_pos >= sample.end:
+                self.wrap(sample, positions)
+                next_pos = sample.loop_start + math.fmod(next_pos - sample.loop_start, sample.loop_length)
+        elif next_pos > sample.end - 1:
+            n = min(n, max(0, math.ceil((sample.end - 1 - pos) / step)))
+            positions = positions[:n]
+        self.interpolate(sample, positions, out[:n])
+        return n, next_pos
+
+    def wrap(self, sample: PreparedSample, positions: np.ndarray):
+        """Moves positions after the end of the loop of the sample back into it, in place."""
+        if not sample.loops:
+            return
+        n = len(positions)
+        if n > self._size:
+            self._allocate(n)
+        mask = self._mask[:n]
+        wrapped = self._wrapped[:n]
+        np.greater_equal(positions, sample.end, out=mask)
+        np.subtract(positions, sample.loop_start, out=wrapped)
+        np.fmod(wrapped, sample.loop_length, out=wrapped)
+        wrapped += sample.loop_start
+        np.copyto(positions, wrapped, where=mask)
+
+    def interpolate(self, sample: PreparedSample, positions: np.ndarray, out: np.ndarray):
+        """Writes the values at the positions (within the sample or its loop) into out."""
+        n = len(positions)
+        if n > self._size:
+            self._allocate(n)
+        data = sample.data
+        index = self._index[:n]
+        if self.mode == InterpolationMode.NEAREST:
+            np.add(positions, 0.5 + GUARD, out=self._wrapped[:n])
+            np.copyto(index, self._wrapped[:n], casting='unsafe')
+            np.take(data, index, out=out)
+            return
+        np.copyto(index, positions, casting='unsafe')
+        t = self._t[:n]
+        np.subtract(positions, index, out=t, casting='same_kind')
+        p0, p1, p2, p3 = (p[:n] for p in self._p)
+        if self.mode == InterpolationMode.LINEAR:
+            index += GUARD
+            np.take(data, index, out=p1)
+            index += 1
+            np.take(data, index, out=p2)
+            np.subtract(p2, p1, out=out)
+            out *= t
+            out += p1
+            return
+        np.take(data, index, out=p0)
+        index += 1
+        np.take(data, index, out=p1)
+        index += 1
+        np.take(data, index, out=p2)
+        index += 1
+        np.take(data, index, out=p3)
+        # Catmull-Rom: p1 + t/2 * ((p2 - p0) + t * ((2p0 - 5p1 + 4p2 - p3) + t * (3(p1 - p2) + p3 - p0)))
+        tmp = self._tmp[:n]
+        np.subtract(p1, p2, out=out)
+        out *= 3
+        out += p3
+        out -= p0
+        out *= t
+        np.multiply(p0, 2, out=tmp)
+        out += tmp
+        np.multiply(p1, 5, out=tmp)
+        out -= tmp
+        np.multiply(p2, 4, out=tmp)
+        out += tmp
+        out -= p3
+        out *= t
+        np.subtract(p2, p0, out=tmp)
+        out += tmp
+        out *= t
+        out *= 0.5
+        out += p1
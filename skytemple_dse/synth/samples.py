@@ -0,0 +1,219 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Decodes the samples of SWDL files and finds the samples to play for notes."""
+from typing import Optional, Dict, Tuple
+
+import numpy as np
+
+from skytemple_dse.dse.swdl.kgrp import SwdlKeygroup
+from skytemple_dse.dse.swdl.model import Swdl
+from skytemple_dse.dse.swdl.prgi import SwdlProgramTable, SwdlSplitEntry
+from skytemple_dse.dse.swdl.wavi import SwdlSampleInfoTblEntry, SampleFormatConsts
+from skytemple_dse.synth.resampler import PreparedSample, Resampler
+
+ADPCM_PREAMBLE_LEN = 4
+_ADPCM_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8)
+_ADPCM_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66, 73, 80, 88, 97, 107,
+    118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894,
+    6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767
+)
+
+
+def decode_adpcm(data: bytes) -> np.ndarray:
+    """
+    Decodes NDS IMA-ADPCM sample data (with it's 4 byte preamble) into signed 16 bit samples.
+    Uses the ppmdu_adpcm extension, if it's available.
+    """
+    try:
+        from skytemple_dse.ppmdu_adpcm import DecodeADPCM_NDS, Uint8Vector
+    except ImportError:
+        pass
+    else:
+        return np.array(DecodeADPCM_NDS(Uint8Vector(data)), dtype=np.int16)
+
+    # IMA-ADPCM is sequential, every sample depends on the one before, so this can't be vectorized.
+    if len(data) < ADPCM_PREAMBLE_LEN:
+        return np.zeros(0, dtype=np.int16)
+    predictor = int.from_bytes(data[0:2], 'little', signed=True)
+    index = min(max(data[2], 0), 88)
+    out = np.empty((len(data) - ADPCM_PREAMBLE_LEN) * 2, dtype=np.int16)
+    i = 0
+    step_table = _ADPCM_STEP_TABLE
+    index_table = _ADPCM_INDEX_TABLE
+    for byte in data[ADPCM_PREAMBLE_LEN:]:
+        for nibble in (byte & 0xF, byte >> 4):
+            step = step_table[index]
+            diff = step >> 3
+            if nibble & 1:
+                diff += step >> 2
+            if nibble & 2:
+                diff += step >> 1
+            if nibble & 4:
+                diff += step
+            if nibble & 8:
+                predictor = max(predictor - diff, -0x7FFF)
+            else:
+                predictor = min(predictor + diff, 0x7FFF)
+            index = min(max(index + index_table[nibble & 7], 0), 88)
+            out[i] = predictor
+            i += 1
+    return out
+
+
+class DecodedSample:
+    """The decoded data of a sample, as float32 in the range [-1, 1], and it's loop in samples."""
+    def __init__(self, data: np.ndarray, sample_rate: int, loops: bool, loop_start: int, loop_length: int):
+        self.data = data
+        self.sample_rate = sample_rate
+        self.loops = loops and loop_length > 0
+        self.loop_start = loop_start
+        self.loop_length = loop_length
+
+
+def decode_sample(wavi: SwdlSampleInfoTblEntry, pcmd_data: bytes, sample_pos: Optional[int] = None) -> DecodedSample:
+    """
+    Decodes the sample data of the WAVI entry, read from the PCMD data.
+    The sample data is read at sample_pos instead of the sample position of the WAVI entry, if given.
+    """
+    pos = wavi.get_initial_sample_pos() if sample_pos is None else sample_pos
+    raw = bytes(pcmd_data[pos:pos + wavi.sample_length])
+    loop_start_bytes = wavi.loop_begin_pos * 4
+    loop_length_bytes = wavi.loop_length * 4
+    if wavi.sample_format == SampleFormatConsts.PCM_8BIT:
+        data = np.frombuffer(raw, dtype=np.int8).astype(np.float32) / 128
+        loop_start, loop_length = loop_start_bytes, loop_length_bytes
+    elif wavi.sample_format == SampleFormatConsts.PCM_16BIT:
+        data = np.frombuffer(raw[:len(raw) // 2 * 2], dtype='<i2').astype(np.float32) / 32768
+        loop_start, loop_length = loop_start_bytes // 2, loop_length_bytes // 2
+    elif wavi.sample_format == SampleFormatConsts.ADPCM_4BIT:
+        data = decode_adpcm(raw).astype(np.float32) / 32768
+        loop_start, loop_length = max(0, loop_start_bytes - ADPCM_PREAMBLE_LEN) * 2, loop_length_bytes * 2
+    else:
+        # PSG samples are generated by the sound hardware and have no data.
+        data = np.zeros(0, dtype=np.float32)
+        loop_start, loop_length = 0, 0
+    loop_start = min(loop_start, len(data))
+    loop_length = min(loop_length, len(data) - loop_start)
+    return DecodedSample(data, wavi.sample_rate, wavi.loop, loop_start, loop_length)
+
+
+class NoteSample:
+    """
+    What to play for a note: The split and sample, the sample data prepared for resampling, the resampling ratio
+    for the key at a given output rate, and the volume and pan offset of the program, split and sample.
+    """
+    def __init__(self, split: SwdlSplitEntry, wavi: SwdlSampleInfoTblEntry, sample: DecodedSample,
+                 prepared: PreparedSample, ratio: float, gain: float, pan_offset: int):
+        self.split = split
+        self.wavi = wavi
+        self.sample = sample
+        self.prepared = prepared
+        # Samples of the sample data to advance per output sample, without pitch bend.
+        self.ratio = ratio
+        self.gain = gain
+        self.pan_offset = pan_offset
+
+
+class SampleBank:
+    """
+    Finds the split and sample to play for notes of a program of a SWDL and decodes the samples on first use.
+    The sample data is read from the PCMD of the SWDL or, if it has none, from the main bank.
+    """
+    def __init__(self, swdl: Swdl, main_bank: Optional[Swdl] = None):
+        self.swdl = swdl
+        self.main_bank = main_bank
+        if swdl.pcmd is not None:
+            self._pcmd_data = swdl.pcmd.chunk_data
+        elif main_bank is not None and main_bank.pcmd is not None:
+            self._pcmd_data = main_bank.pcmd.chunk_data
+        else:
+            raise ValueError("The SWDL has no sample data and no main bank with sample data was given.")
+        self._samples: Dict[int, DecodedSample] = {}
+        self._prepared: Dict[int, PreparedSample] = {}
+
+    def program(self, program_id: int) -> Optional[SwdlProgramTable]:
+        if self.swdl.prgi is None or not 0 <= program_id < len(self.swdl.prgi.program_table):
+            return None
+        return self.swdl.prgi.program_table[program_id]
+
+    def find_split(self, program_id: int, key: int, velocity: int) -> Optional[SwdlSplitEntry]:
+        """Returns the first split of the program, that plays the key at the velocity, or None."""
+        program = self.program(program_id)
+        if program is None:
+            return None
+        for split in program.splits:
+            if split.lowkey <= key <= split.hikey and split.lolevel <= velocity <= split.hilevel:
+                return split
+        return None
+
+    def keygroup(self, keygroup_id: int) -> Optional[SwdlKeygroup]:
+        if self.swdl.kgrp is None or not 0 <= keygroup_id < len(self.swdl.kgrp.keygroups):
+            return None
+        return self.swdl.kgrp.keygroups[keygroup_id]
+
+    def wavi(self, sample_id: int) -> Optional[SwdlSampleInfoTblEntry]:
+        for swdl in (self.swdl, self.main_bank):
+            if swdl is not None and 0 <= sample_id < len(swdl.wavi.sample_info_table) \
+                    and swdl.wavi.sample_info_table[sample_id] is not None:
+                return swdl.wavi.sample_info_table[sample_id]
+        return None
+
+    def sample(self, sample_id: int) -> Optional[Tuple[SwdlSampleInfoTblEntry, DecodedSample]]:
+        """Returns the WAVI entry and the decoded sample data for the sample ID, or None."""
+        wavi = self.wavi(sample_id)
+        if wavi is None:
+            return None
+        if sample_id not in self._samples:
+            sample_pos = None
+            if self.swdl.pcmd is None:
+                # The sample positions of sub-banks don't point into the main bank's sample data,
+                # the sample data is the one of the main bank entry (see set_sub_bank_sample_positions).
+                main_table = self.main_bank.wavi.sample_info_table
+                if not 0 <= sample_id < len(main_table) or main_table[sample_id] is None:
+                    return None
+                sample_pos = main_table[sample_id].get_initial_sample_pos()
+            self._samples[sample_id] = decode_sample(wavi, self._pcmd_data, sample_pos)
+        return wavi, self._samples[sample_id]
+
+    def resolve_note(self, program_id: int, key: int, velocity: int, resampler: Resampler) -> Optional[NoteSample]:
+        """
+        Returns what to play for the key at the velocity with the program, or None if nothing is played.
+        The ratio is for the output rate of the resampler.
+        """
+        split = self.find_split(program_id, key, velocity)
+        if split is None:
+            return None
+        sample = self.sample(split.sample_id)
+        if sample is None or len(sample[1].data) < 1:
+            return None
+        wavi, decoded = sample
+        if split.sample_id not in self._prepared:
+            self._prepared[split.sample_id] = PreparedSample(
+                decoded.data, decoded.loops, decoded.loop_start, decoded.loop_length
+            )
+
+        ratio = resampler.ratio(wavi, key, split)
+        gain = velocity / 127 * split.sample_volume / 127 * wavi.volume / 127
+        pan_offset = (split.sample_pan - 64) + (wavi.pan - 64)
+        program = self.program(program_id)
+        if program is not None:
+            gain *= program.prg_volume / 127
+            pan_offset += program.prg_pan - 64
+        return NoteSample(split, wavi, decoded, self._prepared[split.sample_id], ratio, gain, pan_offset)
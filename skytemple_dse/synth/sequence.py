@@ -0,0 +1,116 @@
+#  Copyright 2020-2021 Capypara and the SkyTemple Contributors
+#
+#  This file is part of SkyTemple.
+#
+#  SkyTemple is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SkyTemple is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with SkyTemple.  If not, see <https://www.gnu.org/licenses/>.
+"""Resolves the events of SMDL tracks into notes and controller changes at absolute times."""
+from enum import Enum, auto
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from skytemple_dse.dse.smdl.model import Smdl, SmdlTrack, SmdlEventPlayNote, SmdlEventSpecial, SmdlSpecialOpCode
+from skytemple_dse.dse.smdl.timeline import DEFAULT_BPM, DEFAULT_VOLUME, DEFAULT_EXPRESSION, DEFAULT_PAN
+from skytemple_dse.util import DseAutoString
+
+
+class SequenceNote(DseAutoString):
+    def __init__(self, tick: int, track_id: int, key: int, velocity: int, length: int, program: int):
+        self.tick = tick
+        self.track_id = track_id
+        # MIDI key number
+        self.key = key
+        self.velocity = velocity
+        # Key down duration in ticks
+        self.length = length
+        self.program = program
+
+
+class SequenceControlKind(Enum):
+    VOLUME = auto()
+    EXPRESSION = auto()
+    PAN = auto()
+    # Pitch bend, -8192 to 8191 like MIDI.
+    BEND = auto()
+
+
+class SequenceControl(DseAutoString):
+    def __init__(self, tick: int, track_id: int, kind: SequenceControlKind, value: int):
+        self.tick = tick
+        self.track_id = track_id
+        self.kind = kind
+        self.value = value
+
+
+class Sequence:
+    """
+    The notes, controller changes and tempo changes of all tracks of an Smdl, at absolute times in ticks,
+    with the same interpretation of the events as smdl_to_midi. Tracks are played once, loop points are ignored.
+    """
+    def __init__(self, smdl: Smdl):
+        self.tpqn = smdl.song.tpqn
+        self.notes: List[SequenceNote] = []
+        self.controls: List[SequenceControl] = []
+        # Tempo changes as (tick, beats per minute). The first one is always at tick 0.
+        self.tempo_changes: List[Tuple[int, int]] = [(0, DEFAULT_BPM)]
+        # Tick at which the last track ends or the last note is released.
+        self.length = 0
+
+        for track_id, track in enumerate(smdl.tracks):
+            self._read_track(track_id, track)
+        self.notes.sort(key=lambda n: n.tick)
+        self.controls.sort(key=lambda c: c.tick)
+        self.tempo_changes.sort(key=lambda t: t[0])
+
+        self._tempo_ticks = np.array([t for t, _ in self.tempo_changes], dtype=np.float64)
+        self._seconds_per_tick = np.array([60 / (bpm * self.tpqn) for _, bpm in self.tempo_changes])
+        self._tempo_seconds = np.concatenate((
+            [0.0], np.cumsum(np.diff(self._tempo_ticks) * self._seconds_per_tick[:-1])
+        ))
+
+    def _read_track(self, track_id: int, track: SmdlTrack):
+        timing = track.timing()
+        program = 0
+        for event, tick, duration, octave in zip(track.events, timing.ticks, timing.durations, timing.octaves):
+            if isinstance(event, SmdlEventPlayNote):
+                key = min(max(event.note.value + octave * 12, 0), 127)
+                self.notes.append(SequenceNote(tick, track_id, key, event.velocity, duration, program))
+                self.length = max(self.length, tick + duration)
+            elif isinstance(event, SmdlEventSpecial):
+                op = event.op
+                if op == SmdlSpecialOpCode.SET_SAMPLE:
+                    program = event.params[0]
+                elif op == SmdlSpecialOpCode.SET_TEMPO:
+                    if event.params[0] > 0:
+                        self.tempo_changes.append((tick, event.params[0]))
+                elif op == SmdlSpecialOpCode.SET_VOLUME:
+                    self.controls.append(SequenceControl(tick, track_id, SequenceControlKind.VOLUME, event.params[0]))
+                elif op == SmdlSpecialOpCode.SET_XPRESS:
+                    self.controls.append(
+                        SequenceControl(tick, track_id, SequenceControlKind.EXPRESSION, event.params[0])
+                    )
+                elif op == SmdlSpecialOpCode.SET_PAN:
+                    self.controls.append(SequenceControl(tick, track_id, SequenceControlKind.PAN, event.params[0]))
+                elif op == SmdlSpecialOpCode.SET_BEND:
+                    bend = (((event.params[0] << 8) | event.params[1]) >> 2) - 8192
+                    self.controls.append(SequenceControl(tick, track_id, SequenceControlKind.BEND, bend))
+                elif op == SmdlSpecialOpCode.TRACK_END:
+                    break
+        self.length = max(self.length, timing.length)
+
+    def ticks_to_seconds(self, ticks: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """Converts absolute times in ticks into seconds, using the tempo changes."""
+        ticks = np.asarray(ticks, dtype=np.float64)
+        i = np.searchsorted(self._tempo_ticks, ticks, side='right') - 1
+        return self._tempo_seconds[i] + (ticks - self._tempo_ticks[i]) * self._seconds_per_tick[i]
@@ -100,3 +100,37 @@ class DseAutoString:
 
     def __str__(self):
         return f"{self.__class__.__name__}<{str({k: v for k, v in self.__dict__.items() if v is not None and not k[0] == '_'})}>"
+
+
+class DseFormatError(ValueError):
+    """Raised by the parsers if the data is not a valid DSE file or exceeds the resource limits of the parsers."""
+
+
+def write_file_atomic(path: str, data: bytes):
+    """
+    Writes the data to the file at path. The data is written to a temporary file in the same directory first,
+    which then replaces the file, so the file never contains partially written data.
+    The file keeps it's permissions, new files get the default permissions (like with open).
+    """
+    # Imported here, so that they are not exported by "from skytemple_dse.util import *".
+    import os
+    import stat
+    import tempfile
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates the file only accessible by the user.
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise